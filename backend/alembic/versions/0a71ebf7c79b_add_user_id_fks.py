@@ -10,6 +10,8 @@ from typing import Sequence, Union
 from alembic import op
 import sqlalchemy as sa
 
+from app.backfill import Backfill, run_in_migration
+
 
 # revision identifiers, used by Alembic.
 revision: str = '0a71ebf7c79b'
@@ -24,13 +26,20 @@ def upgrade() -> None:
     op.create_index(op.f('ix_leaderboard_user_id'), 'leaderboard', ['user_id'], unique=False)
     
     # --- Data Backfill Start ---
-    # Update leaderboard entries to link to users via username
-    op.execute("""
-        UPDATE leaderboard 
-        SET user_id = users.id 
-        FROM users 
-        WHERE leaderboard.username = users.username
-    """)
+    # Update leaderboard entries to link to users via username, in committed
+    # chunks so the table is not locked for the whole run
+    run_in_migration(Backfill(
+        name="0a71ebf7c79b.leaderboard.user_id",
+        table="leaderboard",
+        key="id",
+        statement="""
+            UPDATE leaderboard
+            SET user_id = users.id
+            FROM users
+            WHERE leaderboard.username = users.username
+            AND leaderboard.id > :lo AND leaderboard.id <= :hi
+        """,
+    ))
     
     # Update sessions to link to users via username (assuming user_id was previously username or empty)
     # If sessions.user_id already held UUIDs, this is fine. If it held usernames, we need to fix it.
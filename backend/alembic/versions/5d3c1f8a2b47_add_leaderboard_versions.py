@@ -0,0 +1,32 @@
+"""Add leaderboard_versions
+
+Revision ID: 5d3c1f8a2b47
+Revises: 29135b194718
+Create Date: 2026-01-12 10:02:11.514233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d3c1f8a2b47'
+down_revision: Union[str, None] = '29135b194718'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('leaderboard_versions',
+    sa.Column('game_mode', sa.String(), nullable=False),
+    sa.Column('group_id', sa.String(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('game_mode', 'group_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('leaderboard_versions')
@@ -0,0 +1,36 @@
+"""Add backfill_checkpoints
+
+Revision ID: 7e2a9c4d1b6f
+Revises: 5d3c1f8a2b47
+Create Date: 2026-01-20 09:14:37.208113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e2a9c4d1b6f'
+down_revision: Union[str, None] = '5d3c1f8a2b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Backfills in earlier migrations create this table on demand
+    if sa.inspect(op.get_bind()).has_table('backfill_checkpoints'):
+        return
+    op.create_table('backfill_checkpoints',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('last_key', sa.String(), nullable=True),
+    sa.Column('rows_done', sa.Integer(), nullable=False),
+    sa.Column('done', sa.Boolean(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('backfill_checkpoints')
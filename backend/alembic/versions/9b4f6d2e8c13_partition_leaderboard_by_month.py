@@ -0,0 +1,62 @@
+"""Partition leaderboard by month (Postgres)
+
+Revision ID: 9b4f6d2e8c13
+Revises: 7e2a9c4d1b6f
+Create Date: 2026-01-27 11:41:05.662910
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.backfill import run_in_migration
+from app.partitions import (
+    COLUMNS, PARTITION_MONTHS_AHEAD, add_months, copy_backfill, create_staging_sql, fill_timestamps_backfill,
+    null_timestamp_fill, swap_sql,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4f6d2e8c13'
+down_revision: Union[str, None] = '7e2a9c4d1b6f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # SQLite keeps the single table
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # Copy first, swap last: the game keeps writing to the plain table until the
+    # swap transaction at the end, and an interrupted run resumes from its checkpoints.
+    fill = null_timestamp_fill(op.get_bind())
+    run_in_migration(fill_timestamps_backfill(fill))
+
+    this_month = date.today().replace(day=1)
+    for statement in create_staging_sql(fill.date(), add_months(this_month, PARTITION_MONTHS_AHEAD)):
+        op.execute(statement)
+    run_in_migration(copy_backfill(fill))
+
+    for statement in swap_sql(fill):
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('ALTER TABLE leaderboard RENAME TO leaderboard_partitioned')
+    op.execute('ALTER TABLE leaderboard_partitioned RENAME CONSTRAINT leaderboard_pkey TO leaderboard_partitioned_pkey')
+    op.execute('ALTER INDEX ix_leaderboard_username RENAME TO ix_leaderboard_partitioned_username')
+    op.execute('ALTER INDEX ix_leaderboard_user_id RENAME TO ix_leaderboard_partitioned_user_id')
+    op.execute('CREATE TABLE leaderboard (LIKE leaderboard_partitioned INCLUDING DEFAULTS)')
+    op.execute('ALTER TABLE leaderboard ALTER COLUMN "timestamp" DROP NOT NULL')
+    op.execute('ALTER TABLE leaderboard ADD CONSTRAINT leaderboard_pkey PRIMARY KEY (id)')
+    op.create_index(op.f('ix_leaderboard_username'), 'leaderboard', ['username'], unique=False)
+    op.create_index(op.f('ix_leaderboard_user_id'), 'leaderboard', ['user_id'], unique=False)
+    op.create_foreign_key('leaderboard_user_id_fkey', 'leaderboard', 'users', ['user_id'], ['id'])
+    op.execute(f'INSERT INTO leaderboard ({COLUMNS}) SELECT {COLUMNS} FROM leaderboard_partitioned')
+    op.execute('DROP TABLE leaderboard_partitioned')
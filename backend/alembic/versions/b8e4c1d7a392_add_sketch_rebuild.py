@@ -0,0 +1,31 @@
+"""Add sketch_rebuild
+
+Revision ID: b8e4c1d7a392
+Revises: a3d7f2c8e514
+Create Date: 2026-02-26 09:41:05.118734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e4c1d7a392'
+down_revision: Union[str, None] = 'a3d7f2c8e514'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('sketch_rebuild',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('cutoff', sa.Float(), nullable=False),
+    sa.Column('done', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('sketch_rebuild')
@@ -0,0 +1,30 @@
+"""Allow closing rows in rank_history
+
+Revision ID: c2f9a6e4b817
+Revises: b8e4c1d7a392
+Create Date: 2026-02-27 14:03:26.540912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2f9a6e4b817'
+down_revision: Union[str, None] = 'b8e4c1d7a392'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A null rank and best score mark a player leaving a ranking
+    op.alter_column('rank_history', 'rank', existing_type=sa.Integer(), nullable=True)
+    op.alter_column('rank_history', 'best_score', existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM rank_history WHERE rank IS NULL OR best_score IS NULL")
+    op.alter_column('rank_history', 'best_score', existing_type=sa.Integer(), nullable=False)
+    op.alter_column('rank_history', 'rank', existing_type=sa.Integer(), nullable=False)
@@ -0,0 +1,33 @@
+"""Add archived_score_counts
+
+Revision ID: c6e1a7f3d925
+Revises: 9b4f6d2e8c13
+Create Date: 2026-02-03 15:22:48.130264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6e1a7f3d925'
+down_revision: Union[str, None] = '9b4f6d2e8c13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('archived_score_counts',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('game_mode', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('username', sa.String(), nullable=False),
+    sa.Column('games', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'game_mode', 'user_id', 'username')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('archived_score_counts')
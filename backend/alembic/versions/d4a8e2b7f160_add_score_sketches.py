@@ -0,0 +1,40 @@
+"""Add score_sketch_buckets and player_sketch_registers
+
+Revision ID: d4a8e2b7f160
+Revises: c6e1a7f3d925
+Create Date: 2026-02-09 10:41:07.512380
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a8e2b7f160'
+down_revision: Union[str, None] = 'c6e1a7f3d925'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('score_sketch_buckets',
+    sa.Column('game_mode', sa.String(), nullable=False),
+    sa.Column('group_id', sa.String(), nullable=False),
+    sa.Column('bucket', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('game_mode', 'group_id', 'bucket')
+    )
+    op.create_table('player_sketch_registers',
+    sa.Column('game_mode', sa.String(), nullable=False),
+    sa.Column('group_id', sa.String(), nullable=False),
+    sa.Column('register', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('game_mode', 'group_id', 'register')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('player_sketch_registers')
+    op.drop_table('score_sketch_buckets')
@@ -0,0 +1,54 @@
+"""Add window_best_scores and window_results
+
+Revision ID: e7b3c9d2a514
+Revises: d4a8e2b7f160
+Create Date: 2026-02-16 09:12:44.208113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b3c9d2a514'
+down_revision: Union[str, None] = 'd4a8e2b7f160'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('window_best_scores',
+    sa.Column('period', sa.String(), nullable=False),
+    sa.Column('window_start', sa.Date(), nullable=False),
+    sa.Column('game_mode', sa.String(), nullable=False),
+    sa.Column('group_id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('username', sa.String(), nullable=False),
+    sa.Column('best_score', sa.Integer(), nullable=False),
+    sa.Column('achieved_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('period', 'window_start', 'game_mode', 'group_id', 'user_id')
+    )
+    op.create_index('ix_window_best_scores_ranking', 'window_best_scores',
+                    ['period', 'window_start', 'game_mode', 'group_id', 'best_score'], unique=False)
+    op.create_table('window_results',
+    sa.Column('period', sa.String(), nullable=False),
+    sa.Column('window_start', sa.Date(), nullable=False),
+    sa.Column('game_mode', sa.String(), nullable=False),
+    sa.Column('group_id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('username', sa.String(), nullable=False),
+    sa.Column('best_score', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('period', 'window_start', 'game_mode', 'group_id', 'user_id')
+    )
+    op.create_index('ix_window_results_rank', 'window_results',
+                    ['period', 'window_start', 'game_mode', 'group_id', 'rank'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_window_results_rank', table_name='window_results')
+    op.drop_table('window_results')
+    op.drop_index('ix_window_best_scores_ranking', table_name='window_best_scores')
+    op.drop_table('window_best_scores')
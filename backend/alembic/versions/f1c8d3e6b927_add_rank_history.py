@@ -0,0 +1,43 @@
+"""Add player_ranks and rank_history
+
+Revision ID: f1c8d3e6b927
+Revises: e7b3c9d2a514
+Create Date: 2026-02-18 14:03:26.771905
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c8d3e6b927'
+down_revision: Union[str, None] = 'e7b3c9d2a514'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('player_ranks',
+    sa.Column('game_mode', sa.String(), nullable=False),
+    sa.Column('group_id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('best_score', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('game_mode', 'group_id', 'user_id')
+    )
+    op.create_table('rank_history',
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('group_id', sa.String(), nullable=False),
+    sa.Column('game_mode', sa.String(), nullable=False),
+    sa.Column('taken_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('best_score', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id', 'group_id', 'game_mode', 'taken_at')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('rank_history')
+    op.drop_table('player_ranks')
@@ -0,0 +1,288 @@
+"""
+Columnar copy of the leaderboard for the report endpoints.
+
+With ``ANALYTICS_ENGINE=duckdb`` the workers on a host share one DuckDB file
+under ``ANALYTICS_DIR`` holding a copy of ``leaderboard``, ``user_groups``,
+``groups`` and ``archived_score_counts``. Every ``ANALYTICS_REFRESH_SECONDS``
+one worker (whichever takes the file lock) reads the tables from the read
+database, builds a new file in a thread and repoints the ``analytics.duckdb``
+symlink at it; the others keep serving the previous file and open the new one
+on their next read. Files get unique names because DuckDB shares one open
+database per path within a process. The report scans (score distribution, activity by user, overall
+rankings) run on the copy instead of the database, so report traffic does not
+compete with score submissions. Responses served from the copy carry
+``X-Data-Source: analytics``, ``X-Data-As-Of`` (when the copy was read) and
+``X-Data-Age`` (seconds).
+
+Requests go to the database as usual while there is no copy yet, when it is
+older than ``ANALYTICS_MAX_AGE`` and for clients that just wrote
+(read-your-writes). Needs the optional ``duckdb`` and ``pyarrow`` packages
+(``analytics`` extra).
+"""
+import asyncio
+import fcntl
+import logging
+import os
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import ReadSessionLocal, is_recent_writer
+from .metrics import counter, gauge
+from .sql_models import ArchivedScoreCount, Group, LeaderboardEntry, user_groups
+
+try:
+    import duckdb
+    import pyarrow as pa
+except ImportError:  # Optional: only needed with ANALYTICS_ENGINE=duckdb
+    duckdb = None
+
+logger = logging.getLogger("uvicorn.error")
+
+ANALYTICS_ENGINE = os.getenv("ANALYTICS_ENGINE", "")
+ANALYTICS_DIR = Path(os.getenv("ANALYTICS_DIR", Path(__file__).resolve().parent.parent / "analytics"))
+ANALYTICS_REFRESH_SECONDS = float(os.getenv("ANALYTICS_REFRESH_SECONDS", "300"))
+ANALYTICS_MAX_AGE = float(os.getenv("ANALYTICS_MAX_AGE", str(3 * ANALYTICS_REFRESH_SECONDS)))
+ANALYTICS_FETCH_SIZE = int(os.getenv("ANALYTICS_FETCH_SIZE", "50000"))
+
+ENABLED = ANALYTICS_ENGINE == "duckdb"
+if ENABLED and duckdb is None:
+    raise RuntimeError("ANALYTICS_ENGINE=duckdb needs duckdb and pyarrow: uv sync --extra analytics")
+
+FILE_NAME = "analytics.duckdb"
+
+# Copied tables: the database columns read, and the DuckDB table they fill (same column order)
+TABLES = {
+    "leaderboard": (
+        [LeaderboardEntry.user_id, LeaderboardEntry.username, LeaderboardEntry.game_mode,
+         LeaderboardEntry.score, LeaderboardEntry.timestamp],
+        "user_id VARCHAR, username VARCHAR, game_mode VARCHAR, score BIGINT, timestamp TIMESTAMP",
+    ),
+    "user_groups": (
+        [user_groups.c.user_id, user_groups.c.group_id, user_groups.c.username],
+        "user_id VARCHAR, group_id VARCHAR, username VARCHAR",
+    ),
+    "groups": (
+        [Group.id, Group.name],
+        "id VARCHAR, name VARCHAR",
+    ),
+    "archived_score_counts": (
+        [ArchivedScoreCount.day, ArchivedScoreCount.game_mode, ArchivedScoreCount.user_id,
+         ArchivedScoreCount.username, ArchivedScoreCount.games],
+        "day DATE, game_mode VARCHAR, user_id VARCHAR, username VARCHAR, games BIGINT",
+    ),
+}
+
+
+class Snapshot:
+    """Read-only connection to one analytics file."""
+
+    def __init__(self, path: Path):
+        self.identity = path.name
+        self.con = duckdb.connect(str(path), read_only=True)
+        as_of, self.scores = self.con.execute("SELECT as_of, scores FROM snapshot_info").fetchone()
+        self.as_of: datetime = as_of.replace(tzinfo=timezone.utc)  # When the database read started
+
+    def age(self) -> float:
+        return time.time() - self.as_of.timestamp()
+
+
+_current: Optional[Snapshot] = None
+
+refreshes = counter("analytics_refreshes", "Analytics snapshots rebuilt")
+fallbacks = counter("analytics_fallbacks", "Report requests sent to the database while analytics is enabled")
+gauge("analytics_snapshot_age_seconds", "Age of the analytics snapshot this worker reads",
+      lambda: _current.age() if _current else 0)
+
+
+def current(directory: Optional[Path] = None) -> Optional[Snapshot]:
+    """The newest analytics file on disk, opened when the link has moved to a new one."""
+    global _current
+    directory = directory or ANALYTICS_DIR
+    try:
+        name = os.readlink(directory / FILE_NAME)
+    except FileNotFoundError:
+        return None
+    if _current is None or _current.identity != name:
+        _current = Snapshot(directory / name)
+    return _current
+
+
+def _append_columns(data: Dict[str, list], rows: list):
+    for key, values in zip(data, zip(*rows)):
+        data[key].extend(getattr(v, "value", v) for v in values)  # GameMode -> str
+
+
+async def fetch_columns(db: AsyncSession) -> Dict[str, Dict[str, list]]:
+    """Read the copied tables column-wise, streaming ``ANALYTICS_FETCH_SIZE`` rows at a time."""
+    tables = {}
+    for name, (columns, _) in TABLES.items():
+        data = {c.key: [] for c in columns}
+        result = await db.stream(select(*columns).execution_options(yield_per=ANALYTICS_FETCH_SIZE))
+        async for rows in result.partitions():
+            # Transposing a batch is pure Python work; keep it off the event loop
+            await asyncio.to_thread(_append_columns, data, rows)
+        tables[name] = data
+    return tables
+
+
+def write_file(directory: Path, tables: Dict[str, Dict[str, list]], as_of: datetime):
+    """Build a new DuckDB file in ``directory``, point the link at it and delete older files."""
+    file_name = f"analytics-{as_of:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.duckdb"
+    tmp = directory / f"{file_name}.tmp"
+    con = duckdb.connect(str(tmp))
+    try:
+        for name, (_, schema) in TABLES.items():
+            con.execute(f"CREATE TABLE {name} ({schema})")
+            con.register("src", pa.table(tables[name]))
+            con.execute(f"INSERT INTO {name} SELECT * FROM src")
+            con.unregister("src")
+        con.execute("CREATE TABLE snapshot_info (as_of TIMESTAMP, scores BIGINT)")
+        con.execute("INSERT INTO snapshot_info VALUES (?, ?)",
+                    [as_of.astimezone(timezone.utc).replace(tzinfo=None), len(tables["leaderboard"]["score"])])
+        con.execute("CHECKPOINT")
+    finally:
+        con.close()
+    os.replace(tmp, directory / file_name)
+    # Readers never see a half-built file: the link moves in one rename
+    link = directory / f"{FILE_NAME}.tmp"
+    link.unlink(missing_ok=True)
+    os.symlink(file_name, link)
+    os.replace(link, directory / FILE_NAME)
+    for old in directory.glob("analytics-*.duckdb*"):
+        if old.name != file_name:
+            old.unlink()  # Workers still reading an old file keep it open until they move on
+
+
+async def build(db: AsyncSession, directory: Optional[Path] = None, force: bool = False) -> bool:
+    """Write a new analytics file unless another worker is or just was at it; return whether one was written."""
+    directory = directory or ANALYTICS_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / ".build.lock", "w") as lock:
+        try:
+            # Another worker on this host is building
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        existing = current(directory)
+        if existing is not None and existing.age() < ANALYTICS_REFRESH_SECONDS / 2 and not force:
+            return False
+        as_of, started = datetime.now(timezone.utc), time.monotonic()
+        tables = await fetch_columns(db)
+        # Loading is CPU-bound; requests keep using the previous file meanwhile
+        await asyncio.to_thread(write_file, directory, tables, as_of)
+    refreshes.inc()
+    logger.info("Analytics snapshot refreshed: %d scores in %.1fs",
+                len(tables["leaderboard"]["score"]), time.monotonic() - started)
+    return True
+
+
+async def refresh(db: Optional[AsyncSession] = None, directory: Optional[Path] = None, force: bool = False) -> bool:
+    """Rebuild the host's analytics file from ``db`` (a new read session by default)."""
+    if db is None:
+        async with ReadSessionLocal() as session:
+            return await build(session, directory, force)
+    return await build(db, directory, force)
+
+
+def snapshot_for(request: Request) -> Optional[Snapshot]:
+    """The snapshot to serve ``request`` from, or None to use the database."""
+    if not ENABLED:
+        return None
+    snap = current()
+    if snap is None or snap.age() > ANALYTICS_MAX_AGE or is_recent_writer(request):
+        fallbacks.inc()
+        return None
+    return snap
+
+
+def set_freshness(response: Response, snap: Snapshot):
+    response.headers["X-Data-Source"] = "analytics"
+    response.headers["X-Data-As-Of"] = snap.as_of.isoformat()
+    response.headers["X-Data-Age"] = f"{snap.age():.0f}"
+
+
+async def query(snap: Snapshot, sql: str, params: Sequence = ()) -> list:
+    """Run ``sql`` on the snapshot in a worker thread; rows support attribute access."""
+    def run():
+        cur = snap.con.cursor()  # Connections are not thread-safe; cursors are independent
+        try:
+            cur.execute(sql, list(params))
+            Row = namedtuple("Row", [d[0] for d in cur.description])
+            return [Row(*r) for r in cur.fetchall()]
+        finally:
+            cur.close()
+    return await asyncio.to_thread(run)
+
+
+def _group_filter(group_id: Optional[str]):
+    if group_id and group_id != "all":
+        return "user_id IN (SELECT user_id FROM user_groups WHERE group_id = ?)", [group_id]
+    return "TRUE", []
+
+
+async def scores(snap: Snapshot, game_mode: str, group_id: Optional[str] = None) -> List[int]:
+    where, params = _group_filter(group_id)
+    rows = await query(snap, f"SELECT score FROM leaderboard WHERE game_mode = ? AND {where}", [game_mode, *params])
+    return [r.score for r in rows]
+
+
+async def mode_ranks(snap: Snapshot, group_id: Optional[str] = None) -> list:
+    """Best score and its rank per user and mode, as ``_overall_rankings`` reads them."""
+    where, params = _group_filter(group_id)
+    return await query(snap, f"""
+        WITH best AS (
+            SELECT username, user_id, game_mode, max(score) AS best_score
+            FROM leaderboard WHERE {where}
+            GROUP BY username, user_id, game_mode
+        )
+        SELECT username, user_id, game_mode, best_score,
+               rank() OVER (PARTITION BY game_mode ORDER BY best_score DESC) AS game_rank
+        FROM best
+    """, params)
+
+
+async def user_groups_by_username(snap: Snapshot, user_ids: List[str]) -> Dict[str, List[Dict[str, str]]]:
+    rows = await query(snap, """
+        SELECT ug.user_id, ug.username, g.id, g.name
+        FROM user_groups ug JOIN groups g ON g.id = ug.group_id
+        WHERE list_contains(?, ug.user_id)
+        ORDER BY ug.user_id
+    """, [user_ids])
+    by_user: Dict[str, tuple] = {}
+    for r in rows:
+        by_user.setdefault(r.user_id, (r.username, []))[1].append({"id": r.id, "name": r.name})
+    return {username: groups for username, groups in by_user.values()}
+
+
+async def user_activity(snap: Snapshot, start: datetime, group_id: Optional[str] = None, limit: int = 10):
+    """Top ``limit`` users by games since ``start`` and their (day, username, games) rows."""
+    where, params = _group_filter(group_id)
+    events = f"""
+        WITH events AS (
+            SELECT CAST(timestamp AS DATE) AS day, username, user_id, 1 AS games
+            FROM leaderboard WHERE timestamp >= ?
+            UNION ALL
+            SELECT day, username, user_id, games FROM archived_score_counts WHERE day >= ?
+        ), filtered AS (SELECT * FROM events WHERE {where})
+    """
+    # DuckDB holds naive UTC timestamps
+    params = [start.astimezone(timezone.utc).replace(tzinfo=None), start.date(), *params]
+    top = await query(snap, events + """
+        SELECT username FROM filtered GROUP BY username ORDER BY sum(games) DESC LIMIT ?
+    """, [*params, limit])
+    top_users = [r.username for r in top]
+    if not top_users:
+        return [], []
+    rows = await query(snap, events + """
+        SELECT day AS date, username, sum(games) AS count FROM filtered
+        WHERE list_contains(?, username) GROUP BY day, username
+    """, [*params, top_users])
+    return top_users, rows
@@ -0,0 +1,182 @@
+"""
+Cold-score archive.
+
+Scores older than ``ARCHIVE_RETENTION_DAYS`` that are not their player's best in
+the mode only matter for history. ``archive_cold_scores`` moves them, in
+batches, from ``leaderboard`` into zstd-compressed Parquet files under
+``ARCHIVE_DIR`` and adds them to ``archived_score_counts`` (games per day, mode
+and player), all before deleting them. Best scores never leave the table, so
+rankings are unaffected; ``games_played``, totals and activity charts add the
+archived counts back in.
+
+Parquet support needs the optional ``pyarrow`` package (``archive`` extra).
+A crash between writing a file and committing its batch leaves those rows both
+in the table and in the archive; the next run archives them again and
+``archived_scores`` drops the duplicate ids.
+"""
+import os
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, delete, exists, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from .db import insert_for
+from .sql_models import ArchivedScoreCount, LeaderboardEntry, user_groups
+from .versioning import bump_versions
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: only the archival job and archive reads need it
+    pa = None
+
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", Path(__file__).resolve().parent.parent / "archive"))
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "90"))
+
+SCORES_DIR = "leaderboard"
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("The score archive needs pyarrow: uv sync --extra archive")
+
+
+def _cold_scores(cutoff: datetime, after: str, limit: int):
+    """Oldest-first batch of archivable rows: before ``cutoff`` and beaten by another score of the same player.
+
+    Players are user ids; usernames are shared across groups, so they only
+    identify the legacy rows that have no user id.
+    """
+    better = aliased(LeaderboardEntry)
+    same_player = or_(
+        and_(LeaderboardEntry.user_id.isnot(None), better.user_id == LeaderboardEntry.user_id),
+        and_(LeaderboardEntry.user_id.is_(None), better.user_id.is_(None), better.username == LeaderboardEntry.username),
+    )
+    return (
+        select(LeaderboardEntry)
+        .where(LeaderboardEntry.timestamp < cutoff, LeaderboardEntry.id > after)
+        .where(exists().where(
+            same_player,
+            better.game_mode == LeaderboardEntry.game_mode,
+            or_(better.score > LeaderboardEntry.score,
+                and_(better.score == LeaderboardEntry.score, better.id < LeaderboardEntry.id)),
+        ))
+        .order_by(LeaderboardEntry.id)
+        .limit(limit)
+    )
+
+
+def _write_parquet(rows: List[LeaderboardEntry], directory: Path) -> Path:
+    table = pa.table({
+        "id": [r.id for r in rows],
+        "user_id": [r.user_id for r in rows],
+        "username": [r.username for r in rows],
+        "game_mode": [r.game_mode.value for r in rows],
+        "score": pa.array([r.score for r in rows], pa.int64()),
+        "timestamp": [r.timestamp for r in rows],
+    })
+    target = directory / SCORES_DIR
+    target.mkdir(parents=True, exist_ok=True)
+    path = target / f"part-{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+    tmp = path.with_suffix(".tmp")
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)  # Readers never see half-written files
+    return path
+
+
+async def _add_counts(db: AsyncSession, rows: List[LeaderboardEntry]):
+    counts = Counter((r.timestamp.date(), r.game_mode.value, r.user_id or "", r.username) for r in rows)
+    stmt = insert_for(db)(ArchivedScoreCount).values([
+        {"day": day, "game_mode": mode, "user_id": uid, "username": name, "games": n}
+        for (day, mode, uid, name), n in counts.items()
+    ])
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["day", "game_mode", "user_id", "username"],
+        set_={"games": ArchivedScoreCount.games + stmt.excluded.games},
+    ))
+
+
+async def archive_cold_scores(
+    db: AsyncSession,
+    retention_days: int = ARCHIVE_RETENTION_DAYS,
+    batch_size: int = 5000,
+    dry_run: bool = False,
+    directory: Path = ARCHIVE_DIR,
+    report: Callable[[str], None] = print,
+) -> int:
+    """Move archivable scores to Parquet; return how many were moved (or would be)."""
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    if dry_run:
+        pending = (await db.execute(
+            select(func.count()).select_from(_cold_scores(cutoff, "", None).subquery())
+        )).scalar()
+        report(f"{pending} scores older than {cutoff:%Y-%m-%d} would be archived")
+        return pending
+
+    _require_pyarrow()
+    moved, after = 0, ""
+    while True:
+        rows = (await db.execute(_cold_scores(cutoff, after, batch_size))).scalars().all()
+        if not rows:
+            break
+        path = _write_parquet(rows, directory)
+        await _add_counts(db, rows)
+        await db.execute(delete(LeaderboardEntry).where(LeaderboardEntry.id.in_([r.id for r in rows])))
+        # Rankings that list individual scores lose these rows
+        group_ids = (await db.execute(
+            select(user_groups.c.group_id).distinct().where(user_groups.c.user_id.in_({r.user_id for r in rows}))
+        )).scalars().all()
+        for mode in {r.game_mode.value for r in rows}:
+            await bump_versions(db, mode, group_ids)
+        await db.commit()
+        moved += len(rows)
+        after = rows[-1].id
+        report(f"archived {moved} scores (last file {path.name})")
+    return moved
+
+
+def archived_scores(game_mode: str, user_ids: Optional[List[str]] = None, directory: Path = ARCHIVE_DIR) -> List[int]:
+    """Scores in the archive for ``game_mode``, optionally only for ``user_ids``."""
+    _require_pyarrow()
+    path = directory / SCORES_DIR
+    if not path.exists():
+        return []
+    condition = ds.field("game_mode") == game_mode
+    if user_ids is not None:
+        condition = condition & ds.field("user_id").isin(user_ids)
+    table = ds.dataset(path, format="parquet").to_table(columns=["id", "score"], filter=condition)
+    seen, scores = set(), []
+    for row_id, score in zip(table.column("id").to_pylist(), table.column("score").to_pylist()):
+        if row_id not in seen:
+            seen.add(row_id)
+            scores.append(score)
+    return scores
+
+
+async def archived_games(
+    db: AsyncSession, *keys, game_mode: Optional[str] = None,
+    group_id: Optional[str] = None, since: Optional[datetime] = None,
+) -> Dict[tuple, int]:
+    """Archived games summed per ``keys`` (ArchivedScoreCount columns), e.g. ``{("alice", "snake"): 12}``."""
+    query = select(*keys, func.sum(ArchivedScoreCount.games)).group_by(*keys)
+    if game_mode:
+        query = query.where(ArchivedScoreCount.game_mode == getattr(game_mode, "value", game_mode))
+    if since is not None:
+        query = query.where(ArchivedScoreCount.day >= since.date())
+    if group_id and group_id != "all":
+        query = (
+            query
+            .join(user_groups, user_groups.c.user_id == ArchivedScoreCount.user_id)
+            .where(user_groups.c.group_id == group_id)
+        )
+    return {tuple(row[:-1]): row[-1] for row in (await db.execute(query)).all() if row[-1]}
@@ -0,0 +1,135 @@
+"""
+Online backfills for data migrations.
+
+A backfill walks a table in keyset order and applies an idempotent statement to
+one key range at a time, each range in its own short transaction, so the table
+is never locked for the whole run and the game stays live::
+
+    Backfill(
+        name="leaderboard.user_id",
+        table="leaderboard",
+        key="id",
+        statement="UPDATE leaderboard SET user_id = users.id FROM users "
+                  "WHERE leaderboard.username = users.username "
+                  "AND leaderboard.id > :lo AND leaderboard.id <= :hi",
+    )
+
+``statement`` must restrict itself to ``key > :lo AND key <= :hi``. The key need
+not be unique: chunks are key ranges of roughly ``chunk_size`` rows. After every
+chunk the upper bound is saved in ``backfill_checkpoints``, so an interrupted
+run resumes where it stopped. Between chunks the backfill sleeps ``pause``
+seconds and, with ``max_rows_per_second``, throttles itself further.
+
+Inside an Alembic migration use ``run_in_migration``; it runs the backfill in an
+autocommit block so each chunk commits on its own.
+"""
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.engine import Connection
+
+from .sql_models import BackfillCheckpoint
+
+
+@dataclass
+class Backfill:
+    name: str  # Checkpoint key; keep it stable across runs
+    table: str
+    key: str
+    statement: str
+    chunk_size: int = 1000
+    pause: float = 0.05
+    max_rows_per_second: Optional[float] = None
+    start: object = ""  # Lower bound below every key ("" for strings, use e.g. -1 for integers)
+
+
+def _checkpoint(conn: Connection, name: str):
+    return conn.execute(
+        select(BackfillCheckpoint.last_key, BackfillCheckpoint.rows_done).where(BackfillCheckpoint.name == name)
+    ).first()
+
+
+def _save_checkpoint(conn: Connection, name: str, last_key, rows_done: int, done: bool):
+    values = {"last_key": str(last_key), "rows_done": rows_done, "done": done,
+              "updated_at": datetime.now(timezone.utc)}
+    updated = conn.execute(
+        BackfillCheckpoint.__table__.update().where(BackfillCheckpoint.name == name).values(**values)
+    )
+    if not updated.rowcount:
+        conn.execute(BackfillCheckpoint.__table__.insert().values(name=name, **values))
+
+
+def _commit(conn: Connection):
+    # In autocommit mode (Alembic's autocommit_block) every statement already committed
+    if conn.get_execution_options().get("isolation_level") != "AUTOCOMMIT":
+        conn.commit()
+
+
+def run_backfill(conn: Connection, job: Backfill, report: Callable[[str], None] = print) -> int:
+    """Run ``job`` to completion on ``conn``, committing per chunk; return rows processed."""
+    BackfillCheckpoint.__table__.create(conn, checkfirst=True)
+    _commit(conn)
+
+    saved = _checkpoint(conn, job.name)
+    lo = type(job.start)(saved.last_key) if saved else job.start
+    rows_done = saved.rows_done if saved else 0
+    total = rows_done + conn.execute(
+        text(f"SELECT COUNT(*) FROM {job.table} WHERE {job.key} > :lo"), {"lo": lo}
+    ).scalar()
+    _commit(conn)
+    if saved:
+        report(f"{job.name}: resuming after {job.key}={lo!r} ({rows_done}/{total} rows)")
+
+    started = time.monotonic()
+    processed = 0
+    while True:
+        # Upper bound of the next chunk: the chunk_size-th key after lo, or the last key
+        hi = conn.execute(
+            text(f"SELECT {job.key} FROM {job.table} WHERE {job.key} > :lo ORDER BY {job.key} "
+                 f"LIMIT 1 OFFSET :offset"),
+            {"lo": lo, "offset": job.chunk_size - 1},
+        ).scalar()
+        last = hi is None
+        if last:
+            hi = conn.execute(text(f"SELECT MAX({job.key}) FROM {job.table} WHERE {job.key} > :lo"), {"lo": lo}).scalar()
+        if hi is None:
+            _save_checkpoint(conn, job.name, lo, rows_done, done=True)
+            _commit(conn)
+            report(f"{job.name}: done, {rows_done} rows")
+            return processed
+
+        chunk_rows = conn.execute(
+            text(f"SELECT COUNT(*) FROM {job.table} WHERE {job.key} > :lo AND {job.key} <= :hi"), {"lo": lo, "hi": hi}
+        ).scalar()
+        conn.execute(text(job.statement), {"lo": lo, "hi": hi})
+        rows_done += chunk_rows
+        processed += chunk_rows
+        _save_checkpoint(conn, job.name, hi, rows_done, done=last)
+        _commit(conn)
+        lo = hi
+
+        elapsed = time.monotonic() - started
+        report(f"{job.name}: {rows_done}/{total} rows ({100 * rows_done / max(total, 1):.0f}%, "
+               f"{processed / max(elapsed, 1e-6):.0f} rows/s)")
+        if last:
+            return processed
+        delay = job.pause
+        if job.max_rows_per_second:
+            # Sleep until the run is back under the target rate
+            delay = max(delay, processed / job.max_rows_per_second - elapsed)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def run_in_migration(job: Backfill) -> int:
+    """Run ``job`` from an Alembic migration, committing each chunk separately.
+
+    Everything the migration did before this call is committed first.
+    """
+    from alembic import op
+
+    with op.get_context().autocommit_block():
+        return run_backfill(op.get_bind(), job)
@@ -0,0 +1,159 @@
+"""
+Periodic jobs run by every worker process while the app is up.
+
+The app lifespan lists the jobs explicitly (``app.main.periodic_jobs``) and
+runs them through ``running()``; importing a module never schedules anything. A
+failing run is logged and counted; the job runs again at its next interval.
+
+Jobs marked ``cluster_wide`` (partition maintenance, window rollover, rank
+history) act on the shared database and run in one worker only: the leader.
+On Postgres the leader holds a session-level advisory lock on a connection it
+keeps checked out, and leads until that connection goes away; elsewhere
+(SQLite) an exclusive lock on ``LEADER_LOCK_FILE`` does the same for the
+workers of one host. Other workers try to take over whenever a cluster-wide job
+comes due, and skip the run while someone else leads.
+"""
+import asyncio
+import fcntl
+import hashlib
+import logging
+import os
+import random
+import tempfile
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from .db import DATABASE_URL, engine
+from .metrics import counter, gauge
+
+logger = logging.getLogger("uvicorn.error")
+
+BACKGROUND_JOBS_ENABLED = os.getenv("BACKGROUND_JOBS_ENABLED", "1") == "1"
+
+# Arbitrary constant shared by all workers; whoever holds it runs the cluster-wide jobs
+LEADER_LOCK_ID = 7261004
+# One lock file per database, so unrelated apps on a host don't share a leader
+LEADER_LOCK_FILE = Path(os.getenv("LEADER_LOCK_FILE") or Path(tempfile.gettempdir()) / (
+    f"snake-rivals-{hashlib.sha1(DATABASE_URL.encode()).hexdigest()[:12]}.leader"))
+
+failures = counter("background_job_failures", "Periodic job runs that raised")
+skipped = counter("background_job_skipped", "Cluster-wide job runs left to the leader worker")
+
+
+@dataclass
+class PeriodicJob:
+    name: str
+    interval: float
+    run: Callable[[], Awaitable[object]]
+    initial_delay: float = 0.0
+    cluster_wide: bool = False  # Runs in the leader worker only
+
+
+class Leader:
+    """Leadership of this worker over the cluster-wide jobs."""
+
+    def __init__(self):
+        self._conn: Optional[AsyncConnection] = None
+        self._file = None
+        self._lock = asyncio.Lock()  # Cluster-wide jobs in one worker may come due together
+
+    @property
+    def leading(self) -> bool:
+        return self._conn is not None or self._file is not None
+
+    async def acquire(self) -> bool:
+        """Whether this worker leads, taking the lock if it is free."""
+        async with self._lock:
+            if engine.dialect.name == "postgresql":
+                return await self._acquire_advisory()
+            return self._acquire_file()
+
+    async def _acquire_advisory(self) -> bool:
+        if self._conn is not None:
+            try:
+                await self._conn.execute(text("SELECT 1"))
+                await self._conn.commit()
+                return True
+            except Exception:
+                # The lock went with the connection; somebody else may lead by now
+                logger.warning("Lost the background job leader connection", exc_info=True)
+                await self._conn.invalidate()
+                await self._conn.close()
+                self._conn = None
+        conn = await engine.connect()
+        try:
+            locked = (await conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": LEADER_LOCK_ID})).scalar()
+            # The lock is session-level; don't sit idle in a transaction while holding it
+            await conn.commit()
+        except BaseException:
+            await conn.close()
+            raise
+        if not locked:
+            await conn.close()
+            return False
+        self._conn = conn
+        logger.info("Worker %d now runs the cluster-wide background jobs", os.getpid())
+        return True
+
+    def _acquire_file(self) -> bool:
+        if self._file is None:
+            f = open(LEADER_LOCK_FILE, "w")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                return False
+            self._file = f
+        return True
+
+    async def release(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            try:
+                # Unlock before the connection goes back to the pool
+                await conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": LEADER_LOCK_ID})
+                await conn.commit()
+            except Exception:
+                await conn.invalidate()
+            finally:
+                await conn.close()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+leader = Leader()
+gauge("background_leader", "1 if this worker runs the cluster-wide jobs", lambda: int(leader.leading))
+
+
+async def _loop(job: PeriodicJob):
+    # Jitter keeps workers started together from running the job in lockstep
+    await asyncio.sleep(job.initial_delay + random.uniform(0, min(job.interval, 60) / 10))
+    while True:
+        try:
+            if job.cluster_wide and not await leader.acquire():
+                skipped.inc()
+            else:
+                await job.run()
+        except Exception:
+            failures.inc()
+            logger.warning("Periodic job %s failed", job.name, exc_info=True)
+        await asyncio.sleep(job.interval)
+
+
+@asynccontextmanager
+async def running(jobs: List[PeriodicJob]):
+    """Run ``jobs`` for the duration of the block."""
+    tasks = [asyncio.create_task(_loop(job), name=f"periodic:{job.name}") for job in jobs] if BACKGROUND_JOBS_ENABLED else []
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await leader.release()
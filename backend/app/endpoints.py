@@ -0,0 +1,41 @@
+"""
+Per-endpoint serving policy for the ranking and stats endpoints.
+
+One row per endpoint: the freshness budget ``app.swr`` serves cached results
+within (``soft``/``hard`` seconds) and the statement timeout ``app.query_guard``
+runs its queries under. The key is the name endpoints pass to ``swr.Query``;
+an unknown name is an error rather than a silent fallback to defaults.
+"""
+from dataclasses import dataclass
+from typing import Dict
+
+
+@dataclass(frozen=True)
+class EndpointPolicy:
+    soft: float
+    hard: float
+    timeout: float
+
+
+# Seconds; the full-table rankings get more room than the cheap summaries
+ENDPOINTS: Dict[str, EndpointPolicy] = {
+    "get_all_scores_ranked": EndpointPolicy(soft=2, hard=60, timeout=10),
+    "get_best_per_user_per_mode": EndpointPolicy(soft=2, hard=60, timeout=8),
+    "get_top_n_per_mode": EndpointPolicy(soft=2, hard=60, timeout=8),
+    "get_window_rankings": EndpointPolicy(soft=2, hard=60, timeout=5),
+    "get_rank_history": EndpointPolicy(soft=30, hard=600, timeout=5),
+    "get_overall_rankings": EndpointPolicy(soft=5, hard=120, timeout=10),
+    "get_stats_summary": EndpointPolicy(soft=10, hard=300, timeout=5),
+    "get_score_distribution": EndpointPolicy(soft=10, hard=300, timeout=5),
+    "get_score_percentiles": EndpointPolicy(soft=10, hard=300, timeout=5),
+    "get_activity_trends": EndpointPolicy(soft=30, hard=600, timeout=5),
+    "get_activity_by_mode": EndpointPolicy(soft=30, hard=600, timeout=5),
+    "get_activity_by_user": EndpointPolicy(soft=30, hard=600, timeout=5),
+}
+
+
+def policy(name: str) -> EndpointPolicy:
+    try:
+        return ENDPOINTS[name]
+    except KeyError:
+        raise KeyError(f"No serving policy for endpoint {name!r}; add it to app.endpoints.ENDPOINTS") from None
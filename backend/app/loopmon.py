@@ -0,0 +1,99 @@
+"""
+Event-loop lag and blocking-call detector.
+
+While the app is up, a callback on the loop re-arms itself every
+``LOOP_LAG_INTERVAL`` seconds and records how much later than scheduled it ran.
+That delay is time the loop spent running something else without yielding. It
+goes to the ``event_loop_lag`` histogram, and ``event_loop_lag_seconds``
+reports the worst delay over the last ``LOOP_LAG_WINDOW`` ticks.
+
+A watchdog thread checks that the tick keeps arriving. When it is more than
+``SLOW_CALLBACK_THRESHOLD`` seconds late, the loop is stuck in one callback:
+the watchdog logs the loop thread's current stack (once per stall), counts it
+in ``slow_callbacks`` and keeps it in ``last_stack``. Set
+``LOOP_MONITOR_ENABLED=0`` to turn the monitor off in an environment.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+from .metrics import counter, gauge, histogram
+
+logger = logging.getLogger("uvicorn.error")
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "1") == "1"
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+LOOP_LAG_WINDOW = int(os.getenv("LOOP_LAG_WINDOW", "600"))
+SLOW_CALLBACK_THRESHOLD = float(os.getenv("SLOW_CALLBACK_THRESHOLD", "0.25"))
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+samples: deque = deque(maxlen=LOOP_LAG_WINDOW)
+lag = histogram("event_loop_lag", "Event-loop scheduling delay per tick, in seconds", BUCKETS)
+slow_callbacks = counter("slow_callbacks", "Loop stalls longer than SLOW_CALLBACK_THRESHOLD")
+gauge("event_loop_lag_seconds", "Worst event-loop scheduling delay in the recent window",
+      lambda: max(samples, default=0.0))
+
+last_stack: Optional[str] = None  # Loop thread's stack during the most recent stall
+
+_handle: Optional[asyncio.TimerHandle] = None
+_watchdog: Optional[threading.Thread] = None
+_stopping = threading.Event()
+_heartbeat = 0.0  # time.monotonic() of the last tick
+
+
+def _tick(loop: asyncio.AbstractEventLoop, due: float):
+    global _handle, _heartbeat
+    now = loop.time()
+    delay = max(now - due, 0.0)
+    lag.observe(delay)
+    samples.append(delay)
+    _heartbeat = time.monotonic()
+    _handle = loop.call_at(now + LOOP_LAG_INTERVAL, _tick, loop, now + LOOP_LAG_INTERVAL)
+
+
+def _watch(thread_id: int):
+    global last_stack
+    reported = None
+    while not _stopping.wait(min(SLOW_CALLBACK_THRESHOLD / 2, 0.05)):
+        beat = _heartbeat
+        stalled = time.monotonic() - beat - LOOP_LAG_INTERVAL
+        if stalled < SLOW_CALLBACK_THRESHOLD or reported == beat:
+            continue
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            continue
+        reported = beat
+        last_stack = "".join(traceback.format_stack(frame))
+        slow_callbacks.inc()
+        logger.warning("Event loop blocked for over %.3f s; loop thread stack:\n%s", stalled, last_stack)
+
+
+def start():
+    """Start measuring the running loop; called from the app lifespan."""
+    global _handle, _watchdog, _heartbeat
+    if not LOOP_MONITOR_ENABLED or _handle is not None:
+        return
+    loop = asyncio.get_running_loop()
+    _heartbeat = time.monotonic()
+    _handle = loop.call_at(loop.time() + LOOP_LAG_INTERVAL, _tick, loop, loop.time() + LOOP_LAG_INTERVAL)
+    _stopping.clear()
+    _watchdog = threading.Thread(target=_watch, args=(threading.get_ident(),), name="loopmon", daemon=True)
+    _watchdog.start()
+
+
+def stop():
+    global _handle, _watchdog
+    if _handle is not None:
+        _handle.cancel()
+        _handle = None
+    if _watchdog is not None:
+        _stopping.set()
+        _watchdog.join()
+        _watchdog = None
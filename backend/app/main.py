@@ -1,16 +1,74 @@
-from fastapi import FastAPI
+import time
+_BOOT_STARTED = time.perf_counter()  # Taken before the heavy imports below
+
+import logging
+import resource
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import Response
 from contextlib import asynccontextmanager
 from pathlib import Path
-from .db import init_db
-from .routers import auth, leaderboard
+import os
+from .db import engine, init_db
+from typing import List
+from . import background, offload, loopmon
+from .static_files import StaticIndex
+from .compression import CompressionMiddleware
+from .ratelimit import AdmissionMiddleware
+from .routers import auth, leaderboard, metrics
+
+logger = logging.getLogger("uvicorn.error")
+
+def _rss_mib() -> float:
+    """Current resident set size of this process in MiB."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / (1024 * 1024)
+    except OSError:
+        # Not Linux: fall back to the peak RSS (KiB on Linux/BSD, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if peak > 1 << 30 else peak / 1024
+
+def periodic_jobs() -> List[background.PeriodicJob]:
+    """The periodic jobs this worker runs; their modules are only imported here."""
+    from . import analytics, partitions, rankhistory, sketches, snapshot, tokens, windows
+    Job = background.PeriodicJob
+    jobs = [
+        # Per worker: each worker's own revocation list and unflushed sketch deltas
+        Job("sync_revocations", tokens.REVOCATION_SYNC_INTERVAL, tokens.sync_revocations_job),
+        Job("flush_sketches", sketches.SKETCH_FLUSH_INTERVAL, sketches.flush_sketches),
+        # Once per deployment, in the leader worker
+        Job("roll_over_windows", windows.WINDOW_ROLLOVER_INTERVAL, windows.roll_over_windows, cluster_wide=True),
+        Job("snapshot_ranks", rankhistory.RANK_SNAPSHOT_INTERVAL, rankhistory.snapshot_ranks, cluster_wide=True),
+    ]
+    if engine.dialect.name == "postgresql":
+        # SQLite keeps a single leaderboard table
+        jobs.append(Job("ensure_partitions", partitions.PARTITION_CHECK_INTERVAL, partitions.ensure_partitions_job,
+                        cluster_wide=True))
+    # Per host: one worker per host takes the snapshot's file lock
+    if snapshot.SNAPSHOT_ENABLED:
+        jobs.append(Job("build_snapshot", snapshot.SNAPSHOT_INTERVAL, snapshot.build_snapshot))
+    if analytics.ENABLED:
+        jobs.append(Job("analytics_refresh", analytics.ANALYTICS_REFRESH_SECONDS, analytics.refresh))
+    return jobs
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await init_db()
-    yield
+    # app.server creates the tables once before forking workers
+    if os.getenv("SKIP_INIT_DB") != "1":
+        await init_db()
+    logger.info(
+        "Startup complete in %.0f ms (pid %d, RSS %.1f MiB)",
+        (time.perf_counter() - _BOOT_STARTED) * 1000, os.getpid(), _rss_mib(),
+    )
+    loopmon.start()
+    try:
+        async with background.running(periodic_jobs()):
+            yield
+    finally:
+        loopmon.stop()
+        offload.shutdown()
 
 app = FastAPI(
     title="Snake Rivals Arena API",
@@ -19,6 +77,10 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Bound concurrent API requests below the DB pool size; excess load gets 503 + Retry-After.
+# Added first so it sits inside CORS and its 503s carry CORS headers.
+app.add_middleware(AdmissionMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -28,33 +90,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress API responses above COMPRESSION_MIN_SIZE (brotli when available, else gzip)
+app.add_middleware(CompressionMiddleware)
+
 # Include API routers with /api prefix
 app.include_router(auth.router, prefix="/api")
 app.include_router(leaderboard.router, prefix="/api")
+app.include_router(metrics.router, prefix="/api")
 
-# Mount static files for frontend
+# Serve the built frontend. The directory is indexed once here; requests never hit
+# the filesystem to find out whether a path exists.
 static_dir = Path(__file__).parent.parent / "static"
 if static_dir.exists():
-    app.mount("/assets", StaticFiles(directory=static_dir / "assets"), name="assets")
-    
-    # Serve index.html for root and all non-API routes (SPA routing)
-    @app.get("/")
-    async def serve_root():
-        return FileResponse(static_dir / "index.html")
-    
-    @app.get("/{full_path:path}")
-    async def serve_spa(full_path: str):
+    static_index = StaticIndex(static_dir)
+    spa_index = static_index.get("index.html")
+
+    @app.api_route("/", methods=["GET", "HEAD"])
+    async def serve_root(request: Request):
+        return static_index.serve(request, spa_index)
+
+    @app.api_route("/{full_path:path}", methods=["GET", "HEAD"])
+    async def serve_spa(request: Request, full_path: str):
         # Don't intercept API routes
         if full_path.startswith("api/"):
             return {"error": "Not found"}
-        
-        # Check if the requested file exists
-        file_path = static_dir / full_path
-        if file_path.is_file():
-            return FileResponse(file_path)
-        
-        # For all other routes, serve index.html (SPA routing)
-        return FileResponse(static_dir / "index.html")
+
+        # Known files are served directly, everything else gets index.html (SPA routing)
+        asset = static_index.get(full_path)
+        if asset is None:
+            if full_path.startswith("assets/"):
+                # A missing hashed asset must not be answered with HTML
+                return Response(status_code=404)
+            asset = spa_index
+        return static_index.serve(request, asset)
 else:
     # Fallback if static directory doesn't exist
     @app.get("/")
@@ -0,0 +1,207 @@
+"""
+Data-repair jobs, run from the command line::
+
+    uv run python -m app.maintenance list
+    uv run python -m app.maintenance init-groups [--dry-run] [--batch-size N] [--pause S]
+    uv run python -m app.maintenance archive-scores [--dry-run] [--batch-size N]
+    uv run python -m app.maintenance rebuild-sketches [--batch-size N]
+    uv run python -m app.maintenance rebuild-windows [--batch-size N]
+
+Jobs express their repair as one set-based statement that handles at most
+``:batch_size`` rows per execution. ``run_batched`` executes it repeatedly, one
+short transaction per batch, until a batch comes back short, reporting progress
+as it goes. ``--dry-run`` only counts the rows that would change.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import archive, partitions, sketches, windows
+from .db import SessionLocal, init_db, insert_for
+from .sql_models import Group, generate_uuid
+from .versioning import bump_membership
+
+
+@dataclass
+class BatchedStatement:
+    name: str
+    statement: str  # Changes at most :batch_size rows per execution
+    count: str      # Rows the statement would still change
+    params: Dict[str, object] = field(default_factory=dict)
+
+
+async def count_pending(db: AsyncSession, job: BatchedStatement) -> int:
+    return (await db.execute(text(job.count), job.params)).scalar() or 0
+
+
+async def run_batched(db: AsyncSession, job: BatchedStatement, batch_size: int = 1000,
+                      pause: float = 0.0, dry_run: bool = False, report: Callable[[str], None] = print) -> int:
+    """Run ``job`` in committed batches; return the number of rows changed (or pending, for dry runs)."""
+    pending = await count_pending(db, job)
+    if dry_run or not pending:
+        report(f"{job.name}: {pending} rows {'would change' if pending else 'need no change'}")
+        return pending
+
+    done = 0
+    started = time.monotonic()
+    while True:
+        result = await db.execute(text(job.statement), {**job.params, "batch_size": batch_size})
+        await db.commit()
+        done += result.rowcount
+        rate = done / max(time.monotonic() - started, 1e-6)
+        report(f"{job.name}: {done}/{pending} rows ({rate:.0f} rows/s)")
+        if result.rowcount < batch_size:
+            return done
+        if pause:
+            # Leaves room for the live workload between batches
+            await asyncio.sleep(pause)
+
+
+JobFn = Callable[[AsyncSession, argparse.Namespace], Awaitable[None]]
+JOBS: Dict[str, tuple] = {}
+
+
+def job(name: str, help: str):
+    def register(fn: JobFn) -> JobFn:
+        JOBS[name] = (fn, help)
+        return fn
+    return register
+
+
+async def ensure_group(db: AsyncSession, name: str, dry_run: bool = False):
+    """Id of the group called ``name``, creating it unless this is a dry run."""
+    if not dry_run:
+        await db.execute(
+            insert_for(db)(Group).values(id=generate_uuid(), name=name).on_conflict_do_nothing(index_elements=["name"])
+        )
+        await db.commit()
+    return (await db.execute(select(Group.id).where(Group.name == name))).scalar()
+
+
+# Users without any group, skipping those whose username or email is already taken
+# in the target group, and keeping only the lowest id among the still-assignable
+# groupless users that would collide with each other (user_groups enforces
+# per-group uniqueness). Collisions can chain (A~B, B~C): a pass takes A, which
+# rules out B, and only the next pass can take C, so callers repeat it until it
+# assigns nobody.
+_GROUPLESS_USERS = """
+    FROM users u
+    WHERE NOT EXISTS (SELECT 1 FROM user_groups ug WHERE ug.user_id = u.id)
+      AND NOT EXISTS (
+          SELECT 1 FROM user_groups t
+          WHERE t.group_id = :group_id AND (t.username = u.username OR t.email = u.email)
+      )
+      AND u.id = (
+          SELECT MIN(u2.id) FROM users u2
+          WHERE (u2.username = u.username OR u2.email = u.email)
+            AND NOT EXISTS (SELECT 1 FROM user_groups ug2 WHERE ug2.user_id = u2.id)
+            AND NOT EXISTS (
+                SELECT 1 FROM user_groups t2
+                WHERE t2.group_id = :group_id AND (t2.username = u2.username OR t2.email = u2.email)
+            )
+      )
+"""
+
+
+def assign_groupless_users(group_id: str) -> BatchedStatement:
+    return BatchedStatement(
+        name="assign groupless users",
+        statement=(
+            "INSERT INTO user_groups (user_id, group_id, username, email) "
+            f"SELECT u.id, :group_id, u.username, u.email {_GROUPLESS_USERS} LIMIT :batch_size"
+        ),
+        count=f"SELECT COUNT(*) {_GROUPLESS_USERS}",
+        params={"group_id": group_id},
+    )
+
+
+@job("init-groups", "Put every user without a group into the 'other' group")
+async def init_groups(db: AsyncSession, args: argparse.Namespace):
+    group_id = await ensure_group(db, "other", dry_run=args.dry_run)
+    if group_id is None:
+        print("'other' group would be created")
+        group_id = ""  # Nobody is in it yet, so the dry-run count still holds
+    assigned = 0
+    while True:
+        changed = await run_batched(db, assign_groupless_users(group_id), args.batch_size, args.pause, args.dry_run)
+        assigned += changed
+        # Each pass can unblock users whose collision partner was just ruled out
+        if args.dry_run or not changed:
+            break
+    if assigned and not args.dry_run:
+        # Those users' scores now show up in the group's leaderboards
+        await bump_membership(db, [group_id])
+        await db.commit()
+    remaining = (await db.execute(text(
+        "SELECT COUNT(*) FROM users u WHERE NOT EXISTS (SELECT 1 FROM user_groups ug WHERE ug.user_id = u.id)"
+    ))).scalar()
+    if remaining and not args.dry_run:
+        print(f"{remaining} users still have no group (username/email already taken in 'other')")
+
+
+@job("ensure-partitions", "Create upcoming monthly leaderboard partitions (Postgres)")
+async def ensure_partitions(db: AsyncSession, args: argparse.Namespace):
+    if not await partitions.is_partitioned(db):
+        print("leaderboard is not partitioned; nothing to do")
+        return
+    if args.dry_run:
+        print(f"Would ensure partitions up to {partitions.PARTITION_MONTHS_AHEAD} months ahead")
+        return
+    created = await partitions.ensure_partitions(db)
+    print(f"Created: {', '.join(created)}" if created else "All partitions exist")
+
+
+@job("archive-scores", f"Move non-best scores older than {archive.ARCHIVE_RETENTION_DAYS} days to Parquet")
+async def archive_scores(db: AsyncSession, args: argparse.Namespace):
+    await archive.archive_cold_scores(db, batch_size=args.batch_size, dry_run=args.dry_run)
+
+
+@job("rebuild-sketches", "Recompute the percentile and player-count sketches from the leaderboard table")
+async def rebuild_sketches(db: AsyncSession, args: argparse.Namespace):
+    if args.dry_run:
+        total = (await db.execute(text("SELECT COUNT(*) FROM leaderboard"))).scalar()
+        print(f"Would rebuild sketches from {total} scores")
+        return
+    await sketches.rebuild(db, batch_size=args.batch_size)
+
+
+@job("rebuild-windows", "Recompute the open daily, weekly and season leaderboards from their scores")
+async def rebuild_windows(db: AsyncSession, args: argparse.Namespace):
+    if args.dry_run:
+        print("Would rebuild the open windows starting " + ", ".join(
+            f"{period} {windows.window_start(period, datetime.now(timezone.utc).date())}" for period in windows.PERIODS))
+        return
+    await windows.rebuild(db, batch_size=args.batch_size)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m app.maintenance", description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="job", required=True)
+    sub.add_parser("list", help="List available jobs")
+    for name, (_, help) in JOBS.items():
+        p = sub.add_parser(name, help=help)
+        p.add_argument("--dry-run", action="store_true", help="Only report what would change")
+        p.add_argument("--batch-size", type=int, default=1000)
+        p.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    if args.job == "list":
+        for name, (_, help) in JOBS.items():
+            print(f"{name:20} {help}")
+        return
+    await init_db()
+    async with SessionLocal() as db:
+        await JOBS[args.job][0](db, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+"""
+Minimal in-process metrics registry.
+
+Modules create their counters at import time with ``counter("name", "help")``
+and bump them with ``.inc()``. ``GET /api/metrics`` returns a snapshot of every
+registered metric for the worker that serves the request.
+"""
+import os
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Sequence
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = threading.Lock()  # Incremented from executor threads too
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self.value += amount
+
+    def collect(self):
+        return self.value
+
+
+class Gauge:
+    """A value read on demand from a callback (queue depth, in-flight count, ...)."""
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def collect(self):
+        return self.read()
+
+
+class Histogram:
+    """Counts of observations per cumulative upper bound, plus their count and sum."""
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot: above every bound
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def collect(self):
+        cumulative, le = 0, {}
+        for bound, n in zip((*self.buckets, "+Inf"), self.counts):
+            cumulative += n
+            le[str(bound)] = cumulative
+        return {"count": self.count, "sum": round(self.sum, 6), "le": le}
+
+
+_registry: Dict[str, object] = {}
+
+
+def counter(name: str, help: str) -> Counter:
+    metric = _registry.get(name)
+    if metric is None:
+        metric = _registry[name] = Counter(name, help)
+    return metric
+
+
+def gauge(name: str, help: str, read: Callable[[], float]) -> Gauge:
+    metric = _registry[name] = Gauge(name, help, read)
+    return metric
+
+
+def histogram(name: str, help: str, buckets: Sequence[float]) -> Histogram:
+    metric = _registry.get(name)
+    if metric is None:
+        metric = _registry[name] = Histogram(name, help, buckets)
+    return metric
+
+
+def register(name: str, metric) -> None:
+    """Register any object with ``help`` and ``collect()`` (e.g. a histogram)."""
+    _registry[name] = metric
+
+
+def snapshot() -> dict:
+    return {
+        "pid": os.getpid(),
+        "metrics": {name: metric.collect() for name, metric in sorted(_registry.items())},
+    }
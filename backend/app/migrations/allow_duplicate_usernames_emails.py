@@ -13,6 +13,7 @@ import os
 import uuid
 from sqlalchemy import create_engine, text
 from app.db import DATABASE_URL
+from app.backfill import Backfill, run_backfill
 
 
 def _sync_url(url: str) -> str:
@@ -25,16 +26,23 @@ def _sync_url(url: str) -> str:
     return url
 
 
+COPY_USER_GROUPS = '''
+    INSERT OR IGNORE INTO user_groups_new (user_id, group_id, username, email)
+    SELECT ug.user_id, ug.group_id, u.username, u.email
+    FROM user_groups ug
+    LEFT JOIN users u ON u.id = ug.user_id
+'''
+
+
 def migrate_sqlite(engine):
     conn = engine.connect()
-    trans = conn.begin()
     try:
         # Check if username column already exists
         res = conn.execute(text("PRAGMA table_info(user_groups)"))
         cols = [r[1] for r in res]
         if 'username' in cols and 'email' in cols:
             print('user_groups already has username/email columns — skipping')
-            trans.commit()
+            conn.commit()
             return
 
         print('Creating new user_groups table with username/email and unique constraints')
@@ -50,47 +58,62 @@ def migrate_sqlite(engine):
                 UNIQUE (group_id, email)
             )
         '''))
-
-        # Copy existing user_groups with username/email joined from users
-        conn.execute(text('''
-            INSERT OR IGNORE INTO user_groups_new (user_id, group_id, username, email)
-            SELECT ug.user_id, ug.group_id, u.username, u.email
-            FROM user_groups ug
-            LEFT JOIN users u ON u.id = ug.user_id
-        '''))
-
-        # Ensure every user has at least one group: assign to 'other' if none
-        # Create 'other' group if missing
-        other = conn.execute(text("SELECT id FROM groups WHERE name='other' LIMIT 1")).fetchone()
-        if other is None:
-            conn.execute(text("INSERT INTO groups (id, name) VALUES (lower(hex(randomblob(16))), 'other')"))
+        conn.commit()
+
+        # Copy existing user_groups with username/email joined from users, in
+        # resumable chunks of users
+        run_backfill(conn, Backfill(
+            name='allow_duplicates.user_groups_copy',
+            table='user_groups',
+            key='user_id',
+            statement=COPY_USER_GROUPS + ' WHERE ug.user_id > :lo AND ug.user_id <= :hi',
+        ))
+
+        trans = conn.begin()
+        try:
+            # Catch up with memberships added or removed while the chunks were
+            # copied. The INSERT takes SQLite's write lock, so nothing else can
+            # change user_groups until the swap commits.
+            conn.execute(text(COPY_USER_GROUPS))
+            conn.execute(text('''
+                DELETE FROM user_groups_new
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM user_groups ug
+                    WHERE ug.user_id = user_groups_new.user_id AND ug.group_id = user_groups_new.group_id
+                )
+            '''))
+
+            # Ensure every user has at least one group: assign to 'other' if none
+            # Create 'other' group if missing
             other = conn.execute(text("SELECT id FROM groups WHERE name='other' LIMIT 1")).fetchone()
-        other_id = other[0]
-
-        # Insert users without groups into user_groups_new
-        conn.execute(text('''
-            INSERT OR IGNORE INTO user_groups_new (user_id, group_id, username, email)
-            SELECT u.id, :other_id, u.username, u.email
-            FROM users u
-            WHERE NOT EXISTS (SELECT 1 FROM user_groups ug WHERE ug.user_id = u.id)
-        '''), {'other_id': other_id})
-
-        # Drop old table and rename new
-        conn.execute(text('DROP TABLE IF EXISTS user_groups'))
-        conn.execute(text('ALTER TABLE user_groups_new RENAME TO user_groups'))
+            if other is None:
+                conn.execute(text("INSERT INTO groups (id, name) VALUES (lower(hex(randomblob(16))), 'other')"))
+                other = conn.execute(text("SELECT id FROM groups WHERE name='other' LIMIT 1")).fetchone()
+            other_id = other[0]
+
+            # Insert users without groups into user_groups_new
+            conn.execute(text('''
+                INSERT OR IGNORE INTO user_groups_new (user_id, group_id, username, email)
+                SELECT u.id, :other_id, u.username, u.email
+                FROM users u
+                WHERE NOT EXISTS (SELECT 1 FROM user_groups ug WHERE ug.user_id = u.id)
+            '''), {'other_id': other_id})
+
+            # Drop old table and rename new
+            conn.execute(text('DROP TABLE IF EXISTS user_groups'))
+            conn.execute(text('ALTER TABLE user_groups_new RENAME TO user_groups'))
 
-        trans.commit()
+            trans.commit()
+        except Exception:
+            trans.rollback()
+            raise
         print('SQLite migration completed successfully')
-    except Exception:
-        trans.rollback()
-        raise
     finally:
         conn.close()
 
 
 def migrate_postgres(engine):
     conn = engine.connect()
-    trans = conn.begin()
     try:
         # Add columns if missing
         res = conn.execute(text("SELECT column_name FROM information_schema.columns WHERE table_name='user_groups'"))
@@ -99,14 +122,35 @@ def migrate_postgres(engine):
             conn.execute(text('ALTER TABLE user_groups ADD COLUMN username TEXT'))
         if 'email' not in cols:
             conn.execute(text('ALTER TABLE user_groups ADD COLUMN email TEXT'))
+        conn.commit()
+
+        # Populate username/email from users, one committed chunk of users at a time
+        run_backfill(conn, Backfill(
+            name='allow_duplicates.user_groups_names',
+            table='user_groups',
+            key='user_id',
+            statement='''
+                UPDATE user_groups ug
+                SET username = u.username,
+                    email = u.email
+                FROM users u
+                WHERE u.id = ug.user_id
+                AND ug.user_id > :lo AND ug.user_id <= :hi
+            ''',
+        ))
+    finally:
+        conn.close()
 
-        # Populate username/email from users
+    conn = engine.connect()
+    trans = conn.begin()
+    try:
+        # Memberships added during the chunked backfill by code that did not set the names
         conn.execute(text('''
             UPDATE user_groups ug
             SET username = u.username,
                 email = u.email
             FROM users u
-            WHERE u.id = ug.user_id
+            WHERE u.id = ug.user_id AND ug.username IS NULL
         '''))
 
         # Create unique constraints if they don't exist (some Postgres versions don't support IF NOT EXISTS)
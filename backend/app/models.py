@@ -9,6 +9,11 @@ class GameMode(str, Enum):
     space_invaders = "space_invaders"
     tetris = "tetris"
 
+class LeaderboardPeriod(str, Enum):
+    daily = "daily"
+    weekly = "weekly"
+    season = "season"
+
 class Group(BaseModel):
     id: str
     name: str
@@ -0,0 +1,74 @@
+"""
+Process-pool offload for CPU-bound result shaping.
+
+``await run(fn, *args, size=n)`` calls ``fn(*args)`` inline when ``n`` is below
+``OFFLOAD_MIN_ROWS`` (pickling would cost more than it saves) and otherwise in
+a pool of ``OFFLOAD_WORKERS`` processes, so the event loop keeps serving other
+requests meanwhile. ``fn`` must be a module-level function; pass columns (NumPy
+arrays, lists of strings) rather than ORM rows so the arguments pickle cheaply.
+``OFFLOAD_WORKERS=0`` keeps everything inline. If a pool process dies (killed
+by the OOM killer, say) the pool is broken for good; ``run`` then replaces it
+and retries once, and runs the call inline if the new pool breaks too.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, TypeVar
+
+from .metrics import counter
+
+OFFLOAD_WORKERS = int(os.getenv("OFFLOAD_WORKERS", "2"))
+OFFLOAD_MIN_ROWS = int(os.getenv("OFFLOAD_MIN_ROWS", "20000"))
+
+offloaded = counter("offload_calls", "Transforms run in the process pool")
+inline = counter("offload_inline_calls", "Transforms run on the event loop (below OFFLOAD_MIN_ROWS)")
+broken = counter("offload_broken_pools", "Process pools replaced after a worker process died")
+
+logger = logging.getLogger("uvicorn.error")
+
+T = TypeVar("T")
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: children must not inherit the event loop, sockets or DB connections
+        _pool = ProcessPoolExecutor(OFFLOAD_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+async def run(fn: Callable[..., T], *args, size: int) -> T:
+    """``fn(*args)``, in the process pool when ``size`` (rows of input) is large enough."""
+    if OFFLOAD_WORKERS <= 0 or size < OFFLOAD_MIN_ROWS:
+        inline.inc()
+        return fn(*args)
+    offloaded.inc()
+    for _ in range(2):
+        pool = _get_pool()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            logger.warning("Offload pool broken; replacing it")
+            broken.inc()
+            _discard(pool)
+    inline.inc()
+    return fn(*args)
+
+
+def _discard(pool: ProcessPoolExecutor):
+    global _pool
+    # Concurrent calls may already have replaced it
+    if _pool is pool:
+        _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,183 @@
+"""
+Monthly range partitions of ``leaderboard`` on Postgres.
+
+Migration ``9b4f6d2e8c13`` turns ``leaderboard`` into a table partitioned by
+``RANGE ("timestamp")`` with one partition per calendar month (UTC) plus a
+default partition. Partitions for the current month and the next
+``PARTITION_MONTHS_AHEAD`` months are created ahead of time by
+``ensure_partitions``, which runs periodically in the leader worker (see
+``app.background``) and as ``python -m app.maintenance ensure-partitions``; an
+advisory lock keeps the two from running at once.
+
+SQLite, and Postgres databases created with ``create_all``, keep the plain
+table; ``ensure_partitions`` does nothing there.
+
+The migration copies the plain table into ``leaderboard_partitioned`` in
+resumable chunks while the game keeps writing to the old table, and swaps the
+tables only at the end, after a last catch-up pass under a write lock. Rows
+without a timestamp are first given a fixed one, so every copy of a row
+(including a repeated chunk after a resume) has the same primary key.
+"""
+import logging
+import os
+from datetime import date, datetime
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .backfill import Backfill
+from .db import SessionLocal
+
+logger = logging.getLogger("uvicorn.error")
+
+PARENT = "leaderboard"
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+PARTITION_CHECK_INTERVAL = float(os.getenv("PARTITION_CHECK_INTERVAL", str(6 * 3600)))
+PARTITION_LOCK_ID = 7261002
+
+
+def add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month.year}_{month.month:02d}"
+
+
+def create_partition_sql(month: date, parent: str = PARENT) -> str:
+    month = month.replace(day=1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {parent} "
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+    )
+
+
+def months_between(first: date, last: date) -> List[date]:
+    months, month = [], first.replace(day=1)
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+# --- Migrating the plain table (revision 9b4f6d2e8c13) ---
+
+STAGING = "leaderboard_partitioned"
+COLUMNS = 'id, user_id, username, score, game_mode, "timestamp"'
+
+
+def null_timestamp_fill(conn: Connection) -> datetime:
+    """Timestamp for rows that have none: the oldest one (or this month), the same on every resumed run."""
+    return conn.execute(text(
+        f"SELECT COALESCE(MIN(\"timestamp\"), date_trunc('month', now())) FROM {PARENT}"
+    )).scalar()
+
+
+def fill_timestamps_backfill(fill: datetime) -> Backfill:
+    return Backfill(
+        name="9b4f6d2e8c13.leaderboard_timestamps",
+        table=PARENT,
+        key="id",
+        statement=f"UPDATE {PARENT} SET \"timestamp\" = '{fill.isoformat()}' "
+                  f"WHERE \"timestamp\" IS NULL AND id > :lo AND id <= :hi",
+    )
+
+
+def create_staging_sql(first_month: date, last_month: date) -> List[str]:
+    """The partitioned copy of ``leaderboard``, with its partitions (idempotent, for resumed runs)."""
+    return [
+        f"CREATE TABLE IF NOT EXISTS {STAGING} (LIKE {PARENT} INCLUDING DEFAULTS) PARTITION BY RANGE (\"timestamp\")",
+        # The partition key must be part of the primary key (and therefore NOT NULL)
+        f'ALTER TABLE {STAGING} ALTER COLUMN "timestamp" SET NOT NULL',
+        f"""DO $$ BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = '{STAGING}_pkey') THEN
+                    ALTER TABLE {STAGING} ADD CONSTRAINT {STAGING}_pkey PRIMARY KEY (id, "timestamp");
+                    ALTER TABLE {STAGING} ADD CONSTRAINT leaderboard_part_user_id_fkey
+                        FOREIGN KEY (user_id) REFERENCES users (id);
+                END IF;
+            END $$""",
+        f"CREATE INDEX IF NOT EXISTS ix_{STAGING}_username ON {STAGING} (username)",
+        f"CREATE INDEX IF NOT EXISTS ix_{STAGING}_user_id ON {STAGING} (user_id)",
+        *(create_partition_sql(month, STAGING) for month in months_between(first_month, last_month)),
+        f"CREATE TABLE IF NOT EXISTS {PARENT}_default PARTITION OF {STAGING} DEFAULT",
+    ]
+
+
+def _copy_select(fill: datetime) -> str:
+    # Rows written without a timestamp since the fill get the same fixed one
+    return (f"SELECT id, user_id, username, score, game_mode, COALESCE(\"timestamp\", '{fill.isoformat()}') "
+            f"FROM {PARENT} l")
+
+
+def copy_backfill(fill: datetime) -> Backfill:
+    return Backfill(
+        name="9b4f6d2e8c13.leaderboard_copy",
+        table=PARENT,
+        key="id",
+        statement=f"INSERT INTO {STAGING} ({COLUMNS}) {_copy_select(fill)} "
+                  f"WHERE id > :lo AND id <= :hi ON CONFLICT DO NOTHING",
+    )
+
+
+def catch_up_sql(fill: datetime) -> List[str]:
+    """Bring the copy level with rows written or deleted since their chunk was copied.
+
+    Ids are UUIDs, so new rows can land anywhere in the key order.
+    """
+    return [
+        f"INSERT INTO {STAGING} ({COLUMNS}) {_copy_select(fill)} "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {STAGING} p WHERE p.id = l.id) ON CONFLICT DO NOTHING",
+        f"DELETE FROM {STAGING} p WHERE NOT EXISTS (SELECT 1 FROM {PARENT} l WHERE l.id = p.id)",
+    ]
+
+
+def swap_sql(fill: datetime) -> List[str]:
+    """Catch up under a write lock and replace the plain table (run in one transaction)."""
+    return [
+        # Reads go on during the catch-up; writes wait for the swap
+        f"LOCK TABLE {PARENT} IN SHARE ROW EXCLUSIVE MODE",
+        *catch_up_sql(fill),
+        f"DROP TABLE {PARENT}",
+        f"ALTER TABLE {STAGING} RENAME TO {PARENT}",
+        f"ALTER TABLE {PARENT} RENAME CONSTRAINT {STAGING}_pkey TO {PARENT}_pkey",
+        f"ALTER INDEX ix_{STAGING}_username RENAME TO ix_{PARENT}_username",
+        f"ALTER INDEX ix_{STAGING}_user_id RENAME TO ix_{PARENT}_user_id",
+    ]
+
+
+async def is_partitioned(db: AsyncSession) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    # Compared in SQL: asyncpg returns the "char" relkind as bytes
+    return bool((await db.execute(
+        text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:t)"), {"t": PARENT}
+    )).scalar())
+
+
+async def ensure_partitions(db: AsyncSession, months_ahead: int = PARTITION_MONTHS_AHEAD, today: date = None) -> List[str]:
+    """Create missing partitions up to ``months_ahead`` months from now; return their names."""
+    if not await is_partitioned(db):
+        return []
+    # Another worker holding the lock is doing the same job
+    if not (await db.execute(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": PARTITION_LOCK_ID})).scalar():
+        await db.rollback()
+        return []
+    this_month = (today or date.today()).replace(day=1)
+    created = []
+    for month in months_between(this_month, add_months(this_month, months_ahead)):
+        exists = (await db.execute(text("SELECT to_regclass(:t)"), {"t": partition_name(month)})).scalar()
+        if exists is None:
+            await db.execute(text(create_partition_sql(month)))
+            created.append(partition_name(month))
+    await db.commit()
+    return created
+
+
+async def ensure_partitions_job():
+    async with SessionLocal() as db:
+        created = await ensure_partitions(db)
+    if created:
+        logger.info("Created leaderboard partitions: %s", ", ".join(created))
@@ -0,0 +1,98 @@
+"""
+Password hashing off the event loop.
+
+Passwords are hashed with scrypt (``hashlib.scrypt`` releases the GIL) on a
+small bounded thread pool, so a burst of logins costs CPU on the pool threads
+instead of stalling every other request on the worker. Stored format::
+
+    scrypt$<n>$<r>$<p>$<salt b64>$<hash b64>
+
+Rows written before hashing existed hold the plaintext password. They still
+verify, and ``needs_rehash`` tells login to replace them (and hashes made with
+older cost parameters) with a current hash.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import counter, gauge
+
+SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Hash jobs allowed to wait for a pool thread before new ones are refused
+HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+PREFIX = "scrypt$"
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+_pending = 0
+
+hashes = counter("password_hashes", "scrypt computations run on the hashing pool")
+rejected = counter("password_hash_rejected", "Hash jobs refused because the queue was full")
+rehashed = counter("password_rehashed", "Legacy or outdated password hashes upgraded at login")
+gauge("password_hash_pending", "Hash jobs queued or running", lambda: _pending)
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=2 * 128 * r * n + (1 << 20), dklen=KEY_BYTES)
+
+
+async def _run(fn, *args):
+    global _pending
+    if _pending >= HASH_WORKERS + HASH_MAX_QUEUE:
+        rejected.inc()
+        raise HashingBusy("Password hashing queue is full")
+    _pending += 1
+    try:
+        hashes.inc()
+        return await asyncio.get_running_loop().run_in_executor(_pool, fn, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    salt = os.urandom(SALT_BYTES)
+    key = await _run(_scrypt, password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    b64 = lambda b: base64.b64encode(b).decode()
+    return f"{PREFIX}{SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${b64(salt)}${b64(key)}"
+
+
+async def verify_password(password: str, stored: str) -> bool:
+    if not stored.startswith(PREFIX):
+        # Legacy plaintext row
+        return hmac.compare_digest(password.encode(), stored.encode())
+    # A legacy plaintext password can itself start with the prefix; anything that
+    # doesn't parse as a hash (including scrypt rejecting its parameters) fails
+    parts = stored[len(PREFIX):].split("$")
+    if len(parts) != 5:
+        return False
+    try:
+        n, r, p = (int(x) for x in parts[:3])
+        salt, key = (base64.b64decode(x, validate=True) for x in parts[3:])
+        candidate = await _run(_scrypt, password, salt, n, r, p)
+    except ValueError:  # binascii.Error is a ValueError too
+        return False
+    return hmac.compare_digest(candidate, key)
+
+
+def needs_rehash(stored: str) -> bool:
+    return not stored.startswith(f"{PREFIX}{SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+
+# Verified against when no account matches, so unknown emails take as long as wrong passwords
+_DUMMY_HASH = f"{PREFIX}{SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${base64.b64encode(bytes(SALT_BYTES)).decode()}${base64.b64encode(bytes(KEY_BYTES)).decode()}"
+
+
+async def burn_verification(password: str):
+    await verify_password(password, _DUMMY_HASH)
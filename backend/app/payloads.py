@@ -0,0 +1,35 @@
+"""
+Alternative response shapes for large ranking payloads.
+
+Ranking rows repeat the player's full ``groups`` list on every row. The compact
+shape moves each distinct group into a top-level table once and has the rows
+reference it by index::
+
+    {"groups": [{"id": "...", "name": "..."}], "rows": [{..., "groups": [0]}]}
+"""
+from typing import Any, Dict, List
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+
+def compact_groups(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    table: List[Dict[str, str]] = []
+    index: Dict[str, int] = {}
+    out_rows = []
+    for row in rows:
+        refs = []
+        for group in row.get("groups", []):
+            pos = index.get(group["id"])
+            if pos is None:
+                pos = index[group["id"]] = len(table)
+                table.append(group)
+            refs.append(pos)
+        out_rows.append({**row, "groups": refs})
+    return {"groups": table, "rows": out_rows}
+
+
+def compact_response(rows: List[Dict[str, Any]], response: Response) -> JSONResponse:
+    """Compact-shaped JSON response keeping headers already set on ``response``."""
+    return JSONResponse(jsonable_encoder(compact_groups(rows)), headers=dict(response.headers))
@@ -0,0 +1,121 @@
+"""
+Per-endpoint statement timeouts (see ``app.endpoints``) and cancellation of queries whose client went away.
+
+``statement_timeout`` bounds the queries run on a session: on Postgres through
+``SET LOCAL statement_timeout`` (the server aborts the statement), on SQLite
+through a progress handler that interrupts the running statement.
+
+``run_guarded`` additionally watches the ASGI connection; when the client
+disconnects it interrupts the statement and cancels the in-flight work so the
+connection goes back to the pool instead of finishing a result nobody reads.
+"""
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, TypeVar
+
+from fastapi import Request, Response
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .endpoints import policy
+from .metrics import counter
+
+T = TypeVar("T")
+
+# SQLite calls the progress handler every N virtual machine instructions
+SQLITE_PROGRESS_STEPS = 10_000
+
+# Status logged for requests abandoned by the client (nginx convention)
+CLIENT_CLOSED_REQUEST = 499
+
+timed_out = counter("queries_timed_out", "Statements aborted by the per-route statement timeout")
+cancelled = counter("queries_cancelled_disconnect", "Queries cancelled because the client disconnected")
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+def _is_timeout(error: DBAPIError) -> bool:
+    orig = error.orig
+    if getattr(orig, "sqlstate", None) == "57014":  # Postgres query_canceled
+        return True
+    return "interrupted" in str(orig)  # sqlite3.OperationalError from the progress handler
+
+
+@asynccontextmanager
+async def statement_timeout(db: AsyncSession, seconds: float, abort: threading.Event = None):
+    """Bound every statement run on ``db`` inside the block to ``seconds``.
+
+    ``abort`` lets another task interrupt a running SQLite statement early.
+    Timeouts surface as ``QueryTimeout``.
+    """
+    conn = await db.connection()
+    dialect = conn.dialect.name
+    raw = None
+    if dialect == "postgresql":
+        # SET cannot take bind parameters; the value is a formatted integer
+        await conn.execute(text(f"SET LOCAL statement_timeout = {int(seconds * 1000)}"))
+    elif dialect == "sqlite":
+        raw = (await conn.get_raw_connection()).driver_connection
+        deadline = time.monotonic() + seconds
+        abort = abort or threading.Event()
+
+        def progress() -> int:
+            # Runs on aiosqlite's worker thread; non-zero interrupts the statement
+            return 1 if abort.is_set() or time.monotonic() > deadline else 0
+
+        await raw.set_progress_handler(progress, SQLITE_PROGRESS_STEPS)
+    try:
+        yield
+    except DBAPIError as e:
+        if _is_timeout(e) and not (abort and abort.is_set()):
+            timed_out.inc()
+            raise QueryTimeout(f"Query exceeded {seconds:g}s") from e
+        raise
+    finally:
+        if raw is not None:
+            await raw.set_progress_handler(None, SQLITE_PROGRESS_STEPS)
+
+
+async def _wait_for_disconnect(request: Request):
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def run_guarded(request: Request, db: AsyncSession, name: str, fn: Callable[[], Awaitable[T]]):
+    """Run ``fn`` (which queries ``db``) under the endpoint's timeout, cancelling it on disconnect.
+
+    Returns ``fn``'s result, or a bare 499 Response when the client disconnected.
+    """
+    abort = threading.Event()
+
+    async def guarded():
+        async with statement_timeout(db, policy(name).timeout, abort):
+            return await fn()
+
+    work = asyncio.ensure_future(guarded())
+    watcher = asyncio.create_task(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        work.cancel()
+        raise
+    finally:
+        watcher.cancel()
+
+    if not work.done():
+        cancelled.inc()
+        abort.set()  # Stops a running SQLite statement; asyncpg cancels on task cancel
+        work.cancel()
+        try:
+            await work
+        except (asyncio.CancelledError, DBAPIError):
+            pass
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    return work.result()
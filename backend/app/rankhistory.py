@@ -0,0 +1,140 @@
+"""
+Rank history per player, (game_mode, group).
+
+Every ``RANK_SNAPSHOT_INTERVAL`` seconds (default hourly) one worker ranks every
+player by best score in each mode, over everyone ("*") and within each group,
+and compares the result with ``player_ranks``, the previous snapshot. Only
+players whose rank or best score changed get a ``rank_history`` row, stamped
+with the snapshot time rounded down to the interval: a row holds until the
+player's next one. A player who drops out of a ranking (left the group, or
+their scores were archived or deleted) gets a closing row with a null rank and
+best score, so their last rank does not appear to hold forever. The job runs in
+the leader worker only (see ``app.background``). Overlapping runs of the same
+snapshot write the same rows, so duplicates are ignored; on Postgres an
+advisory lock lets only one of them do the work.
+
+``history`` reads one player's trajectory as a single primary-key range. A
+naive ``since`` is taken as UTC, like the stored times.
+"""
+import os
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import SessionLocal, insert_for
+from .metrics import counter
+from .sql_models import LeaderboardEntry, PlayerRank, RankHistory, user_groups
+from .versioning import ALL_GROUPS
+
+RANK_SNAPSHOT_INTERVAL = float(os.getenv("RANK_SNAPSHOT_INTERVAL", "3600"))
+RANK_SNAPSHOT_LOCK_ID = 7261003
+INSERT_CHUNK = 1000
+
+changes_written = counter("rank_history_changes", "Rank changes written to rank_history")
+
+Key = Tuple[str, str, str]  # (game_mode, group_id, user_id)
+
+
+def snapshot_time(now: Optional[datetime] = None) -> datetime:
+    """``now`` rounded down to the snapshot interval, so all workers stamp the same time."""
+    ts = (now or datetime.now(timezone.utc)).timestamp()
+    return datetime.fromtimestamp(ts - ts % RANK_SNAPSHOT_INTERVAL, timezone.utc)
+
+
+async def current_ranks(db: AsyncSession) -> Dict[Key, Tuple[int, int]]:
+    """{(game_mode, group_id, user_id): (rank, best score)} from the leaderboard table."""
+    ranks: Dict[Key, Tuple[int, int]] = {}
+    best = (
+        select(LeaderboardEntry.game_mode, LeaderboardEntry.user_id, func.max(LeaderboardEntry.score).label("best"))
+        .where(LeaderboardEntry.user_id.isnot(None))
+        .group_by(LeaderboardEntry.game_mode, LeaderboardEntry.user_id)
+        .subquery()
+    )
+    everyone = select(
+        best.c.game_mode, best.c.user_id, best.c.best,
+        func.rank().over(partition_by=best.c.game_mode, order_by=best.c.best.desc()),
+    )
+    for mode, user_id, score, rank in (await db.execute(everyone)).all():
+        ranks[(getattr(mode, "value", mode), ALL_GROUPS, user_id)] = (rank, score)
+    per_group = select(
+        user_groups.c.group_id, best.c.game_mode, best.c.user_id, best.c.best,
+        func.rank().over(partition_by=(user_groups.c.group_id, best.c.game_mode), order_by=best.c.best.desc()),
+    ).join(user_groups, user_groups.c.user_id == best.c.user_id)
+    for group_id, mode, user_id, score, rank in (await db.execute(per_group)).all():
+        ranks[(getattr(mode, "value", mode), group_id, user_id)] = (rank, score)
+    return ranks
+
+
+async def take(db: AsyncSession, now: Optional[datetime] = None) -> int:
+    """Record the ranks that changed since the last snapshot; return how many."""
+    if db.get_bind().dialect.name == "postgresql":
+        # Another worker holding the lock is taking the same snapshot
+        if not (await db.execute(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": RANK_SNAPSHOT_LOCK_ID})).scalar():
+            await db.rollback()
+            return 0
+    taken_at = snapshot_time(now)
+    ranks = await current_ranks(db)
+    previous = {
+        (mode, group_id, user_id): (rank, score)
+        for mode, group_id, user_id, rank, score in (await db.execute(
+            select(PlayerRank.game_mode, PlayerRank.group_id, PlayerRank.user_id, PlayerRank.rank, PlayerRank.best_score)
+        )).all()
+    }
+    changed = [(key, value) for key, value in ranks.items() if previous.get(key) != value]
+    # Players no longer ranked here (left the group, scores archived) close their history
+    gone = previous.keys() - ranks.keys()
+    changed += [(key, (None, None)) for key in gone]
+
+    insert = insert_for(db)
+    for i in range(0, len(changed), INSERT_CHUNK):
+        chunk = changed[i:i + INSERT_CHUNK]
+        await db.execute(insert(RankHistory).values([
+            {"user_id": u, "group_id": g, "game_mode": m, "taken_at": taken_at, "rank": r, "best_score": s}
+            for (m, g, u), (r, s) in chunk
+        ]).on_conflict_do_nothing())
+        ranked = [
+            {"game_mode": m, "group_id": g, "user_id": u, "rank": r, "best_score": s}
+            for (m, g, u), (r, s) in chunk if r is not None
+        ]
+        if not ranked:
+            continue
+        stmt = insert(PlayerRank).values(ranked)
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=["game_mode", "group_id", "user_id"],
+            set_={"rank": stmt.excluded.rank, "best_score": stmt.excluded.best_score},
+        ))
+    for mode, group_id, user_id in gone:
+        await db.execute(delete(PlayerRank).where(
+            PlayerRank.game_mode == mode, PlayerRank.group_id == group_id, PlayerRank.user_id == user_id
+        ))
+    await db.commit()
+    changes_written.inc(len(changed))
+    return len(changed)
+
+
+async def snapshot_ranks():
+    async with SessionLocal() as db:
+        await take(db)
+
+
+async def history(db: AsyncSession, user_id: str, game_mode: Optional[str] = None, group_id: Optional[str] = None,
+                  since: Optional[datetime] = None) -> dict:
+    """A player's rank changes per mode, oldest first: each point holds until the next (a null rank: unranked)."""
+    group = group_id if group_id and group_id != "all" else ALL_GROUPS
+    query = (
+        select(RankHistory.game_mode, RankHistory.taken_at, RankHistory.rank, RankHistory.best_score)
+        .where(RankHistory.user_id == user_id, RankHistory.group_id == group)
+        .order_by(RankHistory.game_mode, RankHistory.taken_at)
+    )
+    if game_mode:
+        query = query.where(RankHistory.game_mode == game_mode)
+    if since:
+        since = since.astimezone(timezone.utc) if since.tzinfo else since.replace(tzinfo=timezone.utc)
+        query = query.where(RankHistory.taken_at >= since)
+    series: Dict[str, list] = {}
+    for mode, taken_at, rank, score in (await db.execute(query)).all():
+        taken_at = taken_at if taken_at.tzinfo else taken_at.replace(tzinfo=timezone.utc)
+        series.setdefault(mode, []).append({"at": taken_at.isoformat(), "rank": rank, "best_score": score})
+    return {"user_id": user_id, "group_id": group, "interval": RANK_SNAPSHOT_INTERVAL, "series": series}
@@ -0,0 +1,209 @@
+"""
+Rate limiting and admission control.
+
+* Token buckets with separate budgets for score submissions
+  (``RATE_LIMIT_WRITES``) and the full-table ranking reads
+  (``RATE_LIMIT_HEAVY_READS``). Every request is charged to the client IP and,
+  when it carries a valid unrevoked token, to the user as well, so neither
+  rotating tokens from one address nor spreading one account over many
+  addresses escapes a budget. The client IP honours X-Forwarded-For only from
+  ``FORWARDED_ALLOW_IPS`` (see ``server.py``), so callers cannot pick their own
+  key. Budgets are written as ``"<requests>/<seconds>"`` and the bucket holds at
+  most ``RATE_LIMIT_BURST`` (x budget) tokens. Exceeding a budget answers 429
+  with Retry-After.
+* ``AdmissionMiddleware`` caps the number of API requests in flight per worker
+  below the DB pool size and answers 503 with Retry-After when the queue for a
+  slot is full or too slow, instead of letting requests pile up on the pool.
+
+Buckets live in process memory by default. Multi-worker deployments can point
+``RATE_LIMIT_BACKEND`` at a ``module:Class`` implementing ``BucketBackend``
+(e.g. backed by Redis) so all workers share one budget.
+"""
+import abc
+import asyncio
+import importlib
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Tuple
+
+from fastapi import HTTPException, Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from . import tokens
+from .db import DATABASE_URL, pool_options
+from .metrics import counter, gauge
+
+
+@dataclass(frozen=True)
+class Budget:
+    rate: float   # Tokens added per second
+    burst: float  # Bucket capacity
+
+    @classmethod
+    def parse(cls, spec: str, burst_factor: float) -> "Budget":
+        count, _, seconds = spec.partition("/")
+        count = float(count)
+        return cls(rate=count / float(seconds or 1), burst=max(count * burst_factor, 1))
+
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+BURST_FACTOR = float(os.getenv("RATE_LIMIT_BURST", "0.5"))
+WRITE_BUDGET = Budget.parse(os.getenv("RATE_LIMIT_WRITES", "30/60"), BURST_FACTOR)
+HEAVY_READ_BUDGET = Budget.parse(os.getenv("RATE_LIMIT_HEAVY_READS", "120/60"), BURST_FACTOR)
+
+
+class BucketBackend(abc.ABC):
+    """Storage for token buckets; implementations must make ``take`` atomic per key."""
+
+    @abc.abstractmethod
+    async def take(self, key: str, budget: Budget, cost: float = 1.0) -> float:
+        """Remove ``cost`` tokens; return 0 on success, else seconds until enough tokens."""
+
+
+class InMemoryBackend(BucketBackend):
+    """Per-process buckets (LRU-bounded). Single event loop, so no locking needed."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, budget: Budget, cost: float = 1.0) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (budget.burst, now))
+        tokens = min(budget.burst, tokens + (now - updated) * budget.rate)
+        if tokens >= cost:
+            self._buckets[key] = (tokens - cost, now)
+            wait = 0.0
+        else:
+            self._buckets[key] = (tokens, now)
+            wait = (cost - tokens) / budget.rate
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def reset(self):
+        self._buckets.clear()
+
+
+def _load_backend() -> BucketBackend:
+    spec = os.getenv("RATE_LIMIT_BACKEND")
+    if not spec:
+        return InMemoryBackend()
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)()
+
+
+class RateLimiter:
+    def __init__(self, backend: BucketBackend, enabled: bool = RATE_LIMIT_ENABLED):
+        self.backend = backend
+        self.enabled = enabled
+
+    async def check(self, scope: str, budget: Budget, keys: list):
+        """Charge one request to every key; 429 when any of them is out of tokens."""
+        if not self.enabled:
+            return
+        wait = 0.0
+        for key in keys:
+            wait = max(wait, await self.backend.take(f"{scope}:{key}", budget))
+        if wait > 0:
+            limited.inc()
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+
+limiter = RateLimiter(_load_backend())
+limited = counter("rate_limited_requests", "Requests rejected with 429 by a token bucket")
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def _caller_keys(request: Request) -> list:
+    """The client IP, plus the user when the request carries a valid, unrevoked token."""
+    keys = [f"ip:{client_ip(request)}"]
+    user_id = tokens.bearer_user_id(request.headers.get("authorization", ""))
+    if user_id:
+        keys.append(f"user:{user_id}")
+    return keys
+
+
+async def limit_writes(request: Request):
+    """Write budget per IP and per user."""
+    await limiter.check("write", WRITE_BUDGET, _caller_keys(request))
+
+
+async def limit_heavy_reads(request: Request):
+    """Heavy-read budget per IP and, for signed-in callers, per user."""
+    await limiter.check("heavy_read", HEAVY_READ_BUDGET, _caller_keys(request))
+
+
+# --- Admission control ---
+
+def _default_max_in_flight() -> int:
+    pool = pool_options(DATABASE_URL)
+    if not pool:
+        return 64  # SQLite: no pool to protect, just a sane cap
+    return pool["pool_size"] + pool["max_overflow"]
+
+
+MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "0")) or _default_max_in_flight()
+MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", str(MAX_IN_FLIGHT * 4)))
+QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "1.0"))
+
+shed = counter("admission_shed", "API requests rejected with 503 before reaching the DB pool")
+
+
+class AdmissionMiddleware:
+    """Bounded concurrency for /api requests, shedding excess load with 503."""
+
+    def __init__(self, app: ASGIApp, max_in_flight: int = MAX_IN_FLIGHT, max_queue: int = MAX_QUEUE,
+                 queue_timeout: float = QUEUE_TIMEOUT, path_prefix: str = "/api", exempt: tuple = ("/api/metrics",)):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.exempt = exempt
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        gauge("admission_in_flight", "API requests currently admitted", lambda: self.in_flight)
+        gauge("admission_waiting", "API requests queued for a slot", lambda: self.waiting)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith(self.path_prefix) or path in self.exempt:
+            await self.app(scope, receive, send)
+            return
+
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            await self._reject(scope, receive, send)
+            return
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            await self._reject(scope, receive, send)
+            return
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send):
+        shed.inc()
+        response = JSONResponse({"detail": "Server busy, retry shortly"}, status_code=503, headers={"Retry-After": "1"})
+        await response(scope, receive, send)
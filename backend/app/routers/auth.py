@@ -1,140 +1,224 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, status
+from pydantic import ValidationError
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert, or_
 from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
 from ..models import User, LoginRequest, SignupRequest, ErrorResponse, Group
-from ..sql_models import User as DBUser, Group as DBGroup, user_groups
+from ..sql_models import User as DBUser, Group as DBGroup, user_groups, generate_uuid
 from sqlalchemy.exc import IntegrityError
-from ..db import get_db
+from ..db import get_db, get_read_db, insert_for, mark_recent_write
+from .. import passwords, tokens
+from ..versioning import bump_membership
+import asyncio
+import csv
+import io
+import os
 import uuid
-from typing import List
+from typing import List, Optional
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+optional_token = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
-    # In a real app, decode JWT here.
-    # For mock, we'll assume the token is the user ID or email if it exists.
-    # Let's just say token="mock-token-USERID"
-    if not token.startswith("mock-token-"):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    user_id = token.replace("mock-token-", "")
-    user_id = token.replace("mock-token-", "")
-    result = await db.execute(select(DBUser).where(DBUser.id == user_id).execution_options(populate_existing=True))
+BULK_SIGNUP_MAX_ROWS = int(os.getenv("BULK_SIGNUP_MAX_ROWS", "1000"))
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+async def _load_user(db: AsyncSession, user_id: str) -> User:
+    result = await db.execute(
+        select(DBUser).where(DBUser.id == user_id).options(selectinload(DBUser.groups))
+    )
     user = result.scalars().first()
-    
-    if user:
-        # Ensure groups are loaded
-        await db.refresh(user, attribute_names=["groups"])
-    
     if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    return user
+        raise _unauthorized("User not found")
+    return User.model_validate(user)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
+    # Signed tokens carry the user and their groups; verification is CPU only
+    # (and cached) and revocations come from the worker's synced list.
+    if token.startswith(tokens.LEGACY_PREFIX) and tokens.ACCEPT_LEGACY_TOKENS:
+        return await _load_user(db, token[len(tokens.LEGACY_PREFIX):])
+    try:
+        claims = tokens.authenticate(token)
+    except tokens.InvalidToken as e:
+        raise _unauthorized(str(e))
+    return User(id=claims["sub"], username=claims["username"], email=claims["email"], groups=claims["groups"])
 
 @router.post("/login", response_model=dict)
 async def login(request: LoginRequest, db: AsyncSession = Depends(get_db)):
-    # Try to find a user matching both email and password (avoid ambiguity when duplicates exist across groups)
-    result = await db.execute(select(DBUser).where(DBUser.email == request.email, DBUser.hashed_password == request.password))
-    user = result.scalars().first()
-    if user:
-        await db.refresh(user, attribute_names=["groups"])
+    # The same email may have accounts in several groups; the password picks the account
+    result = await db.execute(
+        select(DBUser).where(DBUser.email == request.email).options(selectinload(DBUser.groups))
+    )
+    candidates = result.scalars().all()
+    try:
+        user = None
+        for candidate in candidates:
+            if await passwords.verify_password(request.password, candidate.hashed_password):
+                user = candidate
+                break
+        if not candidates:
+            await passwords.burn_verification(request.password)
+        if user and passwords.needs_rehash(user.hashed_password):
+            # Upgrade legacy plaintext / outdated-cost rows now that the password is known
+            user.hashed_password = await passwords.hash_password(request.password)
+            await db.commit()
+            passwords.rehashed.inc()
+    except passwords.HashingBusy:
+        raise HTTPException(status_code=503, detail="Server busy, retry shortly", headers={"Retry-After": "1"})
 
-    # In a real app, use hashing!
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     return {
         "success": True, 
         "user": User.model_validate(user),
-        "token": f"mock-token-{user.id}" # Return a mock token
+        "token": tokens.issue(user)
     }
 
-@router.post("/signup", response_model=dict)
-async def signup(request: SignupRequest, db: AsyncSession = Depends(get_db)):
-    # Do NOT enforce global uniqueness here. Uniqueness will be enforced per-group via the user_groups table constraints.
-    new_user = DBUser(
-        username=request.username,
-        email=request.email,
-        hashed_password=request.password
-    )
+@router.post("/refresh", response_model=dict)
+async def refresh(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    """Exchange a valid (or recently expired) token for a new one with current groups.
 
-    groups_to_add = []
-
-    # 1. New Group
-    if request.new_group_name:
-        g_res = await db.execute(select(DBGroup).where(DBGroup.name == request.new_group_name))
-        existing_group = g_res.scalars().first()
-        if not existing_group:
-            new_group = DBGroup(name=request.new_group_name)
-            db.add(new_group)
-            groups_to_add.append(new_group)
-        else:
-            groups_to_add.append(existing_group)
-
-    # 2. Existing Groups
-    if request.group_ids:
-        for gid in request.group_ids:
-            g_res = await db.execute(select(DBGroup).where(DBGroup.id == gid))
-            grp = g_res.scalars().first()
-            if grp and grp not in groups_to_add:
-                groups_to_add.append(grp)
-
-    # 3. Default "other" if none
-    if not groups_to_add:
-        g_res = await db.execute(select(DBGroup).where(DBGroup.name == "other"))
-        other_group = g_res.scalars().first()
-        if not other_group:
-            other_group = DBGroup(name="other")
-            db.add(other_group)
-        groups_to_add.append(other_group)
-
-    db.add(new_user)
-    await db.flush()  # Ensure new_user.id is available
-
-    # Insert into user_groups with username and email for composite uniqueness
+    The old token is revoked in the same step, so each token refreshes at most once.
+    """
     try:
-        for group in groups_to_add:
-            await db.execute(
-                user_groups.insert().values(
-                    user_id=new_user.id,
-                    group_id=group.id,
-                    username=new_user.username,
-                    email=new_user.email
-                )
-            )
+        claims = tokens.decode(token, leeway=tokens.REFRESH_GRACE_SECONDS)
+    except tokens.InvalidToken as e:
+        raise _unauthorized(str(e))
+    if tokens.revocations.is_revoked(claims):
+        raise _unauthorized("Token revoked")
+    user = await _load_user(db, claims["sub"])
+    if not await tokens.revoke(db, claims):
+        raise _unauthorized("Token revoked")
+    return {"success": True, "user": user, "token": tokens.issue(user)}
+
+async def _hash_or_busy(password: str) -> str:
+    try:
+        return await passwords.hash_password(password)
+    except passwords.HashingBusy:
+        raise HTTPException(status_code=503, detail="Server busy, retry shortly", headers={"Retry-After": "1"})
+
+async def _resolve_groups(db: AsyncSession, new_group_name: Optional[str], group_ids: List[str]) -> List[Group]:
+    """Signup groups in request order: an upsert for a new group name, then one IN lookup."""
+    names = [new_group_name] if new_group_name else []
+    for name in names:
+        await db.execute(
+            insert_for(db)(DBGroup).values(id=generate_uuid(), name=name)
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+    result = await db.execute(
+        select(DBGroup.id, DBGroup.name).where(or_(DBGroup.id.in_(group_ids), DBGroup.name.in_(names)))
+    )
+    rows = [Group(id=r.id, name=r.name) for r in result]
+    by_id = {g.id: g for g in rows}
+    by_name = {g.name: g for g in rows}
+    ordered = [by_name[n] for n in names] + [by_id[gid] for gid in group_ids if gid in by_id]
+    groups = list({g.id: g for g in ordered}.values())
+    if not groups:
+        # Default "other" group when nothing valid was requested
+        return await _resolve_groups(db, "other", [])
+    return groups
+
+async def _insert_accounts(db: AsyncSession, accounts: List[tuple], groups: List[Group]) -> List[User]:
+    """Insert (username, email, hashed_password) accounts into ``groups`` (caller commits).
+
+    One multi-row insert for the users and one for their memberships; per-group
+    username/email uniqueness is enforced by the user_groups constraints. The
+    groups' leaderboard versions are bumped in the same transaction.
+    """
+    users = [User(id=generate_uuid(), username=u, email=e, groups=groups) for u, e, _ in accounts]
+    await db.execute(insert(DBUser).values([
+        {"id": user.id, "username": user.username, "email": user.email, "hashed_password": hashed}
+        for user, (_, _, hashed) in zip(users, accounts)
+    ]))
+    await db.execute(user_groups.insert().values([
+        {"user_id": user.id, "group_id": g.id, "username": user.username, "email": user.email}
+        for user in users for g in groups
+    ]))
+    await bump_membership(db, [g.id for g in groups])
+    return users
 
+@router.post("/signup", response_model=dict)
+async def signup(request: SignupRequest, response: Response, db: AsyncSession = Depends(get_db)):
+    # Do NOT enforce global uniqueness here. Uniqueness will be enforced per-group via the user_groups table constraints.
+    hashed_password = await _hash_or_busy(request.password)
+    try:
+        groups = await _resolve_groups(db, request.new_group_name, request.group_ids or [])
+        [new_user] = await _insert_accounts(db, [(request.username, request.email, hashed_password)], groups)
         await db.commit()
     except IntegrityError as e:
         await db.rollback()
         # Likely a duplicate username/email within one of the selected groups
         raise HTTPException(status_code=400, detail="Username or email already exists in one of the selected groups")
-    await db.refresh(new_user)
-    await db.refresh(new_user, attribute_names=["groups"])
+    mark_recent_write(response)
 
     return {
         "success": True,
-        "user": User.model_validate(new_user),
-        "token": f"mock-token-{new_user.id}"
+        "user": new_user,
+        "token": tokens.issue(new_user)
     }
 
+@router.post("/signup/bulk", response_model=dict)
+async def bulk_signup(
+    request: Request,
+    response: Response,
+    group_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Onboard a whole group from a CSV body with username,email,password columns.
+
+    The caller must belong to ``group_id``. The import is all-or-nothing.
+    """
+    if group_id not in {g.id for g in current_user.groups}:
+        raise HTTPException(status_code=403, detail="You can only import into your own groups")
+    try:
+        reader = csv.DictReader(io.StringIO((await request.body()).decode("utf-8-sig")))
+        rows = [SignupRequest(username=r["username"], email=r["email"], password=r["password"]) for r in reader]
+    except (UnicodeDecodeError, KeyError, TypeError, csv.Error, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid CSV (need username,email,password columns): {e}")
+    if not rows or len(rows) > BULK_SIGNUP_MAX_ROWS:
+        raise HTTPException(status_code=422, detail=f"CSV must have between 1 and {BULK_SIGNUP_MAX_ROWS} rows")
+
+    hashed = []
+    for i in range(0, len(rows), passwords.HASH_WORKERS):
+        # One batch per pool-width keeps the import from filling the hashing queue
+        batch = rows[i:i + passwords.HASH_WORKERS]
+        hashed += await asyncio.gather(*(_hash_or_busy(r.password) for r in batch))
+    try:
+        groups = await _resolve_groups(db, None, [group_id])
+        users = await _insert_accounts(db, [(r.username, r.email, h) for r, h in zip(rows, hashed)], groups)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Username or email already exists in the group (or repeats in the CSV)")
+    mark_recent_write(response)
+    return {"success": True, "created": len(users), "users": users}
+
 @router.get("/groups", response_model=List[Group])
-async def get_groups(db: AsyncSession = Depends(get_db)):
+async def get_groups(db: AsyncSession = Depends(get_read_db)):
     result = await db.execute(select(DBGroup))
     return result.scalars().all()
 
 @router.post("/logout")
-async def logout():
+async def logout(token: Optional[str] = Depends(optional_token), db: AsyncSession = Depends(get_db)):
+    if token:
+        try:
+            claims = tokens.decode(token, leeway=tokens.REFRESH_GRACE_SECONDS)
+        except tokens.InvalidToken:
+            claims = None
+        if claims:
+            await tokens.revoke(db, claims)
     return {"message": "Logout successful"}
 
 @router.get("/me", response_model=User)
-async def get_me(current_user: DBUser = Depends(get_current_user)):
+async def get_me(current_user: User = Depends(get_current_user)):
     return current_user
@@ -1,24 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Request, Response
 from typing import List, Optional, Dict
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload, joinedload
-from ..models import LeaderboardEntry, ScoreSubmission, GameMode, Group as ModelGroup
-from ..sql_models import LeaderboardEntry as DBLeaderboardEntry, User as DBUser, Group as DBGroup
-from ..db import get_db
+from sqlalchemy.orm import selectinload
+from ..models import LeaderboardEntry, LeaderboardPeriod, ScoreSubmission, GameMode, Group as ModelGroup, User as ModelUser
+from ..sql_models import LeaderboardEntry as DBLeaderboardEntry, User as DBUser, Group as DBGroup, ArchivedScoreCount
+from ..db import get_db, get_read_db, mark_recent_write
 from .auth import get_current_user
-from datetime import datetime
-import uuid
+from ..versioning import bump_versions, conditional_get
+from ..payloads import compact_response
+from .. import archive, offload, rankhistory, sketches, snapshot, swr, windows
+from ..ratelimit import limit_heavy_reads, limit_writes
+from datetime import date, datetime, timedelta, timezone
 
 router = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
 
 @router.get("", response_model=List[LeaderboardEntry])
 async def get_leaderboard(
+    request: Request,
+    response: Response,
     gameMode: Optional[GameMode] = None, 
     group_id: Optional[str] = None,
-    db: AsyncSession = Depends(get_db),
+    compact: bool = False,
+    db: AsyncSession = Depends(get_read_db),
     authorization: Optional[str] = Header(None)
 ):
+    # Answer unchanged polls with 304 before running any ranking query
+    cached = await conditional_get(request, response, db, gameMode, group_id, authorization or "")
+    if cached is not None:
+        return cached
+
     # 1. Base query for LeaderboardEntry with eager loading of user and their groups
     query = (
         select(DBLeaderboardEntry)
@@ -80,31 +91,60 @@ async def get_leaderboard(
             "groups": user_groups
         })
 
+    if compact:
+        return compact_response(out, response)
     return out
 
-@router.post("")
-async def submit_score(submission: ScoreSubmission, current_user: DBUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+@router.post("", dependencies=[Depends(limit_writes)])
+async def submit_score(submission: ScoreSubmission, response: Response, current_user: ModelUser = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    submitted_at = datetime.now(timezone.utc)
     entry = DBLeaderboardEntry(
         username=current_user.username,
         user_id=current_user.id, # Populate the new FK
         score=submission.score,
         game_mode=submission.gameMode,
-        timestamp=datetime.now()
+        timestamp=submitted_at
     )
     db.add(entry)
+    group_ids = [g.id for g in current_user.groups]
+    await bump_versions(db, submission.gameMode.value, group_ids)
+    await windows.record(db, submission.gameMode.value, group_ids, current_user.id, current_user.username, submission.score)
     await db.commit()
+    sketches.store.observe(submission.gameMode.value, group_ids, current_user.id, submission.score,
+                           at=submitted_at.timestamp())
+    # The submitter's next reads must see this score even if the replica lags
+    mark_recent_write(response)
     return {"message": "Score submitted successfully"}
 
 # New ranking endpoints
-@router.get("/rankings/all-scores")
+@router.get("/rankings/all-scores", dependencies=[Depends(limit_heavy_reads)])
 async def get_all_scores_ranked(
+    request: Request,
+    response: Response,
     gameMode: Optional[GameMode] = None,
     group_id: Optional[str] = None,
     username: Optional[str] = None,
     sort_by: str = "rank",  # "rank" (default) or "date"
-    db: AsyncSession = Depends(get_db)
+    compact: bool = False,
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get all individual scores ranked by score descending"""
+    result = await swr.serve(request, response, db, swr.Query(
+        "get_all_scores_ranked", (gameMode, group_id, username, sort_by),
+        lambda s: _all_scores_ranked(s, gameMode, group_id, username, sort_by),
+        game_mode=gameMode, group_id=group_id,
+    ))
+    if compact and not isinstance(result, Response):
+        return compact_response(result, response)
+    return result
+
+async def _all_scores_ranked(
+    db: AsyncSession,
+    gameMode: Optional[GameMode] = None,
+    group_id: Optional[str] = None,
+    username: Optional[str] = None,
+    sort_by: str = "rank"
+):
     from sqlalchemy import func
     
     # Base query
@@ -165,7 +205,7 @@ async def get_all_scores_ranked(
             # Map by username as the response format expects it, but we joined by ID
             users_map[u.username] = [{"id": g.id, "name": g.name} for g in u.groups]
     
-    return [
+    rows = [
         {
             "id": e.id,
             "username": e.username,
@@ -177,14 +217,31 @@ async def get_all_scores_ranked(
         }
         for e in entries
     ]
+    return rows
 
-@router.get("/rankings/best-per-user")
+@router.get("/rankings/best-per-user", dependencies=[Depends(limit_heavy_reads)])
 async def get_best_per_user_per_mode(
+    request: Request,
+    response: Response,
     gameMode: Optional[GameMode] = None,
     group_id: Optional[str] = None,
-    db: AsyncSession = Depends(get_db)
+    compact: bool = False,
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get best score per user per game mode with rankings"""
+    result = await swr.serve(request, response, db, swr.Query(
+        "get_best_per_user_per_mode", (gameMode, group_id), lambda s: _best_per_user_per_mode(s, gameMode, group_id),
+        game_mode=gameMode, group_id=group_id,
+    ))
+    if compact and not isinstance(result, Response):
+        return compact_response(result, response)
+    return result
+
+async def _best_per_user_per_mode(
+    db: AsyncSession,
+    gameMode: Optional[GameMode] = None,
+    group_id: Optional[str] = None
+):
     from sqlalchemy import func
     
     # Use window functions to get best score + timestamp + count per user/mode
@@ -253,27 +310,83 @@ async def get_best_per_user_per_mode(
         users = u_res.scalars().all()
         for u in users:
             users_map[u.username] = [{"id": g.id, "name": g.name} for g in u.groups]
+
+    # Scores moved to the cold archive still count as games played
+    archived = await archive.archived_games(
+        db, ArchivedScoreCount.username, ArchivedScoreCount.game_mode, game_mode=gameMode, group_id=group_id
+    )
     
-    return [
+    rows = [
         {
             "username": e.username,
             "game_mode": e.game_mode,
             "best_score": e.best_score,
             "timestamp": e.timestamp,
-            "games_played": e.games_played,
+            "games_played": e.games_played + archived.get((e.username, e.game_mode.value), 0),
             "rank": e.rank,
             "groups": users_map.get(e.username, [])
         }
         for e in entries
     ]
+    return rows
+
+def _current_snapshot(response: Response):
+    snap = snapshot.current()
+    if snap is None:
+        raise HTTPException(status_code=503, detail="Leaderboard snapshot not built yet",
+                            headers={"Retry-After": str(int(snapshot.SNAPSHOT_INTERVAL))})
+    response.headers["X-Snapshot-Version"] = str(snap.version)
+    response.headers["X-Data-As-Of"] = datetime.fromtimestamp(snap.built_at, timezone.utc).isoformat()
+    return snap
+
+if snapshot.SNAPSHOT_ENABLED:
+    @router.get("/rankings/snapshot")
+    async def get_snapshot_page(
+        response: Response,
+        gameMode: GameMode,
+        group_id: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 10
+    ):
+        """Get a page of best scores per user from the shared snapshot (no database access)"""
+        snap = _current_snapshot(response)
+        return {
+            "total": snap.size(gameMode.value, group_id),
+            "entries": snap.page(gameMode.value, group_id, max(offset, 0), min(max(limit, 0), 1000)),
+        }
+
+    @router.get("/rankings/snapshot/rank")
+    async def get_snapshot_rank(
+        response: Response,
+        gameMode: GameMode,
+        user_id: str,
+        group_id: Optional[str] = None
+    ):
+        """Get a player's rank by best score from the shared snapshot (no database access)"""
+        entry = _current_snapshot(response).rank_of(gameMode.value, user_id, group_id)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="No score for this player in the snapshot")
+        return entry
 
-@router.get("/rankings/top-n")
+@router.get("/rankings/top-n", dependencies=[Depends(limit_heavy_reads)])
 async def get_top_n_per_mode(
+    request: Request,
+    response: Response,
     limit: int = 10,
     group_id: Optional[str] = None,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get top N players for each game mode"""
+    return await swr.serve(request, response, db, swr.Query(
+        "get_top_n_per_mode", (limit, group_id), lambda s: _top_n_per_mode(s, limit, group_id),
+        group_id=group_id,
+    ))
+
+async def _top_n_per_mode(
+    db: AsyncSession,
+    limit: int = 10,
+    group_id: Optional[str] = None
+):
     from sqlalchemy import func
     
     # Get best scores per user per mode
@@ -349,12 +462,75 @@ async def get_top_n_per_mode(
     
     return result_dict
 
-@router.get("/rankings/overall")
+@router.get("/rankings/window")
+async def get_window_rankings(
+    request: Request,
+    response: Response,
+    period: LeaderboardPeriod,
+    gameMode: GameMode,
+    group_id: Optional[str] = None,
+    start: Optional[date] = None,
+    offset: int = 0,
+    limit: int = 10,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get a daily, weekly or season leaderboard: the current window, or the one containing start"""
+    offset, limit = max(offset, 0), min(max(limit, 0), 1000)
+    return await swr.serve(request, response, db, swr.Query(
+        "get_window_rankings", (period, gameMode, group_id, start, offset, limit),
+        lambda s: windows.standings(s, period.value, gameMode.value, group_id, start, offset, limit),
+        game_mode=gameMode.value, group_id=group_id, time_relative=True,
+    ))
+
+@router.get("/rankings/history/{user_id}")
+async def get_rank_history(
+    request: Request,
+    response: Response,
+    user_id: str,
+    gameMode: Optional[GameMode] = None,
+    group_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get how a player's rank changed over time, per game mode, from the periodic rank snapshots"""
+    mode = gameMode.value if gameMode else None
+    return await swr.serve(request, response, db, swr.Query(
+        "get_rank_history", (user_id, gameMode, group_id, since),
+        lambda s: rankhistory.history(s, user_id, mode, group_id, since),
+        game_mode=mode, group_id=group_id, time_relative=True,
+    ))
+
+@router.get("/rankings/overall", dependencies=[Depends(limit_heavy_reads)])
 async def get_overall_rankings(
+    request: Request,
+    response: Response,
+    group_id: Optional[str] = None,
+    normalize: bool = False,
+    compact: bool = False,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get cross-game mode overall rankings based on average rank (or average z-score with normalize)"""
+    from .. import analytics
+    snap = analytics.snapshot_for(request)
+    if snap is not None:
+        analytics.set_freshness(response, snap)
+        raw_entries = await analytics.mode_ranks(snap, group_id)
+        user_ids = list({e.username: e.user_id for e in raw_entries if e.user_id}.values())
+        result = await _rank_overall(raw_entries, await analytics.user_groups_by_username(snap, user_ids), normalize)
+        return compact_response(result, response) if compact else result
+    result = await swr.serve(request, response, db, swr.Query(
+        "get_overall_rankings", (group_id, normalize), lambda s: _overall_rankings(s, group_id, normalize),
+        group_id=group_id,
+    ))
+    if compact and not isinstance(result, Response):
+        return compact_response(result, response)
+    return result
+
+async def _overall_rankings(
+    db: AsyncSession,
     group_id: Optional[str] = None,
-    db: AsyncSession = Depends(get_db)
+    normalize: bool = False
 ):
-    """Get cross-game mode overall rankings based on average rank"""
     from sqlalchemy import func
     
     # Get best scores per user per mode
@@ -396,48 +572,9 @@ async def get_overall_rankings(
     
     result = await db.execute(query)
     raw_entries = result.all()
-    
-    # Process in Python
-    user_stats = {}
-    user_id_map = {} # Map username to user_id for group fetching
-    
-    for row in raw_entries:
-        uname = row.username
-        if row.user_id:
-            user_id_map[uname] = row.user_id
-            
-        if uname not in user_stats:
-            user_stats[uname] = {
-                "username": uname,
-                "modes_played": 0,
-                "total_best_scores": 0,
-                "ranks": [],
-                "mode_ranks": {}
-            }
-        
-        stat = user_stats[uname]
-        stat["modes_played"] += 1
-        stat["total_best_scores"] += row.best_score
-        stat["ranks"].append(row.game_rank)
-        stat["mode_ranks"][row.game_mode] = row.game_rank
-        
-    # Calculate averages and format
-    final_list = []
-    for uname, data in user_stats.items():
-        avg = sum(data["ranks"]) / len(data["ranks"])
-        final_list.append({
-            "username": uname,
-            "modes_played": data["modes_played"],
-            "total_best_scores": data["total_best_scores"],
-            "avg_rank": round(avg, 2),
-            "mode_ranks": data["mode_ranks"]
-        })
-        
-    # Sort by avg_rank ascending (lower is better)
-    final_list.sort(key=lambda x: x["avg_rank"])
-    
-    # Fetch user groups
-    user_ids = list(user_id_map.values())
+
+    # Fetch user groups (one user id per username)
+    user_ids = list({e.username: e.user_id for e in raw_entries if e.user_id}.values())
     users_map: Dict[str, List[Dict[str, str]]] = {}
     
     if user_ids:
@@ -446,34 +583,50 @@ async def get_overall_rankings(
         users = u_res.scalars().all()
         for u in users:
             users_map[u.username] = [{"id": g.id, "name": g.name} for g in u.groups]
-    
-    return [
-        {
-            "username": e["username"],
-            "modes_played": e["modes_played"],
-            "total_best_scores": e["total_best_scores"],
-            "avg_rank": e["avg_rank"],
-            "overall_rank": idx + 1,
-            "mode_ranks": e["mode_ranks"],
-            "groups": users_map.get(e["username"], [])
-        }
-        for idx, e in enumerate(final_list)
-    ]
+
+    return await _rank_overall(raw_entries, users_map, normalize)
+
+async def _rank_overall(raw_entries, users_map: Dict[str, List[Dict[str, str]]], normalize: bool = False):
+    """Overall ranking rows from per-mode (username, game_mode, best_score, game_rank) rows."""
+    from .. import stats
+    # Plain columns pickle cheaply when the ranking runs in the process pool
+    rows = await offload.run(
+        stats.overall_rankings,
+        [e.username for e in raw_entries],
+        [getattr(e.game_mode, "value", e.game_mode) for e in raw_entries],
+        stats.as_array(e.best_score for e in raw_entries),
+        stats.as_array(e.game_rank for e in raw_entries),
+        normalize,
+        size=len(raw_entries),
+    )
+    for row in rows:
+        row["groups"] = users_map.get(row["username"], [])
+    return rows
 
 @router.get("/stats/summary")
 async def get_stats_summary(
+    request: Request,
+    response: Response,
     group_id: Optional[str] = None,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get summary statistics for the dashboard"""
+    return await swr.serve(request, response, db, swr.Query(
+        "get_stats_summary", (group_id,), lambda s: _stats_summary(s, group_id),
+        group_id=group_id, time_relative=True,
+    ))
+
+async def _stats_summary(
+    db: AsyncSession,
+    group_id: Optional[str] = None
+):
     from sqlalchemy import func
-    from datetime import datetime, timedelta
     
     # Base queries
     query_total = select(func.count(DBLeaderboardEntry.id))
     query_users = select(func.count(func.distinct(DBLeaderboardEntry.user_id)))
     
-    yesterday = datetime.now() - timedelta(days=1)
+    yesterday = datetime.now(timezone.utc) - timedelta(days=1)
     query_recent = select(func.count(DBLeaderboardEntry.id)).where(DBLeaderboardEntry.timestamp >= yesterday)
     
     query_mode = (
@@ -531,11 +684,28 @@ async def get_stats_summary(
 
     # Execute
     total_games = (await db.execute(query_total)).scalar() or 0
-    total_players = (await db.execute(query_users)).scalar() or 0
+    if total_games > sketches.SKETCH_EXACT_LIMIT:
+        # COUNT(DISTINCT) scans every score; the players sketch is within a few percent
+        merged = sketches.DistinctSketch()
+        for mode in GameMode:
+            merged.merge((await sketches.store.get(db, mode.value, group_id))[1])
+        total_players = merged.estimate()
+    else:
+        total_players = (await db.execute(query_users)).scalar() or 0
     recent_games = (await db.execute(query_recent)).scalar() or 0
     
     mode_res = (await db.execute(query_mode)).first()
     popular_mode = mode_res[0] if mode_res else "None"
+
+    # Add games moved to the cold archive (older than a day, so never recent)
+    archived = await archive.archived_games(db, ArchivedScoreCount.game_mode, group_id=group_id)
+    if archived:
+        total_games += sum(archived.values())
+        per_mode = {mode: games for (mode,), games in archived.items()}
+        mode_counts = query_mode.limit(None).order_by(None)
+        for mode, count in (await db.execute(mode_counts)).all():
+            per_mode[mode.value] = per_mode.get(mode.value, 0) + count
+        popular_mode = GameMode(max(per_mode, key=per_mode.get))
     
     return {
         "total_games": total_games,
@@ -546,12 +716,35 @@ async def get_stats_summary(
 
 @router.get("/stats/distribution")
 async def get_score_distribution(
+    request: Request,
+    response: Response,
     gameMode: GameMode,
     group_id: Optional[str] = None,
-    db: AsyncSession = Depends(get_db)
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get score distribution buckets for a specific game mode"""
-    
+    from .. import analytics, stats
+    if include_archived and not archive.available():
+        raise HTTPException(status_code=501, detail="Score archive is not available on this server")
+    snap = None if include_archived else analytics.snapshot_for(request)
+    if snap is not None:
+        analytics.set_freshness(response, snap)
+        return stats.histogram(await analytics.scores(snap, gameMode.value, group_id))
+    return await swr.serve(request, response, db, swr.Query(
+        "get_score_distribution", (gameMode, group_id, include_archived),
+        lambda s: _score_distribution(s, gameMode, group_id, include_archived),
+        game_mode=gameMode, group_id=group_id,
+    ))
+
+async def _score_distribution(
+    db: AsyncSession,
+    gameMode: GameMode,
+    group_id: Optional[str] = None,
+    include_archived: bool = False
+):
+    import numpy as np
+    from .. import stats
     query = select(DBLeaderboardEntry.score).where(DBLeaderboardEntry.game_mode == gameMode)
     
     if group_id and group_id != "all":
@@ -563,58 +756,121 @@ async def get_score_distribution(
         )
         
     result = await db.execute(query)
-    scores = result.scalars().all()
-    
-    if not scores:
-        return []
-        
-    scores = [s for s in scores]
-    scores.sort()
-    
-    # Create 10 buckets
-    if not scores:
-        return []
-        
-    min_s = scores[0]
-    max_s = scores[-1]
-    
-    if min_s == max_s:
-        return [{"range": f"{min_s}", "count": len(scores)}]
-        
-    step = (max_s - min_s) / 10
-    if step == 0: step = 1
-    
-    buckets = []
-    # Initialize buckets
-    current = min_s
-    for _ in range(10):
-        end = current + step
-        # Label format: "0-100", "100-200" etc.
-        range_label = f"{int(current)}-{int(end)}"
-        count = len([s for s in scores if current <= s < end])
-        # Last bucket includes the max incase of float precision issues
-        if _ == 9:
-            count = len([s for s in scores if current <= s])
-            
-        buckets.append({"range": range_label, "count": count})
-        current = end
-        
-    return buckets
+    scores = stats.as_array(result.scalars().all())
+
+    if include_archived:
+        import asyncio
+        from ..sql_models import user_groups
+        members = None
+        if group_id and group_id != "all":
+            members = (await db.execute(
+                select(user_groups.c.user_id).where(user_groups.c.group_id == group_id)
+            )).scalars().all()
+        # Parquet scans are blocking file I/O
+        archived = await asyncio.to_thread(archive.archived_scores, gameMode.value, members)
+        scores = np.concatenate([scores, stats.as_array(archived)])
+
+    return stats.histogram(scores)
+
+@router.get("/stats/percentiles")
+async def get_score_percentiles(
+    request: Request,
+    response: Response,
+    gameMode: GameMode,
+    group_id: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get count, mean and percentiles of all scores in a game mode"""
+    return await swr.serve(request, response, db, swr.Query(
+        "get_score_percentiles", (gameMode, group_id), lambda s: _score_percentiles(s, gameMode, group_id),
+        game_mode=gameMode, group_id=group_id,
+    ))
+
+async def _score_percentiles(
+    db: AsyncSession,
+    gameMode: GameMode,
+    group_id: Optional[str] = None
+):
+    from .. import stats
+    query = select(DBLeaderboardEntry.score).where(DBLeaderboardEntry.game_mode == gameMode)
+    if group_id and group_id != "all":
+        query = (
+            query
+            .join(DBLeaderboardEntry.user)
+            .join(DBUser.groups)
+            .where(DBGroup.id == group_id)
+        )
+    result = await db.execute(query)
+    return stats.percentiles(stats.as_array(result.scalars().all()))
+
+@router.get("/stats/percentile")
+async def get_score_percentile(
+    gameMode: GameMode,
+    score: int,
+    group_id: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get the approximate share of scores in a game mode below (and at or above) a score"""
+    quantiles, _ = await sketches.store.get(db, gameMode.value, group_id)
+    total = quantiles.count
+    if not total:
+        return {"score": score, "count": 0, "percentile": None, "top_percent": None}
+    below = quantiles.rank(score)
+    return {
+        "score": score,
+        "count": total,
+        "percentile": round(100 * below / total, 2),
+        "top_percent": round(100 * (total - below) / total, 2),
+    }
+
+def _activity_window(days: int):
+    """Start of the activity window: midnight (UTC, like submissions) ``days`` days ago.
+
+    Day-aligned so the first bucket is a whole day; the plain ``timestamp >=``
+    bound also lets Postgres skip the leaderboard partitions older than it.
+    """
+    return datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+
+def _day_bucket(db: AsyncSession):
+    """Per-day (UTC) grouping of ``timestamp``: date_trunc on Postgres, date() on SQLite."""
+    from sqlalchemy import func
+    if db.get_bind().dialect.name == "postgresql":
+        # Not the session time zone's days
+        return func.date_trunc('day', func.timezone('UTC', DBLeaderboardEntry.timestamp))
+    return func.date(DBLeaderboardEntry.timestamp)
+
+def _day_key(value) -> str:
+    # SQLite's date() returns 'YYYY-MM-DD' strings, date_trunc returns datetimes
+    return value if isinstance(value, str) else value.strftime('%Y-%m-%d')
 
 @router.get("/stats/activity")
 async def get_activity_trends(
+    request: Request,
+    response: Response,
     days: int = 30,
     group_id: Optional[str] = None,
-    db: AsyncSession = Depends(get_db)
+    rolling: int = 0,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get daily game activity for the last N days"""
+    """Get daily game activity for the last N days (plus an N-day rolling sum with rolling=N)"""
+    return await swr.serve(request, response, db, swr.Query(
+        "get_activity_trends", (days, group_id, rolling), lambda s: _activity_trends(s, days, group_id, rolling),
+        group_id=group_id, time_relative=True,
+    ))
+
+async def _activity_trends(
+    db: AsyncSession,
+    days: int = 30,
+    group_id: Optional[str] = None,
+    rolling: int = 0
+):
+    from .. import stats
     from sqlalchemy import func
-    from datetime import datetime, timedelta
     
-    start_date = datetime.now() - timedelta(days=days)
+    start_date = _activity_window(days)
     
     # Truncate to day
-    date_col = func.date_trunc('day', DBLeaderboardEntry.timestamp)
+    date_col = _day_bucket(db)
     
     query = (
         select(date_col, func.count(DBLeaderboardEntry.id))
@@ -634,35 +890,48 @@ async def get_activity_trends(
     result = await db.execute(query)
     data = result.all()
     
-    # Fill in missing days
     activity = {}
     for date, count in data:
         if date:
-            activity[date.strftime('%Y-%m-%d')] = count
-            
-    final_data = []
-    for i in range(days + 1):
-        d = (start_date + timedelta(days=i)).strftime('%Y-%m-%d')
-        final_data.append({
-            "date": d,
-            "games": activity.get(d, 0)
-        })
+            activity[_day_key(date)] = count
+    archived = await archive.archived_games(db, ArchivedScoreCount.day, group_id=group_id, since=start_date)
+    for (date,), games in archived.items():
+        activity[_day_key(date)] = activity.get(_day_key(date), 0) + games
+
+    # Fill in missing days
+    labels, games = stats.daily_series(start_date, days, activity)
+    final_data = [{"date": d, "games": int(n)} for d, n in zip(labels, games)]
+    if rolling > 0:
+        for row, total in zip(final_data, stats.rolling_sum(games, rolling)):
+            row["rolling"] = int(total)
         
     return final_data
 
 
 @router.get("/stats/activity/by-mode")
 async def get_activity_by_mode(
+    request: Request,
+    response: Response,
     days: int = 30,
     group_id: Optional[str] = None,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get daily game activity broken down by game mode for the last N days"""
+    return await swr.serve(request, response, db, swr.Query(
+        "get_activity_by_mode", (days, group_id), lambda s: _activity_by_mode(s, days, group_id),
+        group_id=group_id, time_relative=True,
+    ))
+
+async def _activity_by_mode(
+    db: AsyncSession,
+    days: int = 30,
+    group_id: Optional[str] = None
+):
+    from .. import stats
     from sqlalchemy import func
-    from datetime import datetime, timedelta
     
-    start_date = datetime.now() - timedelta(days=days)
-    date_col = func.date_trunc('day', DBLeaderboardEntry.timestamp)
+    start_date = _activity_window(days)
+    date_col = _day_bucket(db)
     
     # Query: Date, GameMode, Count
     query = (
@@ -687,36 +956,57 @@ async def get_activity_by_mode(
     result = await db.execute(query)
     rows = result.all()
     
-    # Process into [{date: 'YYYY-MM-DD', snake: 5, tetris: 2, ...}, ...]
-    data_map = {}
-    
-    # Initialize all dates with 0s
-    for i in range(days + 1):
-        d = (start_date + timedelta(days=i)).strftime('%Y-%m-%d')
-        data_map[d] = {"date": d}
-        for mode in GameMode:
-            data_map[d][mode.value] = 0
-
+    # Per mode {'YYYY-MM-DD': games}, then [{date: 'YYYY-MM-DD', snake: 5, tetris: 2, ...}, ...]
+    activity = {mode.value: {} for mode in GameMode}
     for r in rows:
         if r.date:
-            d_str = r.date.strftime('%Y-%m-%d')
-            if d_str in data_map:
-                data_map[d_str][r.game_mode] = r.count
-                
-    return sorted(list(data_map.values()), key=lambda x: x['date'])
+            activity[getattr(r.game_mode, "value", r.game_mode)][_day_key(r.date)] = r.count
+    archived = await archive.archived_games(
+        db, ArchivedScoreCount.day, ArchivedScoreCount.game_mode, group_id=group_id, since=start_date
+    )
+    for (date, mode), games in archived.items():
+        per_day = activity[mode]
+        per_day[_day_key(date)] = per_day.get(_day_key(date), 0) + games
+
+    # Fill in missing days
+    series = {}
+    for mode, per_day in activity.items():
+        labels, series[mode] = stats.daily_series(start_date, days, per_day)
+    return [{"date": d, **{mode: int(games[i]) for mode, games in series.items()}} for i, d in enumerate(labels)]
 
 @router.get("/stats/activity/by-user")
 async def get_activity_by_user(
+    request: Request,
+    response: Response,
     days: int = 30,
     group_id: Optional[str] = None,
     limit: int = 10,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get daily game activity broken down by user for the last N days (Top N users)"""
+    from .. import analytics
+    snap = analytics.snapshot_for(request)
+    if snap is not None:
+        analytics.set_freshness(response, snap)
+        start_date = _activity_window(days)
+        top_users, rows = await analytics.user_activity(snap, start_date, group_id, limit)
+        if not top_users:
+            return []
+        return sorted((await _user_days(start_date, days, top_users, rows)).values(), key=lambda x: x['date'])
+    return await swr.serve(request, response, db, swr.Query(
+        "get_activity_by_user", (days, group_id, limit), lambda s: _activity_by_user(s, days, group_id, limit),
+        group_id=group_id, time_relative=True,
+    ))
+
+async def _activity_by_user(
+    db: AsyncSession,
+    days: int = 30,
+    group_id: Optional[str] = None,
+    limit: int = 10
+):
     from sqlalchemy import func
-    from datetime import datetime, timedelta
     
-    start_date = datetime.now() - timedelta(days=days)
+    start_date = _activity_window(days)
     
     # 1. Identify Top N active users in this period
     count_query = (
@@ -735,14 +1025,27 @@ async def get_activity_by_user(
             .where(DBGroup.id == group_id)
         )
         
-    top_users_res = await db.execute(count_query)
-    top_users = [row.username for row in top_users_res.all()]
+    # Games moved to the cold archive count too; with any in the window the
+    # ranking is finished here instead of in SQL
+    archived = await archive.archived_games(
+        db, ArchivedScoreCount.day, ArchivedScoreCount.username, group_id=group_id, since=start_date
+    )
+    if archived:
+        totals: Dict[str, int] = {}
+        for (_, username), games in archived.items():
+            totals[username] = totals.get(username, 0) + games
+        for row in (await db.execute(count_query.limit(None))).all():
+            totals[row.username] = totals.get(row.username, 0) + row.total
+        top_users = sorted(totals, key=totals.get, reverse=True)[:limit]
+    else:
+        top_users_res = await db.execute(count_query)
+        top_users = [row.username for row in top_users_res.all()]
     
     if not top_users:
         return []
 
     # 2. Get daily data for these users
-    date_col = func.date_trunc('day', DBLeaderboardEntry.timestamp)
+    date_col = _day_bucket(db)
     
     query = (
         select(
@@ -770,20 +1073,19 @@ async def get_activity_by_user(
     result = await db.execute(query)
     rows = result.all()
     
-    # Process
-    data_map = {}
-    
-    # Initialize dates
-    for i in range(days + 1):
-        d = (start_date + timedelta(days=i)).strftime('%Y-%m-%d')
-        data_map[d] = {"date": d}
-        for u in top_users:
-            data_map[d][u] = 0
-            
-    for r in rows:
-        if r.date:
-            d_str = r.date.strftime('%Y-%m-%d')
-            if d_str in data_map:
-                data_map[d_str][r.username] = r.count
+    data_map = await _user_days(start_date, days, top_users, rows)
+    for (date, username), games in archived.items():
+        if _day_key(date) in data_map and username in top_users:
+            data_map[_day_key(date)][username] += games
                 
     return sorted(list(data_map.values()), key=lambda x: x['date'])
+
+async def _user_days(start_date, days: int, top_users: List[str], rows):
+    """{'YYYY-MM-DD': {"date": ..., <username>: games}} from (date, username, count) rows."""
+    from .. import stats
+    rows = [r for r in rows if r.date]
+    return await offload.run(
+        stats.user_day_matrix, start_date, days, top_users,
+        [_day_key(r.date) for r in rows], [r.username for r in rows], [r.count for r in rows],
+        size=len(rows),
+    )
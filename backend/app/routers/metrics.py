@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+
+from .. import metrics
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics")
+async def get_metrics():
+    """Counters and gauges of the worker process answering this request"""
+    return metrics.snapshot()
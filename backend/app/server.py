@@ -0,0 +1,96 @@
+"""
+Production entry point: runs the API under uvicorn with several worker processes.
+
+    uv run python -m app.server
+
+Tuning is done through environment variables:
+
+    WEB_CONCURRENCY           number of worker processes (default: one per usable CPU)
+    PORT / HOST               bind address (default 0.0.0.0:8000)
+    BACKLOG                   listen socket backlog (default 2048)
+    KEEPALIVE_TIMEOUT         seconds an idle keep-alive connection is kept (default 5)
+    GRACEFUL_TIMEOUT          seconds in-flight requests get on shutdown (default 30)
+    LIMIT_MAX_REQUESTS        recycle a worker after this many requests (default: never)
+    DB_MAX_CONNECTIONS        connection budget shared by all workers (see app.db)
+    FORWARDED_ALLOW_IPS       proxies whose X-Forwarded-For is trusted (default 127.0.0.1)
+    MIGRATE_ON_START          1 = run `alembic upgrade head` before starting (default 0)
+"""
+import asyncio
+import os
+from pathlib import Path
+
+import uvicorn
+
+
+def default_workers() -> int:
+    """One worker per CPU this process is allowed to run on."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS / Windows
+        cpus = os.cpu_count() or 1
+    return max(cpus, 1)
+
+
+def _env_int(name: str, default: int | None) -> int | None:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+
+def _migrate():
+    """Bring the schema to the Alembic head (alembic's env.py runs its own event loop)."""
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "alembic"))
+    command.upgrade(config, "head")
+
+
+def _prepare_database():
+    """Migrate or create missing tables once in the parent, before any worker starts."""
+    from .db import init_db, engine
+
+    if os.getenv("MIGRATE_ON_START", "0") == "1":
+        _migrate()
+
+    async def run():
+        try:
+            await init_db()
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+def main():
+    workers = _env_int("WEB_CONCURRENCY", None) or default_workers()
+    # Workers are spawned from this process and inherit the environment, which is
+    # how app.db learns how many pools share the connection budget.
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+
+    _prepare_database()
+    os.environ["SKIP_INIT_DB"] = "1"
+
+    uvicorn.run(
+        "app.main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=_env_int("PORT", 8000),
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        backlog=_env_int("BACKLOG", 2048),
+        timeout_keep_alive=_env_int("KEEPALIVE_TIMEOUT", 5),
+        timeout_graceful_shutdown=_env_int("GRACEFUL_TIMEOUT", 30),
+        limit_max_requests=_env_int("LIMIT_MAX_REQUESTS", None),
+        proxy_headers=True,
+        # Only a trusted proxy may set the client address (rate limits key on it)
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        access_log=os.getenv("ACCESS_LOG", "0") == "1",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Single-flight request coalescing.
+
+Concurrent calls with the same key share one execution: the first caller (the
+leader) runs the computation, later callers await its result. Nothing is cached
+once the leader finishes (that is app.swr's job); callers put the data version
+in the key so a request that arrives after a write never joins a computation
+started before it.
+
+Cancellation: waiters are shielded, so a client that disconnects does not cancel
+the shared computation for everybody else. If the leader itself is cancelled,
+the remaining waiters retry and one of them becomes the new leader (the
+computation runs on the leader's own DB session, which is gone by then).
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from .metrics import counter, gauge
+
+T = TypeVar("T")
+
+
+class _LeaderCancelled(Exception):
+    pass
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.executions = counter(f"singleflight_{name}_executions", "Computations actually run")
+        self.merged = counter(f"singleflight_{name}_merged", "Requests served by another request's computation")
+        self.retries = counter(f"singleflight_{name}_leader_cancelled", "Waiters that retried after the leader was cancelled")
+        gauge(f"singleflight_{name}_in_flight", "Distinct computations currently running", lambda: len(self._calls))
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        if key in self._calls:
+            # Counted once per request, however many leaders it waits on
+            self.merged.inc()
+        while key in self._calls:
+            try:
+                return await asyncio.shield(self._calls[key])
+            except _LeaderCancelled:
+                self.retries.inc()
+
+        future = asyncio.get_running_loop().create_future()
+        # Mark failures as retrieved so lone leaders don't log "never retrieved"
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._calls[key] = future
+        self.executions.inc()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+
+leaderboard_flights = SingleFlight("leaderboard")
@@ -0,0 +1,325 @@
+"""
+Approximate percentiles and distinct-player counts per (game_mode, group).
+
+Every submitted score is added, in the submitting worker, to two mergeable
+sketches for its mode under "*" (all groups) and under each of the player's
+groups:
+
+* ``QuantileSketch``: score counts per logarithmic bucket, so any rank or
+  quantile is within ``SKETCH_RELATIVE_ACCURACY`` of the score's value. Two
+  sketches merge by adding counts.
+* ``DistinctSketch``: a HyperLogLog of user ids (about 1.6% standard error).
+  Two sketches merge by keeping the larger register.
+
+Workers flush their deltas every ``SKETCH_FLUSH_INTERVAL`` seconds with upserts
+(``count + n`` and the larger register), so the tables always hold the sketch
+merged over all workers. Reads use the merged sketch, reloaded from the
+database after ``SKETCH_REFRESH_SECONDS``, plus this worker's unflushed deltas.
+
+``python -m app.maintenance rebuild-sketches`` recomputes the sketches from the
+scores in the leaderboard table submitted before a cutoff (the rebuild's start).
+While it runs, ``sketch_rebuild`` tells workers to hold their deltas; the
+rebuilt sketch replaces the tables in one transaction, and workers then drop
+held deltas from before the cutoff (the rebuild counted those scores) and
+flush the rest. Percentiles are over the scores in the leaderboard table at the
+last rebuild plus those submitted since, as in the all-scores ranking; scores
+archived before a rebuild drop out of it.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import time
+from datetime import datetime, timezone
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import SessionLocal, insert_for
+from .metrics import counter
+from .sql_models import PlayerSketchRegister, ScoreSketchBucket, SketchRebuild
+from .versioning import ALL_GROUPS
+
+SKETCH_RELATIVE_ACCURACY = float(os.getenv("SKETCH_RELATIVE_ACCURACY", "0.01"))
+SKETCH_FLUSH_INTERVAL = float(os.getenv("SKETCH_FLUSH_INTERVAL", "10"))
+SKETCH_REFRESH_SECONDS = float(os.getenv("SKETCH_REFRESH_SECONDS", "30"))
+# Above this many scores get_stats_summary counts players with the sketch
+SKETCH_EXACT_LIMIT = int(os.getenv("SKETCH_EXACT_LIMIT", "1000000"))
+# How long a rebuild waits after its cutoff for submissions already in flight to commit
+SKETCH_REBUILD_GRACE = float(os.getenv("SKETCH_REBUILD_GRACE", "5"))
+
+FLUSH_CHUNK = 1000
+
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+ZERO_BUCKET = -1  # Scores below 1
+
+flushes = counter("sketch_flushes", "Sketch deltas written to the database")
+
+
+def bucket_of(score: float) -> int:
+    """Bucket k holds scores in (gamma^(k-1), gamma^k]."""
+    if score < 1:
+        return ZERO_BUCKET
+    return math.ceil(math.log(score) / _LOG_GAMMA - 1e-12)
+
+
+def bucket_bounds(bucket: int) -> Tuple[float, float]:
+    if bucket == ZERO_BUCKET:
+        return 0.0, 0.0
+    return _GAMMA ** (bucket - 1), _GAMMA ** bucket
+
+
+class QuantileSketch:
+    """Log-bucketed score counts (relative-accuracy quantiles, mergeable by addition)."""
+
+    def __init__(self, counts: Optional[Dict[int, int]] = None):
+        self.counts: Dict[int, int] = dict(counts or {})
+
+    def add(self, score: float, n: int = 1):
+        k = bucket_of(score)
+        self.counts[k] = self.counts.get(k, 0) + n
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        for k, n in other.counts.items():
+            self.counts[k] = self.counts.get(k, 0) + n
+        return self
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts.values())
+
+    def rank(self, score: int) -> float:
+        """Estimated number of scores below ``score``."""
+        k = bucket_of(score)
+        below = sum(n for b, n in self.counts.items() if b < k)
+        lo, hi = bucket_bounds(k)
+        # Scores are integers, assumed spread evenly over the bucket's integers
+        first, last = math.floor(lo) + 1, math.floor(hi)
+        if last > first:
+            below += self.counts.get(k, 0) * max(score - first, 0) / (last - first + 1)
+        return below
+
+
+def _hll_position(key: str) -> Tuple[int, int]:
+    h = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+    register = h >> (64 - HLL_PRECISION)
+    rest = h & ((1 << (64 - HLL_PRECISION)) - 1)
+    # Position of the first 1 bit in the remaining bits
+    return register, (64 - HLL_PRECISION) - rest.bit_length() + 1
+
+
+class DistinctSketch:
+    """HyperLogLog with 2^12 registers (mergeable by register-wise maximum)."""
+
+    def __init__(self, registers: Optional[np.ndarray] = None):
+        self.registers = registers if registers is not None else np.zeros(HLL_REGISTERS, dtype=np.uint8)
+
+    def add(self, key: str) -> Optional[Tuple[int, int]]:
+        """Add ``key``; return the (register, rank) it raised, if any."""
+        register, rank = _hll_position(key)
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+            return register, rank
+        return None
+
+    def merge(self, other: "DistinctSketch") -> "DistinctSketch":
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self) -> int:
+        m = HLL_REGISTERS
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # Linear counting for small cardinalities
+        return int(round(estimate))
+
+
+Key = Tuple[str, str]  # (game_mode, group_id)
+
+
+async def _write(db: AsyncSession, counts: Dict[Tuple[str, str, int], int], registers: Dict[Tuple[str, str, int], int]):
+    """Upsert bucket counts and registers (caller commits)."""
+    insert = insert_for(db)
+    larger = func.greatest if db.get_bind().dialect.name == "postgresql" else func.max
+    count_rows = [{"game_mode": m, "group_id": g, "bucket": b, "count": n} for (m, g, b), n in counts.items()]
+    register_rows = [{"game_mode": m, "group_id": g, "register": r, "rank": rank}
+                     for (m, g, r), rank in registers.items()]
+    # Chunked to stay under the database's bound-parameter limit
+    for i in range(0, len(count_rows), FLUSH_CHUNK):
+        stmt = insert(ScoreSketchBucket).values(count_rows[i:i + FLUSH_CHUNK])
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=["game_mode", "group_id", "bucket"],
+            set_={"count": ScoreSketchBucket.count + stmt.excluded.count},
+        ))
+    for i in range(0, len(register_rows), FLUSH_CHUNK):
+        stmt = insert(PlayerSketchRegister).values(register_rows[i:i + FLUSH_CHUNK])
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=["game_mode", "group_id", "register"],
+            set_={"rank": larger(PlayerSketchRegister.rank, stmt.excluded.rank)},
+        ))
+
+
+async def _rebuild_state(db: AsyncSession, lock: bool = False) -> Optional[Tuple[float, bool]]:
+    """(cutoff, done) of the latest rebuild, or None if there never was one."""
+    query = select(SketchRebuild.cutoff, SketchRebuild.done).where(SketchRebuild.id == 1)
+    if lock:
+        # A rebuild finishing waits for flushes that read the state before it
+        query = query.with_for_update(read=True)
+    row = (await db.execute(query)).first()
+    return (row.cutoff, row.done) if row else None
+
+
+class SketchStore:
+    """This worker's view: merged sketches from the database plus unflushed deltas."""
+
+    def __init__(self):
+        self._merged: Dict[Key, Tuple[QuantileSketch, DistinctSketch, float]] = {}
+        # Bucket counts per (game_mode, group, bucket, second observed); the second
+        # decides whether a rebuild already counted them
+        self._pending_counts: Dict[Tuple[str, str, int, int], int] = defaultdict(int)
+        self._pending_registers: Dict[Tuple[str, str, int], int] = {}
+        self._local: Dict[Key, Tuple[QuantileSketch, DistinctSketch]] = {}
+
+    def observe(self, game_mode: str, group_ids: Iterable[str], user_id: Optional[str], score: int,
+                at: Optional[float] = None):
+        second = int(time.time() if at is None else at)
+        for gid in {ALL_GROUPS, *group_ids}:
+            quantiles, distinct = self._local.setdefault((game_mode, gid), (QuantileSketch(), DistinctSketch()))
+            quantiles.add(score)
+            self._pending_counts[(game_mode, gid, bucket_of(score), second)] += 1
+            if user_id:
+                raised = distinct.add(user_id)
+                if raised:
+                    self._pending_registers[(game_mode, gid, raised[0])] = raised[1]
+
+    async def flush(self, db: AsyncSession) -> int:
+        """Write this worker's deltas to the database; return how many rows were upserted."""
+        if not self._pending_counts and not self._pending_registers:
+            return 0
+        state = await _rebuild_state(db, lock=True)
+        if state and not state[1]:
+            # A rebuild is running; hold the deltas until it is done
+            await db.rollback()
+            return 0
+        counts, registers = self._pending_counts, self._pending_registers
+        self._pending_counts, self._pending_registers, local = defaultdict(int), {}, self._local
+        self._local = {}
+        merged: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        for (m, g, b, second), n in counts.items():
+            # Scores from before the last rebuild's cutoff are in the rebuilt sketch. The
+            # rebuild runs in another process, so every worker drops them here
+            if state is None or second >= state[0]:
+                merged[(m, g, b)] += n
+        try:
+            await _write(db, merged, registers)
+            await db.commit()
+        except Exception:
+            # Keep the deltas for the next attempt
+            await db.rollback()
+            for key, n in counts.items():
+                self._pending_counts[key] += n
+            for key, rank in registers.items():
+                self._pending_registers[key] = max(rank, self._pending_registers.get(key, 0))
+            for key, (q, d) in local.items():
+                mine = self._local.setdefault(key, (QuantileSketch(), DistinctSketch()))
+                mine[0].merge(q)
+                mine[1].merge(d)
+            raise
+        # Flushed deltas reach this worker's reads through the next reload
+        for key in local:
+            self._merged.pop(key, None)
+        flushes.inc()
+        return len(counts) + len(registers)
+
+    async def _load(self, db: AsyncSession, key: Key):
+        game_mode, group_id = key
+        buckets = (await db.execute(
+            select(ScoreSketchBucket.bucket, ScoreSketchBucket.count)
+            .where(ScoreSketchBucket.game_mode == game_mode, ScoreSketchBucket.group_id == group_id)
+        )).all()
+        registers = np.zeros(HLL_REGISTERS, dtype=np.uint8)
+        for register, rank in (await db.execute(
+            select(PlayerSketchRegister.register, PlayerSketchRegister.rank)
+            .where(PlayerSketchRegister.game_mode == game_mode, PlayerSketchRegister.group_id == group_id)
+        )).all():
+            registers[register] = rank
+        entry = (QuantileSketch(dict(buckets)), DistinctSketch(registers), time.monotonic())
+        self._merged[key] = entry
+        return entry
+
+    async def get(self, db: AsyncSession, game_mode: str, group_id: Optional[str] = None) -> Tuple[QuantileSketch, DistinctSketch]:
+        """Merged sketches for (game_mode, group), including this worker's unflushed scores."""
+        key = (game_mode, group_id if group_id and group_id != "all" else ALL_GROUPS)
+        entry = self._merged.get(key)
+        if entry is None or time.monotonic() - entry[2] > SKETCH_REFRESH_SECONDS:
+            entry = await self._load(db, key)
+        quantiles, distinct = QuantileSketch(entry[0].counts), DistinctSketch(entry[1].registers.copy())
+        if key in self._local:
+            quantiles.merge(self._local[key][0])
+            distinct.merge(self._local[key][1])
+        return quantiles, distinct
+
+    def clear(self):
+        self.__init__()
+
+
+store = SketchStore()
+
+
+async def flush_sketches():
+    async with SessionLocal() as db:
+        await store.flush(db)
+
+
+async def _set_rebuild_state(db: AsyncSession, cutoff: float, done: bool):
+    stmt = insert_for(db)(SketchRebuild).values(id=1, cutoff=cutoff, done=done)
+    await db.execute(stmt.on_conflict_do_update(index_elements=["id"], set_={"cutoff": cutoff, "done": done}))
+
+
+async def rebuild(db: AsyncSession, batch_size: int = 10000, report=print, grace: float = SKETCH_REBUILD_GRACE) -> int:
+    """Recompute every sketch from the scores submitted before now; return the number of scores read."""
+    from .sql_models import LeaderboardEntry, user_groups
+
+    # Workers hold their deltas from here on. The cutoff is the next whole second;
+    # submissions stamped before it get ``grace`` seconds to commit so the scan sees them
+    cutoff = float(int(time.time()) + 1)
+    await _set_rebuild_state(db, cutoff, done=False)
+    await db.commit()
+    await asyncio.sleep(max(0.0, cutoff - time.time()) + grace)
+
+    groups: Dict[str, list] = defaultdict(list)
+    for user_id, group_id in (await db.execute(select(user_groups.c.user_id, user_groups.c.group_id))).all():
+        groups[user_id].append(group_id)
+
+    fresh = SketchStore()
+    scanned = 0
+    result = await db.stream(
+        select(LeaderboardEntry.game_mode, LeaderboardEntry.user_id, LeaderboardEntry.score)
+        .where(or_(LeaderboardEntry.timestamp < datetime.fromtimestamp(cutoff, timezone.utc),
+                   LeaderboardEntry.timestamp.is_(None)))
+        .execution_options(yield_per=batch_size)
+    )
+    async for rows in result.partitions():
+        for mode, user_id, score in rows:
+            fresh.observe(getattr(mode, "value", mode), groups.get(user_id, ()), user_id, score, at=cutoff)
+        scanned += len(rows)
+        report(f"rebuild-sketches: {scanned} scores read")
+
+    # Swap in the rebuilt sketch and let the workers flush again, in one transaction
+    await _set_rebuild_state(db, cutoff, done=True)
+    await db.execute(delete(ScoreSketchBucket))
+    await db.execute(delete(PlayerSketchRegister))
+    counts: Dict[Tuple[str, str, int], int] = defaultdict(int)
+    for (m, g, b, _), n in fresh._pending_counts.items():
+        counts[(m, g, b)] += n
+    await _write(db, counts, fresh._pending_registers)
+    await db.commit()
+    return scanned
@@ -0,0 +1,240 @@
+"""
+Memory-mapped best-score snapshot shared by the workers on a host.
+
+Every ``SNAPSHOT_INTERVAL`` seconds one worker (whichever takes the file lock)
+writes each player's best score per (game_mode, group) into a single file under
+``SNAPSHOT_DIR``, sorted by score, and swaps it in with an atomic rename. The
+build is skipped while the leaderboard version (see ``app.versioning``) has not
+changed. Workers ``mmap`` the current file read-only and answer top-N, page and
+rank-of-player queries with binary searches over NumPy views of it: nothing is
+copied per worker and nothing touches the database. A worker notices a new
+version on its next read and maps it; requests still using the old mapping keep
+reading the old file.
+
+File layout::
+
+    b"LBSNAP2\\0" | header length (u64) | JSON header | padding | arrays
+
+The header names each array's dtype, offset and length. Players are keyed by
+user id: ``user_ids`` is one sorted fixed-width byte array and ``usernames``
+holds each player's current username at the same index, for display only
+(usernames need not be unique). Each key ``"<mode>|<group>"`` (group ``*`` for
+everyone) has ``neg_scores`` (negated best scores, ascending, so rank is a
+``searchsorted``), ``users`` (player indexes in rank order, ties by username),
+and ``user_sorted``/``user_pos`` (player indexes ascending and their rank
+positions, to find a player).
+"""
+import asyncio
+import fcntl
+import json
+import mmap
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import SessionLocal
+from .metrics import counter, gauge
+from .sql_models import LeaderboardEntry, User, user_groups
+from .versioning import ALL_GROUPS, read_version
+
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "1") == "1"
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", Path(__file__).resolve().parent.parent / "snapshots"))
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "30"))
+
+MAGIC = b"LBSNAP2\0"  # LBSNAP1 files keyed players by username
+FILE_NAME = "leaderboard.snap"
+ALIGN = 8
+
+builds = counter("snapshot_builds", "Leaderboard snapshots written")
+gauge("snapshot_age_seconds", "Age of the snapshot this worker reads",
+      lambda: time.time() - _current.built_at if _current else 0)
+
+
+def _key(game_mode: str, group_id: Optional[str]) -> str:
+    return f"{game_mode}|{group_id if group_id and group_id != 'all' else ALL_GROUPS}"
+
+
+def _fixed_width(values: List[str]) -> np.ndarray:
+    encoded = [v.encode() for v in values]
+    return np.array(encoded, dtype=f"S{max((len(v) for v in encoded), default=1)}")
+
+
+def write_snapshot(path: Path, best: Dict[str, Dict[str, int]], usernames: Dict[str, str], version: int,
+                   built_at: float):
+    """Write ``{key: {user_id: best score}}`` and ``{user_id: username}`` to ``path`` atomically."""
+    ids = sorted({user_id for scores in best.values() for user_id in scores})
+    index = {user_id: i for i, user_id in enumerate(ids)}
+    names = [usernames.get(user_id, "") for user_id in ids]
+    # Each player's position in username order, to break score ties by name
+    by_name = np.empty(len(ids), dtype=np.int32)
+    by_name[sorted(range(len(ids)), key=lambda i: (names[i], ids[i]))] = np.arange(len(ids), dtype=np.int32)
+
+    arrays: Dict[str, np.ndarray] = {"user_ids": _fixed_width(ids), "usernames": _fixed_width(names)}
+    for key, scores in best.items():
+        users = np.fromiter((index[u] for u in scores), dtype=np.int32, count=len(scores))
+        neg = -np.fromiter(scores.values(), dtype=np.int64, count=len(scores))
+        order = np.lexsort((by_name[users], neg))  # By score, then username for a stable page order
+        users, neg = users[order], neg[order]
+        arrays[f"{key}/neg_scores"] = neg
+        arrays[f"{key}/users"] = users
+        by_user = np.argsort(users, kind="stable")
+        arrays[f"{key}/user_sorted"] = users[by_user]
+        arrays[f"{key}/user_pos"] = by_user.astype(np.int32)
+
+    layout, offset = {}, 0
+    for name, arr in arrays.items():
+        layout[name] = {"dtype": arr.dtype.str, "offset": offset, "length": len(arr)}
+        offset += -(-arr.nbytes // ALIGN) * ALIGN
+    header = json.dumps({"version": version, "built_at": built_at, "keys": sorted(best), "arrays": layout}).encode()
+    start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + len(header).to_bytes(8, "little") + header)
+        for name, arr in arrays.items():
+            f.seek(start + layout[name]["offset"])
+            f.write(arr.tobytes())
+        f.truncate(start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Snapshot:
+    """Read-only view of one snapshot file."""
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self.identity = os.fstat(f.fileno()).st_ino
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a leaderboard snapshot")
+        size = int.from_bytes(self._mm[len(MAGIC):len(MAGIC) + 8], "little")
+        header = json.loads(self._mm[len(MAGIC) + 8:len(MAGIC) + 8 + size])
+        start = -(-(len(MAGIC) + 8 + size) // ALIGN) * ALIGN
+        self.version: int = header["version"]
+        self.built_at: float = header["built_at"]
+        self.keys = set(header["keys"])
+        # Views into the mapping; no data is copied
+        self._arrays = {
+            name: np.frombuffer(self._mm, dtype=spec["dtype"], count=spec["length"], offset=start + spec["offset"])
+            for name, spec in header["arrays"].items()
+        }
+        self.user_ids = self._arrays["user_ids"]
+        self.usernames = self._arrays["usernames"]
+
+    def _get(self, key: str):
+        if key not in self.keys:
+            return None
+        return tuple(self._arrays[f"{key}/{name}"] for name in ("neg_scores", "users", "user_sorted", "user_pos"))
+
+    def size(self, game_mode: str, group_id: Optional[str] = None) -> int:
+        arrays = self._get(_key(game_mode, group_id))
+        return len(arrays[0]) if arrays else 0
+
+    def page(self, game_mode: str, group_id: Optional[str] = None, offset: int = 0, limit: int = 10) -> List[dict]:
+        arrays = self._get(_key(game_mode, group_id))
+        if arrays is None:
+            return []
+        neg, users = arrays[0][offset:offset + limit], arrays[1][offset:offset + limit]
+        # Competition rank (1, 2, 2, 4) as the SQL rank() window gives
+        ranks = np.searchsorted(arrays[0], neg, side="left") + 1
+        return [
+            {"rank": int(r), "user_id": self.user_ids[u].decode(), "username": self.usernames[u].decode(),
+             "best_score": int(-s)}
+            for r, u, s in zip(ranks, users, neg)
+        ]
+
+    def rank_of(self, game_mode: str, user_id: str, group_id: Optional[str] = None) -> Optional[dict]:
+        arrays = self._get(_key(game_mode, group_id))
+        wanted = user_id.encode()
+        i = int(np.searchsorted(self.user_ids, wanted))
+        if arrays is None or i == len(self.user_ids) or self.user_ids[i] != wanted:
+            return None
+        neg, _, user_sorted, user_pos = arrays
+        j = int(np.searchsorted(user_sorted, i))
+        if j == len(user_sorted) or user_sorted[j] != i:
+            return None
+        score = int(neg[user_pos[j]])
+        return {
+            "rank": int(np.searchsorted(neg, score, side="left")) + 1,
+            "user_id": user_id,
+            "username": self.usernames[i].decode(),
+            "best_score": -score,
+            "players": len(neg),
+        }
+
+
+_current: Optional[Snapshot] = None
+
+
+def current(directory: Optional[Path] = None) -> Optional[Snapshot]:
+    """The newest snapshot on disk, remapped when the file has been replaced."""
+    global _current
+    directory = directory or SNAPSHOT_DIR
+    try:
+        identity = os.stat(directory / FILE_NAME).st_ino
+    except FileNotFoundError:
+        return None
+    if _current is None or _current.identity != identity:
+        try:
+            _current = Snapshot(directory / FILE_NAME)
+        except ValueError:
+            # A file in an older format: treated as missing until the next build replaces it
+            return None
+    return _current
+
+
+async def _best_scores(db: AsyncSession) -> Tuple[Dict[str, Dict[str, int]], Dict[str, str]]:
+    """``{key: {user_id: best score}}`` and the players' current usernames."""
+    best: Dict[str, Dict[str, int]] = {}
+    everyone = (
+        select(LeaderboardEntry.game_mode, LeaderboardEntry.user_id, func.max(LeaderboardEntry.score))
+        .where(LeaderboardEntry.user_id.isnot(None))
+        .group_by(LeaderboardEntry.game_mode, LeaderboardEntry.user_id)
+    )
+    for mode, user_id, score in (await db.execute(everyone)).all():
+        best.setdefault(_key(mode.value, None), {})[user_id] = score
+    per_group = (
+        select(user_groups.c.group_id, LeaderboardEntry.game_mode, LeaderboardEntry.user_id,
+               func.max(LeaderboardEntry.score))
+        .join(user_groups, user_groups.c.user_id == LeaderboardEntry.user_id)
+        .group_by(user_groups.c.group_id, LeaderboardEntry.game_mode, LeaderboardEntry.user_id)
+    )
+    for group_id, mode, user_id, score in (await db.execute(per_group)).all():
+        best.setdefault(_key(mode.value, group_id), {})[user_id] = score
+    usernames = dict((await db.execute(
+        select(User.id, User.username).where(User.id.in_(select(LeaderboardEntry.user_id).distinct()))
+    )).all())
+    return best, usernames
+
+
+async def build(db: AsyncSession, directory: Optional[Path] = None, force: bool = False) -> bool:
+    """Write a new snapshot if the leaderboard changed since the last one; return whether one was written."""
+    directory = directory or SNAPSHOT_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / ".build.lock", "w") as lock:
+        try:
+            # Another worker on this host is building
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        version, _ = await read_version(db)
+        existing = current(directory)
+        if existing is not None and existing.version == version and not force:
+            return False
+        built_at = time.time()
+        best, usernames = await _best_scores(db)
+        await asyncio.to_thread(write_snapshot, directory / FILE_NAME, best, usernames, version, built_at)
+        builds.inc()
+        return True
+
+
+async def build_snapshot():
+    async with SessionLocal() as db:
+        await build(db)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum as SQLEnum
+from sqlalchemy import Column, Index, Integer, String, Boolean, Date, DateTime, Float, Enum as SQLEnum
 from sqlalchemy.sql import func
 from .db import Base
 from .models import GameMode
@@ -59,3 +59,158 @@ class LeaderboardEntry(Base):
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
 
     user = relationship("User", back_populates="leaderboard_entries")
+
+class LeaderboardVersion(Base):
+    """Write counter per (game_mode, group), bumped by every score submission.
+
+    Read endpoints turn the counter into an ETag so unchanged leaderboards can be
+    answered with 304 without running the ranking queries. group_id "*" counts
+    writes across all groups.
+    """
+    __tablename__ = "leaderboard_versions"
+
+    game_mode = Column(String, primary_key=True)
+    group_id = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class BackfillCheckpoint(Base):
+    """Progress of a resumable data backfill (see app.backfill), one row per job."""
+    __tablename__ = "backfill_checkpoints"
+
+    name = Column(String, primary_key=True)
+    last_key = Column(String)
+    rows_done = Column(Integer, nullable=False, default=0)
+    done = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ArchivedScoreCount(Base):
+    """Games per day, mode and player for scores moved to the Parquet archive (see app.archive).
+
+    Keeps games_played, totals and activity charts correct after cold scores
+    leave the leaderboard table. user_id is '' for legacy rows without one.
+    """
+    __tablename__ = "archived_score_counts"
+
+    day = Column(Date, primary_key=True)
+    game_mode = Column(String, primary_key=True)
+    user_id = Column(String, primary_key=True, default="")
+    username = Column(String, primary_key=True)
+    games = Column(Integer, nullable=False, default=0)
+
+class ScoreSketchBucket(Base):
+    """Scores per log-spaced bucket for each (game_mode, group); see app.sketches.
+
+    Workers add their counts with upserts, so the rows are the merged sketch.
+    group_id "*" covers all groups.
+    """
+    __tablename__ = "score_sketch_buckets"
+
+    game_mode = Column(String, primary_key=True)
+    group_id = Column(String, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class PlayerSketchRegister(Base):
+    """HyperLogLog registers counting distinct players per (game_mode, group); see app.sketches.
+
+    Only registers that were ever set have a row; workers merge by keeping the maximum.
+    """
+    __tablename__ = "player_sketch_registers"
+
+    game_mode = Column(String, primary_key=True)
+    group_id = Column(String, primary_key=True)
+    register = Column(Integer, primary_key=True)
+    rank = Column(Integer, nullable=False, default=0)
+
+class SketchRebuild(Base):
+    """The latest sketch rebuild (a single row); see app.sketches.
+
+    While ``done`` is false workers hold their deltas; afterwards they drop deltas
+    observed before ``cutoff`` (epoch seconds), which the rebuild already counted.
+    """
+    __tablename__ = "sketch_rebuild"
+
+    id = Column(Integer, primary_key=True)
+    cutoff = Column(Float, nullable=False)
+    done = Column(Boolean, nullable=False, default=False)
+
+class WindowBestScore(Base):
+    """Each player's best score in an open daily, weekly or season window; see app.windows.
+
+    Upserted by every score submission and deleted once the window is frozen
+    into window_results. group_id "*" covers all groups.
+    """
+    __tablename__ = "window_best_scores"
+
+    period = Column(String, primary_key=True)
+    window_start = Column(Date, primary_key=True)
+    game_mode = Column(String, primary_key=True)
+    group_id = Column(String, primary_key=True)
+    user_id = Column(String, primary_key=True)
+    username = Column(String, nullable=False)
+    best_score = Column(Integer, nullable=False)
+    achieved_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_window_best_scores_ranking", "period", "window_start", "game_mode", "group_id", "best_score"),
+    )
+
+class WindowResult(Base):
+    """Final standings of a closed window, written once when it rolls over; see app.windows."""
+    __tablename__ = "window_results"
+
+    period = Column(String, primary_key=True)
+    window_start = Column(Date, primary_key=True)
+    game_mode = Column(String, primary_key=True)
+    group_id = Column(String, primary_key=True)
+    user_id = Column(String, primary_key=True)
+    username = Column(String, nullable=False)
+    best_score = Column(Integer, nullable=False)
+    rank = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_window_results_rank", "period", "window_start", "game_mode", "group_id", "rank"),
+    )
+
+class PlayerRank(Base):
+    """Each player's rank at the latest rank snapshot, per (game_mode, group); see app.rankhistory.
+
+    The snapshot job compares new ranks with these rows and writes only the
+    differences to rank_history. group_id "*" covers all groups.
+    """
+    __tablename__ = "player_ranks"
+
+    game_mode = Column(String, primary_key=True)
+    group_id = Column(String, primary_key=True)
+    user_id = Column(String, primary_key=True)
+    rank = Column(Integer, nullable=False)
+    best_score = Column(Integer, nullable=False)
+
+class RankHistory(Base):
+    """A player's rank from taken_at until their next row (delta-encoded; see app.rankhistory).
+
+    Keyed by user first so one player's trajectory is a single primary-key range.
+    """
+    __tablename__ = "rank_history"
+
+    user_id = Column(String, primary_key=True)
+    group_id = Column(String, primary_key=True)
+    game_mode = Column(String, primary_key=True)
+    taken_at = Column(DateTime(timezone=True), primary_key=True)
+    # Both null: the player dropped out of this ranking at taken_at
+    rank = Column(Integer, nullable=True)
+    best_score = Column(Integer, nullable=True)
+
+class RevokedToken(Base):
+    """A token revoked by logout or used up by /auth/refresh; see app.tokens.
+
+    Rows are kept until the token could no longer be refreshed (expires_at), and
+    every worker polls for rows newer than its last sync (revoked_at).
+    """
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String, primary_key=True)
+    user_id = Column(String, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,189 @@
+"""
+Static file serving for the built frontend (``static/``).
+
+The directory is indexed once at startup: every file is stat'ed a single time and
+its ``.br`` / ``.gz`` siblings (produced by the Docker build) are recorded as
+pre-compressed variants. Requests are then answered from the index without
+touching the filesystem, and file bodies are kept in memory after the first read.
+
+Supported: Accept-Encoding negotiation, ETag / If-None-Match, single byte
+Range requests, and long-lived immutable caching for the hashed ``assets/`` files.
+"""
+import mimetypes
+import os
+from dataclasses import dataclass, field
+from email.utils import formatdate
+from pathlib import Path
+from typing import Dict, Optional
+
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+# Encodings we look for next to each file, in order of preference
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"  # Vite content-hashed files
+DEFAULT_CACHE = "public, max-age=3600"
+NO_CACHE = "no-cache"  # index.html must be revalidated so new deploys show up
+
+# Files larger than this are streamed from disk instead of being kept in memory
+MAX_CACHED_FILE = int(os.getenv("STATIC_MAX_CACHED_FILE", str(1024 * 1024)))
+
+
+@dataclass
+class _Variant:
+    path: Path
+    size: int
+    etag: str
+    body: Optional[bytes] = None
+
+    def read(self) -> Optional[bytes]:
+        """File contents, cached after the first read (None when too large)."""
+        if self.body is None and self.size <= MAX_CACHED_FILE:
+            self.body = self.path.read_bytes()
+        return self.body
+
+
+@dataclass
+class StaticAsset:
+    media_type: str
+    last_modified: str
+    cache_control: str
+    identity: _Variant
+    encoded: Dict[str, _Variant] = field(default_factory=dict)
+
+    def choose(self, accept_encoding: str) -> tuple[Optional[str], _Variant]:
+        accepted = _accepted_encodings(accept_encoding)
+        for encoding, variant in self.encoded.items():
+            if encoding in accepted:
+                return encoding, variant
+        return None, self.identity
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q=") and q[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        if token:
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+def _etag(stat: os.stat_result, suffix: str = "") -> str:
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{suffix}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def _parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """Parse a single ``bytes=start-end`` range; returns inclusive bounds."""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        raise ValueError("unsupported range")
+    start_s, _, end_s = spec.strip().partition("-")
+    if not start_s:
+        # Suffix range: the last N bytes
+        length = int(end_s)
+        if length <= 0:
+            raise ValueError("empty range")
+        return max(size - length, 0), size - 1
+    start = int(start_s)
+    end = int(end_s) if end_s else size - 1
+    if start >= size or end < start:
+        raise ValueError("unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+class StaticIndex:
+    """In-memory index of a static directory built once at startup."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.assets: Dict[str, StaticAsset] = {}
+        self._build()
+
+    def _build(self):
+        compressed_suffixes = tuple(ENCODINGS.values())
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(compressed_suffixes):
+                    continue
+                path = Path(dirpath) / name
+                rel = path.relative_to(self.root).as_posix()
+                stat = path.stat()
+                media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                if media_type.startswith("text/") or media_type in ("application/javascript", "image/svg+xml"):
+                    media_type += "; charset=utf-8"
+
+                asset = StaticAsset(
+                    media_type=media_type,
+                    last_modified=formatdate(stat.st_mtime, usegmt=True),
+                    cache_control=self._cache_control(rel),
+                    identity=_Variant(path, stat.st_size, _etag(stat)),
+                )
+                for encoding, suffix in ENCODINGS.items():
+                    enc_path = path.with_name(name + suffix)
+                    if enc_path.is_file():
+                        enc_stat = enc_path.stat()
+                        asset.encoded[encoding] = _Variant(
+                            enc_path, enc_stat.st_size, _etag(stat, f"-{encoding}")
+                        )
+                self.assets[rel] = asset
+
+    @staticmethod
+    def _cache_control(rel: str) -> str:
+        if rel.startswith("assets/"):
+            return IMMUTABLE_CACHE
+        if rel.endswith(".html"):
+            return NO_CACHE
+        return DEFAULT_CACHE
+
+    def get(self, rel_path: str) -> Optional[StaticAsset]:
+        return self.assets.get(rel_path.lstrip("/"))
+
+    def serve(self, request: Request, asset: StaticAsset) -> Response:
+        encoding, variant = asset.choose(request.headers.get("accept-encoding", ""))
+        headers = {
+            "ETag": variant.etag,
+            "Last-Modified": asset.last_modified,
+            "Cache-Control": asset.cache_control,
+        }
+        if asset.encoded:
+            headers["Vary"] = "Accept-Encoding"
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        else:
+            headers["Accept-Ranges"] = "bytes"
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, variant.etag):
+            return Response(status_code=304, headers=headers)
+
+        body = variant.read()
+        if body is None:
+            # Too large to keep in memory; FileResponse streams it and handles Range
+            return FileResponse(variant.path, media_type=asset.media_type, headers=headers)
+
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and encoding is None and (not if_range or if_range == variant.etag):
+            try:
+                start, end = _parse_range(range_header, len(body))
+            except ValueError:
+                headers["Content-Range"] = f"bytes */{len(body)}"
+                return Response(status_code=416, headers=headers)
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+            return Response(body[start:end + 1], status_code=206, media_type=asset.media_type, headers=headers)
+
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            return Response(status_code=200, media_type=asset.media_type, headers=headers)
+        return Response(body, media_type=asset.media_type, headers=headers)
@@ -0,0 +1,159 @@
+"""
+Vectorised statistics for the report endpoints.
+
+Endpoints load a column (scores, ranks, per-day counts) as a NumPy array and use
+these helpers instead of looping over Python lists: bucket counts come from
+binary searches over the sorted scores, per-user and per-mode aggregates from
+``np.bincount`` over integer codes. ``bench_stats.py`` compares them with the
+previous loops.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+PERCENTILES = (25, 50, 75, 90, 99)
+
+
+def as_array(values: Iterable, dtype=np.int64) -> np.ndarray:
+    if isinstance(values, np.ndarray):
+        return values
+    return np.fromiter(values, dtype=dtype)
+
+
+def histogram(scores: Iterable[int], buckets: int = 10) -> List[Dict[str, object]]:
+    """``buckets`` equal-width buckets from the lowest to the highest score, labelled "lo-hi".
+
+    A bucket holds ``lo <= score < hi``; the last one also holds the highest score.
+    """
+    scores = np.sort(as_array(scores))
+    if not scores.size:
+        return []
+    low, high = scores[0].item(), scores[-1].item()
+    if low == high:
+        return [{"range": f"{low}", "count": int(scores.size)}]
+    step = (high - low) / buckets
+    # Edges by repeated addition, so labels match what clients have always seen
+    edges = [low]
+    for _ in range(buckets):
+        edges.append(edges[-1] + step)
+    starts = np.searchsorted(scores, edges[:-1], side="left")
+    ends = np.searchsorted(scores, edges[1:], side="left")
+    ends[-1] = scores.size
+    return [
+        {"range": f"{int(lo)}-{int(hi)}", "count": int(n)}
+        for lo, hi, n in zip(edges, edges[1:], ends - starts)
+    ]
+
+
+def percentiles(scores: Iterable[int], qs: Sequence[float] = PERCENTILES) -> Dict[str, float]:
+    """Count, mean and the given percentiles (linear interpolation) of ``scores``."""
+    scores = as_array(scores)
+    if not scores.size:
+        return {"count": 0}
+    values = np.percentile(scores, qs)
+    return {
+        "count": int(scores.size),
+        "mean": round(float(scores.mean()), 2),
+        **{f"p{q:g}": float(v) for q, v in zip(qs, values)},
+    }
+
+
+def codes(keys: Sequence) -> Tuple[list, np.ndarray]:
+    """Distinct keys in first-seen order and each element's index into them."""
+    index: Dict[object, int] = {}
+    positions = np.fromiter((index.setdefault(k, len(index)) for k in keys), dtype=np.int64, count=len(keys))
+    return list(index), positions
+
+
+def group_sum(positions: np.ndarray, values, groups: int) -> np.ndarray:
+    return np.bincount(positions, weights=np.asarray(values, dtype=np.float64), minlength=groups)
+
+
+def group_mean(positions: np.ndarray, values, groups: int) -> np.ndarray:
+    return group_sum(positions, values, groups) / np.bincount(positions, minlength=groups)
+
+
+def zscores(positions: np.ndarray, values, groups: int) -> np.ndarray:
+    """Each value's distance from its group's mean in standard deviations (0 with no spread)."""
+    values = np.asarray(values, dtype=np.float64)
+    diff = values - group_mean(positions, values, groups)[positions]
+    std = np.sqrt(group_mean(positions, diff ** 2, groups))[positions]
+    return np.divide(diff, std, out=np.zeros_like(diff), where=std > 0)
+
+
+def day_labels(start: datetime, days: int) -> List[str]:
+    """"YYYY-MM-DD" for each of the ``days + 1`` days from ``start``."""
+    first = np.datetime64(start.date(), "D")
+    return np.datetime_as_string(np.arange(first, first + np.timedelta64(days + 1, "D")), unit="D").tolist()
+
+
+def daily_series(start: datetime, days: int, counts: Dict[str, int]) -> Tuple[List[str], np.ndarray]:
+    """Labels and counts for each of the ``days + 1`` days from ``start``, from {"YYYY-MM-DD": n}."""
+    labels = day_labels(start, days)
+    return labels, np.fromiter((counts.get(d, 0) for d in labels), dtype=np.int64, count=len(labels))
+
+
+def rolling_sum(counts: np.ndarray, window: int) -> np.ndarray:
+    """Sum of each element and the ``window - 1`` before it (fewer at the start)."""
+    totals = np.cumsum(counts)
+    totals[window:] = totals[window:] - totals[:-window]
+    return totals
+
+
+def overall_rankings(usernames: List[str], modes: List[str], best_scores: np.ndarray, ranks: np.ndarray,
+                     normalize: bool = False) -> List[Dict[str, object]]:
+    """Overall ranking rows from one (username, mode, best score, rank in mode) entry per column index.
+
+    Users are ordered by their average rank over the modes they played, or with
+    ``normalize`` by their average z-score (best score against the mode's mean
+    and spread), which does not reward playing only the less crowded modes.
+    """
+    if not usernames:
+        return []
+    names, user_pos = codes(usernames)
+    n = len(names)
+    modes_played = np.bincount(user_pos, minlength=n)
+    total_best_scores = group_sum(user_pos, best_scores, n)
+    avg_rank = [round(float(a), 2) for a in group_mean(user_pos, ranks, n)]
+    mode_ranks: List[Dict[str, int]] = [{} for _ in names]
+    for pos, mode, rank in zip(user_pos.tolist(), modes, np.asarray(ranks).tolist()):
+        mode_ranks[pos][mode] = rank
+
+    if normalize:
+        mode_keys, mode_pos = codes(modes)
+        avg_zscore = [round(float(a), 3) for a in group_mean(user_pos, zscores(mode_pos, best_scores, len(mode_keys)), n)]
+        order = np.argsort(-np.array(avg_zscore), kind="stable")
+    else:
+        # Lower average rank is better
+        order = np.argsort(np.array(avg_rank), kind="stable")
+
+    rows = []
+    for idx, u in enumerate(order.tolist()):
+        row = {
+            "username": names[u],
+            "modes_played": int(modes_played[u]),
+            "total_best_scores": int(total_best_scores[u]),
+            "avg_rank": avg_rank[u],
+            "overall_rank": idx + 1,
+            "mode_ranks": mode_ranks[u],
+        }
+        if normalize:
+            row["avg_zscore"] = avg_zscore[u]
+        rows.append(row)
+    return rows
+
+
+def user_day_matrix(start: datetime, days: int, top_users: List[str], day_keys: List[str],
+                    usernames: List[str], counts) -> Dict[str, Dict[str, object]]:
+    """{"YYYY-MM-DD": {"date": ..., <user>: games}} for each day from ``start``, from (day, user, count) columns."""
+    labels = day_labels(start, days)
+    day_index = {d: i for i, d in enumerate(labels)}
+    user_index = {u: i for i, u in enumerate(top_users)}
+    matrix = np.zeros((len(labels), len(top_users)), dtype=np.int64)
+    cells = [(day_index[d], user_index[u], c) for d, u, c in zip(day_keys, usernames, counts)
+             if d in day_index and u in user_index]
+    if cells:
+        rows, cols, values = zip(*cells)
+        matrix[list(rows), list(cols)] = values
+    return {d: {"date": d, **dict(zip(top_users, matrix[i].tolist()))} for i, d in enumerate(labels)}
@@ -0,0 +1,202 @@
+"""
+Stale-while-revalidate serving for the ranking and stats endpoints.
+
+Each endpoint has a freshness budget (``app.endpoints``):
+
+* younger than ``soft`` seconds: the cached result is served without touching
+  the database at all;
+* between ``soft`` and ``hard``: the cached result is served immediately and a
+  background task revalidates it (a version lookup, and a recompute only if the
+  data actually changed);
+* older than ``hard`` (or not cached): the request revalidates synchronously.
+  If the database does not answer within ``SWR_DB_TIMEOUT`` seconds, the last
+  good result is served with ``X-Data-Stale: true`` instead of an error.
+
+Synchronous loads run under ``app.query_guard`` (per-endpoint statement
+timeout, cancellation when the client disconnects).
+
+Clients that just wrote (see ``app.db.mark_recent_write``) always revalidate, so
+they see their own scores. Conditional GET (ETag/304) and single-flight
+coalescing from ``app.versioning`` / ``app.singleflight`` apply on every path,
+so an endpoint only describes its computation as a ``Query`` and returns
+``serve``'s result.
+
+Background refreshes open their own read session from ``session_factory``.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import db as db_module
+from .endpoints import policy
+from .metrics import counter, gauge
+from .query_guard import QueryTimeout, run_guarded, statement_timeout
+from .singleflight import leaderboard_flights
+from .versioning import apply_validators, etag_for, not_modified, read_version, time_bucket
+
+logger = logging.getLogger("uvicorn.error")
+
+SWR_ENABLED = os.getenv("SWR_ENABLED", "1") == "1"
+SWR_DB_TIMEOUT = float(os.getenv("SWR_DB_TIMEOUT", "3"))
+SWR_MAX_ENTRIES = int(os.getenv("SWR_MAX_ENTRIES", "512"))
+
+
+@dataclass
+class Entry:
+    value: Any
+    version: int
+    updated_at: Optional[datetime]
+    tag_extra: Tuple[str, ...]
+    stored_at: float = field(default_factory=time.monotonic)
+    refreshing: bool = False
+
+
+class ResultCache:
+    """Small LRU of endpoint results for this worker."""
+
+    def __init__(self, max_entries: int = SWR_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Entry]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Entry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, entry: Entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+cache = ResultCache()
+# Opens the read sessions background refreshes run on
+session_factory = db_module.ReadSessionLocal
+_background: set = set()  # Keeps refresh tasks referenced until they finish
+
+fresh_hits = counter("swr_fresh_hits", "Served from cache within the soft TTL")
+revalidating_hits = counter("swr_revalidating_hits", "Served from cache past the soft TTL while refreshing")
+stale_on_error = counter("swr_stale_on_error", "Served the last good value because the DB timed out or failed")
+misses = counter("swr_misses", "Requests that revalidated synchronously")
+refresh_failures = counter("swr_refresh_failures", "Background refreshes that failed")
+gauge("swr_entries", "Cached endpoint results", lambda: len(cache))
+
+
+@dataclass(frozen=True)
+class Query:
+    """What an endpoint needs computed, and how its data version is looked up."""
+    name: str
+    params: Tuple[Any, ...]
+    compute: Callable[[AsyncSession], Awaitable[Any]]
+    game_mode: Optional[str] = None
+    group_id: Optional[str] = None
+    time_relative: bool = False  # Result also changes as time passes ("last N days")
+
+    def __post_init__(self):
+        policy(self.name)  # Fails fast on an endpoint missing from app.endpoints
+
+    @property
+    def key(self) -> Hashable:
+        return (self.name, *(p.value if isinstance(p, Enum) else p for p in self.params))
+
+
+async def _load(db: AsyncSession, query: Query, previous: Optional[Entry]) -> Entry:
+    version, updated_at = await read_version(db, query.game_mode, query.group_id)
+    tag_extra = (time_bucket(),) if query.time_relative else ()
+    if previous is not None and previous.version == version and previous.tag_extra == tag_extra:
+        # Nothing was written since: keep the value, restart its freshness clock
+        return Entry(previous.value, version, updated_at, tag_extra)
+    value = await leaderboard_flights.do((*query.key, version, *tag_extra), lambda: query.compute(db))
+    return Entry(value, version, updated_at, tag_extra)
+
+
+async def _refresh(query: Query, entry: Entry):
+    try:
+        async with session_factory() as session:
+            async with statement_timeout(session, policy(query.name).timeout):
+                fresh = await asyncio.wait_for(_load(session, query, entry), SWR_DB_TIMEOUT)
+        cache.put(query.key, fresh)
+    except Exception:
+        refresh_failures.inc()
+        logger.warning("Background refresh of %s failed", query.name, exc_info=True)
+    finally:
+        entry.refreshing = False
+
+
+def _schedule_refresh(query: Query, entry: Entry):
+    if entry.refreshing:
+        return
+    entry.refreshing = True
+    task = asyncio.create_task(_refresh(query, entry))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+def _respond(request: Request, response: Response, entry: Entry, stale: bool = False):
+    etag = etag_for(request, entry.version, *entry.tag_extra)
+    headers = {"Age": str(int(time.monotonic() - entry.stored_at))}
+    if stale:
+        headers["X-Data-Stale"] = "true"
+    cached = not_modified(request, etag, entry.updated_at)
+    if cached is not None:
+        cached.headers.update(headers)
+        return cached
+    apply_validators(response, etag, entry.updated_at)
+    response.headers.update(headers)
+    return entry.value
+
+
+async def serve(request: Request, response: Response, db: AsyncSession, query: Query):
+    """Endpoint result (or a 304 Response) following the endpoint's freshness budget."""
+    budget = policy(query.name)
+    entry = cache.get(query.key) if SWR_ENABLED else None
+
+    if entry is not None and not db_module.is_recent_writer(request):
+        age = time.monotonic() - entry.stored_at
+        if age < budget.soft:
+            fresh_hits.inc()
+            return _respond(request, response, entry)
+        if age < budget.hard:
+            revalidating_hits.inc()
+            _schedule_refresh(query, entry)
+            return _respond(request, response, entry)
+
+    misses.inc()
+    load = lambda: _load(db, query, entry)
+    if entry is None:
+        # Nothing to fall back on: wait up to the endpoint's statement timeout
+        try:
+            fresh = await run_guarded(request, db, query.name, load)
+        except QueryTimeout:
+            raise HTTPException(status_code=504, detail="Query timed out", headers={"Retry-After": "5"})
+    else:
+        try:
+            fresh = await asyncio.wait_for(run_guarded(request, db, query.name, load), SWR_DB_TIMEOUT)
+        except (asyncio.TimeoutError, QueryTimeout, SQLAlchemyError, OSError):
+            stale_on_error.inc()
+            logger.warning("Serving stale %s after DB timeout/failure", query.name, exc_info=True)
+            return _respond(request, response, entry, stale=True)
+    if isinstance(fresh, Response):
+        return fresh  # Client disconnected; the query was cancelled
+
+    if SWR_ENABLED:
+        cache.put(query.key, fresh)
+    return _respond(request, response, fresh)
@@ -0,0 +1,216 @@
+"""
+Signed, expiring access tokens.
+
+Tokens are compact HS256 JWTs (``header.claims.signature``, base64url) whose
+claims carry everything the API needs about the caller: ``sub`` (user id),
+``username``, ``email``, ``groups`` ([{"id", "name"}]), ``iat``, ``exp`` and
+``jti``. Verifying one is an HMAC over a few hundred bytes, and verified tokens
+are remembered in an LRU, so authenticated requests never touch the database.
+
+Keys come from ``SECRET_KEYS`` (``"kid:secret,kid:secret"``; the first one signs,
+all of them verify, which is how keys are rotated) or a single ``SECRET_KEY``.
+
+Revocations (logout, and tokens used up by ``/auth/refresh``) are stored in
+``revoked_tokens``. Refresh and logout write and check that table directly; the
+request path checks a per-worker copy that every worker refreshes from it every
+``REVOCATION_SYNC_INTERVAL`` seconds, so a logout reaches all workers within
+that interval. Group changes reach a client when it next refreshes its token.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import APP_ENV, SessionLocal, insert_for
+from .metrics import gauge
+from .sql_models import RevokedToken
+
+TOKEN_TTL_SECONDS = int(os.getenv("TOKEN_TTL_SECONDS", str(7 * 24 * 3600)))
+# How long after expiry a token may still be exchanged on /auth/refresh
+REFRESH_GRACE_SECONDS = int(os.getenv("REFRESH_GRACE_SECONDS", str(30 * 24 * 3600)))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+REVOCATION_SYNC_INTERVAL = float(os.getenv("REVOCATION_SYNC_INTERVAL", "30"))
+
+# Old "mock-token-<user id>" tokens carry no signature; only accept them while
+# clients migrate
+ACCEPT_LEGACY_TOKENS = os.getenv("ACCEPT_LEGACY_TOKENS", "0") == "1"
+LEGACY_PREFIX = "mock-token-"
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class TokenExpired(InvalidToken):
+    pass
+
+
+def _load_keys() -> "OrderedDict[str, bytes]":
+    keys: "OrderedDict[str, bytes]" = OrderedDict()
+    for item in filter(None, os.getenv("SECRET_KEYS", "").split(",")):
+        kid, _, secret = item.strip().partition(":")
+        keys[kid] = secret.encode()
+    if not keys and os.getenv("SECRET_KEY"):
+        keys["default"] = os.getenv("SECRET_KEY").encode()
+    if not keys:
+        if APP_ENV == "production":
+            raise RuntimeError("SECRET_KEY or SECRET_KEYS must be set in production")
+        keys["dev"] = b"dev-only-insecure-secret"
+    return keys
+
+
+KEYS = _load_keys()
+SIGNING_KID = next(iter(KEYS))
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(kid: str, signing_input: bytes) -> bytes:
+    return hmac.new(KEYS[kid], signing_input, hashlib.sha256).digest()
+
+
+def issue(user, ttl: int = TOKEN_TTL_SECONDS) -> str:
+    """Token for a user object with id, username, email and loaded groups."""
+    now = int(time.time())
+    header = {"alg": "HS256", "typ": "JWT", "kid": SIGNING_KID}
+    claims = {
+        "sub": user.id,
+        "username": user.username,
+        "email": user.email,
+        "groups": [{"id": g.id, "name": g.name} for g in user.groups],
+        "iat": now,
+        "exp": now + ttl,
+        "jti": uuid.uuid4().hex,
+    }
+    signing_input = ".".join(
+        _b64encode(json.dumps(part, separators=(",", ":")).encode()) for part in (header, claims)
+    ).encode()
+    return f"{signing_input.decode()}.{_b64encode(_sign(SIGNING_KID, signing_input))}"
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def _verified_claims(token: str) -> Dict[str, Any]:
+    try:
+        header_b64, claims_b64, sig_b64 = token.split(".")
+        header = json.loads(_b64decode(header_b64))
+        signature = _b64decode(sig_b64)
+    except ValueError:
+        raise InvalidToken("Malformed token")
+    if not isinstance(header, dict):
+        raise InvalidToken("Malformed token")
+    kid = header.get("kid")
+    if header.get("alg") != "HS256" or kid not in KEYS:
+        raise InvalidToken("Unknown signing key")
+    if not hmac.compare_digest(signature, _sign(kid, f"{header_b64}.{claims_b64}".encode())):
+        raise InvalidToken("Bad signature")
+    try:
+        return json.loads(_b64decode(claims_b64))
+    except ValueError:
+        raise InvalidToken("Malformed token")
+
+
+def decode(token: str, leeway: int = 0) -> Dict[str, Any]:
+    """Claims of a validly signed token that expired no more than ``leeway`` seconds ago."""
+    claims = _verified_claims(token)
+    if claims["exp"] + leeway < time.time():
+        raise TokenExpired("Token expired")
+    return claims
+
+
+gauge("token_cache_hits", "Token verifications answered from the LRU", lambda: _verified_claims.cache_info().hits)
+gauge("token_cache_misses", "Token verifications that computed an HMAC", lambda: _verified_claims.cache_info().misses)
+
+
+class RevocationList:
+    """Per-worker copy of ``revoked_tokens``: jti -> exp, dropped once no longer refreshable."""
+
+    def __init__(self):
+        self._tokens: Dict[str, float] = {}
+        self.synced_at: Optional[datetime] = None  # revoked_at watermark of the last sync
+
+    def revoke(self, claims: Dict[str, Any]):
+        now = time.time()
+        self._tokens = {jti: exp for jti, exp in self._tokens.items() if exp + REFRESH_GRACE_SECONDS > now}
+        self._tokens[claims["jti"]] = claims["exp"]
+
+    def is_revoked(self, claims: Dict[str, Any]) -> bool:
+        return claims["jti"] in self._tokens
+
+    def clear(self):
+        self._tokens.clear()
+        self.synced_at = None
+
+
+revocations = RevocationList()
+gauge("revoked_tokens", "Tokens on this worker's revocation list", lambda: len(revocations._tokens))
+
+
+def authenticate(token: str) -> Dict[str, Any]:
+    """Claims of a valid token that is not on this worker's revocation list."""
+    claims = decode(token)
+    if revocations.is_revoked(claims):
+        raise InvalidToken("Token revoked")
+    return claims
+
+
+def bearer_user_id(authorization: str) -> Optional[str]:
+    """User id of an ``Authorization: Bearer`` header whose token authenticates, else None (no DB lookup)."""
+    if not authorization.lower().startswith("bearer "):
+        return None
+    token = authorization[7:]
+    if token.startswith(LEGACY_PREFIX):
+        return token[len(LEGACY_PREFIX):] if ACCEPT_LEGACY_TOKENS else None
+    try:
+        return authenticate(token)["sub"]
+    except InvalidToken:
+        return None
+
+
+async def revoke(db: AsyncSession, claims: Dict[str, Any]) -> bool:
+    """Revoke a token for all workers (commits); False when it was already revoked."""
+    revocations.revoke(claims)
+    now = datetime.now(timezone.utc)
+    row = (await db.execute(
+        insert_for(db)(RevokedToken).values(
+            jti=claims["jti"], user_id=claims["sub"], revoked_at=now,
+            expires_at=datetime.fromtimestamp(claims["exp"] + REFRESH_GRACE_SECONDS, timezone.utc),
+        ).on_conflict_do_nothing().returning(RevokedToken.jti)
+    )).scalar_one_or_none()
+    await db.commit()
+    return row is not None
+
+
+async def sync_revocations(db: AsyncSession):
+    """Copy revocations made since the last sync (by any worker) into this worker's list."""
+    now = datetime.now(timezone.utc)
+    query = select(RevokedToken.jti, RevokedToken.expires_at).where(RevokedToken.expires_at > now)
+    if revocations.synced_at is not None:
+        # Overlap the previous sync so rows committed late by a slow transaction are not missed
+        query = query.where(RevokedToken.revoked_at >= revocations.synced_at - timedelta(seconds=REVOCATION_SYNC_INTERVAL))
+    for jti, expires_at in (await db.execute(query)).all():
+        expires_at = expires_at if expires_at.tzinfo else expires_at.replace(tzinfo=timezone.utc)
+        revocations.revoke({"jti": jti, "exp": expires_at.timestamp() - REFRESH_GRACE_SECONDS})
+    revocations.synced_at = now
+    await db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+    await db.commit()
+
+
+async def sync_revocations_job():
+    async with SessionLocal() as db:
+        await sync_revocations(db)
@@ -0,0 +1,123 @@
+"""
+Cheap version tags for leaderboard reads (HTTP conditional GET).
+
+Every score submission bumps a counter per (game_mode, group) plus the "*" row
+covering all groups; so does every membership change, in all modes. A read endpoint sums the counters relevant to its filters,
+which is a primary-key lookup, and turns the sum into an ETag. Because every
+counter only grows, the sum changes whenever any matching score is written.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Iterable, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import insert_for
+from .models import GameMode
+from .sql_models import LeaderboardVersion
+
+ALL_GROUPS = "*"
+
+# Validators must be re-checked on every use; clients may still keep the body
+CACHE_CONTROL = "no-cache"
+
+
+async def bump_versions(db: AsyncSession, game_mode: str, group_ids: Iterable[str]):
+    """Record a write for game_mode in each group (call inside the write's transaction)."""
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"game_mode": game_mode, "group_id": gid, "version": 1, "updated_at": now}
+        for gid in {ALL_GROUPS, *group_ids}
+    ]
+    stmt = insert_for(db)(LeaderboardVersion).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[LeaderboardVersion.game_mode, LeaderboardVersion.group_id],
+        set_={
+            "version": LeaderboardVersion.version + 1,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    await db.execute(stmt)
+
+
+async def bump_membership(db: AsyncSession, group_ids: Iterable[str]):
+    """Record a membership change in ``group_ids``: their boards change in every mode."""
+    group_ids = list(group_ids)
+    for mode in GameMode:
+        await bump_versions(db, mode.value, group_ids)
+
+
+async def read_version(
+    db: AsyncSession, game_mode: Optional[str] = None, group_id: Optional[str] = None
+) -> tuple[int, Optional[datetime]]:
+    """Sum of write counters matching the filters and the latest write time."""
+    gid = group_id if group_id and group_id != "all" else ALL_GROUPS
+    game_mode = getattr(game_mode, "value", game_mode)  # Accept GameMode members
+    query = select(
+        func.coalesce(func.sum(LeaderboardVersion.version), 0),
+        func.max(LeaderboardVersion.updated_at),
+    ).where(LeaderboardVersion.group_id == gid)
+    if game_mode:
+        query = query.where(LeaderboardVersion.game_mode == game_mode)
+    version, updated_at = (await db.execute(query)).one()
+    return int(version), updated_at
+
+
+def etag_for(request: Request, version: int, *extra: str) -> str:
+    """Weak ETag combining the data version with the request's own parameters."""
+    key = "|".join([request.url.path, str(sorted(request.query_params.multi_items())), *extra])
+    digest = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+    return f'W/"{version}-{digest}"'
+
+
+def time_bucket(seconds: int = 60) -> str:
+    """Tag component for responses that also change as time passes (e.g. "last 24h")."""
+    return str(int(datetime.now(timezone.utc).timestamp()) // seconds)
+
+
+def apply_validators(response: Response, etag: str, updated_at: Optional[datetime] = None):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    if updated_at is not None:
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)  # SQLite drops the zone
+        response.headers["Last-Modified"] = format_datetime(updated_at, usegmt=True)
+
+
+def not_modified(request: Request, etag: str, updated_at: Optional[datetime] = None) -> Optional[Response]:
+    """A 304 response when the client already holds etag, otherwise None."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison (RFC 9110 13.1.2): W/ prefixes are ignored
+    bare = etag.removeprefix("W/")
+    if "*" in tags or any(tag.removeprefix("W/") == bare for tag in tags):
+        response = Response(status_code=304)
+        apply_validators(response, etag, updated_at)
+        return response
+    return None
+
+
+async def conditional_get(
+    request: Request,
+    response: Response,
+    db: AsyncSession,
+    game_mode: Optional[str] = None,
+    group_id: Optional[str] = None,
+    *extra: str,
+) -> Optional[Response]:
+    """Short-circuit a read endpoint with 304, or attach validators to its response.
+
+    Returns the 304 response to send, or None when the endpoint should run its
+    query as usual (the ETag has then already been set on ``response``).
+    """
+    version, updated_at = await read_version(db, game_mode, group_id)
+    etag = etag_for(request, version, *extra)
+    cached = not_modified(request, etag, updated_at)
+    if cached is None:
+        apply_validators(response, etag, updated_at)
+    return cached
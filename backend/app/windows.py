@@ -0,0 +1,226 @@
+"""
+Daily, weekly and season leaderboards per (game_mode, group).
+
+Every score submission upserts the player's best score into the open window of
+each period (UTC day, ISO week starting Monday, and the season) in
+``window_best_scores``, under "*" (all groups) and each of the player's groups,
+in the submission's transaction. A window's ranking is an index range over its
+own rows, so "this week's top 10" never reads scores from other weeks.
+
+Seasons are ``SEASON_DAYS`` long, counted from ``SEASON_EPOCH``. Once a window
+has been closed for ``WINDOW_ROLLOVER_GRACE`` seconds (long enough for
+submissions already in flight to commit), ``roll_over`` freezes its final
+standings into ``window_results`` and deletes its live rows. The leader worker
+(see ``app.background``) runs it every ``WINDOW_ROLLOVER_INTERVAL`` seconds;
+freezing the same window twice writes nothing new.
+
+Windows only see scores submitted since they were deployed; ``python -m
+app.maintenance rebuild-windows`` recomputes the open windows from the
+leaderboard table and upserts them like submissions do, keeping the greater
+score, so it is safe to run while scores keep coming in.
+"""
+import os
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import SessionLocal, insert_for
+from .metrics import counter
+from .sql_models import WindowBestScore, WindowResult
+from .versioning import ALL_GROUPS
+
+SEASON_EPOCH = date.fromisoformat(os.getenv("SEASON_EPOCH", "2026-01-01"))
+SEASON_DAYS = int(os.getenv("SEASON_DAYS", "91"))
+WINDOW_ROLLOVER_INTERVAL = float(os.getenv("WINDOW_ROLLOVER_INTERVAL", "60"))
+WINDOW_ROLLOVER_GRACE = float(os.getenv("WINDOW_ROLLOVER_GRACE", "300"))
+
+PERIODS = ("daily", "weekly", "season")
+INSERT_CHUNK = 1000
+
+frozen_windows = counter("windows_frozen", "Closed leaderboard windows frozen into window_results")
+
+
+def window_start(period: str, day: date) -> date:
+    """First day of the ``period`` window containing ``day``."""
+    if period == "daily":
+        return day
+    if period == "weekly":
+        return day - timedelta(days=day.weekday())
+    if period == "season":
+        return SEASON_EPOCH + timedelta(days=(day - SEASON_EPOCH).days // SEASON_DAYS * SEASON_DAYS)
+    raise ValueError(f"Unknown leaderboard period {period!r}")
+
+
+def window_end(period: str, start: date) -> date:
+    """First day after the window starting on ``start``."""
+    return start + timedelta(days={"daily": 1, "weekly": 7, "season": SEASON_DAYS}[period])
+
+
+def _group(group_id: Optional[str]) -> str:
+    return group_id if group_id and group_id != "all" else ALL_GROUPS
+
+
+def _utc(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+async def _upsert_best(db: AsyncSession, rows: List[dict]):
+    stmt = insert_for(db)(WindowBestScore).values(rows)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["period", "window_start", "game_mode", "group_id", "user_id"],
+        set_={
+            "best_score": stmt.excluded.best_score,
+            "username": stmt.excluded.username,
+            "achieved_at": stmt.excluded.achieved_at,
+        },
+        # Only an improvement replaces the window's best
+        where=WindowBestScore.best_score < stmt.excluded.best_score,
+    ))
+
+
+async def record(db: AsyncSession, game_mode: str, group_ids: Iterable[str], user_id: str, username: str,
+                 score: int, at: Optional[datetime] = None):
+    """Add a score to the open windows (call inside the submission's transaction)."""
+    at = at or datetime.now(timezone.utc)
+    await _upsert_best(db, [
+        {"period": period, "window_start": window_start(period, at.date()), "game_mode": game_mode,
+         "group_id": gid, "user_id": user_id, "username": username, "best_score": score, "achieved_at": at}
+        for period in PERIODS
+        for gid in {ALL_GROUPS, *group_ids}
+    ])
+
+
+async def standings(db: AsyncSession, period: str, game_mode: str, group_id: Optional[str] = None,
+                    start: Optional[date] = None, offset: int = 0, limit: int = 10) -> dict:
+    """A page of one window's ranking: the open window, or the one containing ``start``."""
+    start = window_start(period, start or datetime.now(timezone.utc).date())
+    end = window_end(period, start)
+    group = _group(group_id)
+    out = {"period": period, "window_start": start.isoformat(), "window_end": end.isoformat()}
+
+    if _utc(end) <= datetime.now(timezone.utc):
+        key = (WindowResult.period == period, WindowResult.window_start == start,
+               WindowResult.game_mode == game_mode, WindowResult.group_id == group)
+        players = (await db.execute(select(func.count()).select_from(WindowResult).where(*key))).scalar_one()
+        if players:
+            rows = (await db.execute(
+                select(WindowResult.rank, WindowResult.username, WindowResult.best_score).where(*key)
+                .order_by(WindowResult.rank, WindowResult.username).offset(offset).limit(limit)
+            )).all()
+            return {**out, "frozen": True, "players": players,
+                    "entries": [{"rank": r, "username": u, "best_score": s} for r, u, s in rows]}
+        # Closed but not rolled over yet: the live rows are still final
+
+    key = (WindowBestScore.period == period, WindowBestScore.window_start == start,
+           WindowBestScore.game_mode == game_mode, WindowBestScore.group_id == group)
+    players = (await db.execute(select(func.count()).select_from(WindowBestScore).where(*key))).scalar_one()
+    rows = (await db.execute(
+        select(WindowBestScore.username, WindowBestScore.best_score).where(*key)
+        .order_by(WindowBestScore.best_score.desc(), WindowBestScore.username).offset(offset).limit(limit)
+    )).all()
+    entries, rank = [], 1
+    if rows and offset:
+        # Competition rank of the page's first row
+        rank += (await db.execute(
+            select(func.count()).select_from(WindowBestScore).where(*key, WindowBestScore.best_score > rows[0].best_score)
+        )).scalar_one()
+    for i, (username, score) in enumerate(rows):
+        if i and score != rows[i - 1].best_score:
+            rank = offset + i + 1
+        entries.append({"rank": rank, "username": username, "best_score": score})
+    return {**out, "frozen": False, "players": players, "entries": entries}
+
+
+def _ranked(rows) -> List[dict]:
+    """Result rows with competition ranks per (game_mode, group), from rows sorted by key then score."""
+    out, last_key, last_score, rank = [], None, None, 0
+    for i, r in enumerate(rows):
+        key = (r.game_mode, r.group_id)
+        if key != last_key:
+            first, last_key, last_score = i, key, None
+        if r.best_score != last_score:
+            rank, last_score = i - first + 1, r.best_score
+        out.append({"period": r.period, "window_start": r.window_start, "game_mode": r.game_mode,
+                    "group_id": r.group_id, "user_id": r.user_id, "username": r.username,
+                    "best_score": r.best_score, "rank": rank})
+    return out
+
+
+async def _freeze(db: AsyncSession, period: str, start: date) -> int:
+    rows = (await db.execute(
+        select(WindowBestScore)
+        .where(WindowBestScore.period == period, WindowBestScore.window_start == start)
+        .order_by(WindowBestScore.game_mode, WindowBestScore.group_id,
+                  WindowBestScore.best_score.desc(), WindowBestScore.username)
+    )).scalars().all()
+    results = _ranked(rows)
+    insert = insert_for(db)
+    for i in range(0, len(results), INSERT_CHUNK):
+        await db.execute(insert(WindowResult).values(results[i:i + INSERT_CHUNK]).on_conflict_do_nothing())
+    await db.execute(delete(WindowBestScore).where(WindowBestScore.period == period, WindowBestScore.window_start == start))
+    await db.commit()
+    frozen_windows.inc()
+    return len(results)
+
+
+async def roll_over(db: AsyncSession, now: Optional[datetime] = None) -> List[Tuple[str, date]]:
+    """Freeze every window closed for at least the grace period; return the (period, start) frozen."""
+    now = now or datetime.now(timezone.utc)
+    live = (await db.execute(select(WindowBestScore.period, WindowBestScore.window_start).distinct())).all()
+    closed = sorted((p, s) for p, s in live if _utc(window_end(p, s)) + timedelta(seconds=WINDOW_ROLLOVER_GRACE) <= now)
+    for period, start in closed:
+        await _freeze(db, period, start)
+    return closed
+
+
+async def roll_over_windows():
+    async with SessionLocal() as db:
+        await roll_over(db)
+
+
+async def rebuild(db: AsyncSession, batch_size: int = 10000, report=print) -> int:
+    """Recompute the open windows from the leaderboard table; return the number of scores read."""
+    from .sql_models import LeaderboardEntry, user_groups
+
+    today = datetime.now(timezone.utc).date()
+    starts = {period: window_start(period, today) for period in PERIODS}
+    since = min(starts.values())
+
+    groups: Dict[str, list] = defaultdict(list)
+    for user_id, group_id in (await db.execute(select(user_groups.c.user_id, user_groups.c.group_id))).all():
+        groups[user_id].append(group_id)
+
+    best: Dict[tuple, dict] = {}
+    scanned = 0
+    result = await db.stream(
+        select(LeaderboardEntry.game_mode, LeaderboardEntry.user_id, LeaderboardEntry.username,
+               LeaderboardEntry.score, LeaderboardEntry.timestamp)
+        # Only the open windows' days (pruned to their partitions on Postgres)
+        .where(LeaderboardEntry.timestamp >= _utc(since),
+               LeaderboardEntry.user_id.isnot(None))
+        .execution_options(yield_per=batch_size)
+    )
+    async for rows in result.partitions():
+        for mode, user_id, username, score, at in rows:
+            at = at if at.tzinfo else at.replace(tzinfo=timezone.utc)  # SQLite drops the zone
+            mode = getattr(mode, "value", mode)
+            for period, start in starts.items():
+                if at.date() < start:
+                    continue
+                for gid in {ALL_GROUPS, *groups.get(user_id, ())}:
+                    key = (period, start, mode, gid, user_id)
+                    if key not in best or best[key]["best_score"] < score:
+                        best[key] = {"period": period, "window_start": start, "game_mode": mode, "group_id": gid,
+                                     "user_id": user_id, "username": username, "best_score": score, "achieved_at": at}
+        scanned += len(rows)
+        report(f"rebuild-windows: {scanned} scores read")
+
+    # Submissions committed meanwhile keep their scores if greater
+    rows = list(best.values())
+    for i in range(0, len(rows), INSERT_CHUNK):
+        await _upsert_best(db, rows[i:i + INSERT_CHUNK])
+    await db.commit()
+    return scanned
@@ -0,0 +1,75 @@
+"""
+Benchmark app.stats against the list-based code it replaced.
+
+    uv run python bench_stats.py [--scores 1000000]
+"""
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from app import stats
+
+
+def legacy_buckets(scores):
+    scores = sorted(scores)
+    min_s, max_s = scores[0], scores[-1]
+    step = (max_s - min_s) / 10
+    buckets, current = [], min_s
+    for i in range(10):
+        end = current + step
+        count = len([s for s in scores if current <= s < end])
+        if i == 9:
+            count = len([s for s in scores if current <= s])
+        buckets.append({"range": f"{int(current)}-{int(end)}", "count": count})
+        current = end
+    return buckets
+
+
+def legacy_avg_ranks(rows):
+    ranks = {}
+    for row in rows:
+        ranks.setdefault(row.username, []).append(row.game_rank)
+    return {u: round(sum(r) / len(r), 2) for u, r in ranks.items()}
+
+
+def timed(label, fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:8} {elapsed * 1000:10.1f} ms")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scores", type=int, default=1_000_000)
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    scores = [int(rng.expovariate(1 / 500)) for _ in range(args.scores)]
+    print(f"distribution buckets, {len(scores)} scores")
+    old, t_old = timed("lists", legacy_buckets, scores)
+    new, t_new = timed("numpy", lambda: stats.histogram(np.array(scores, dtype=np.int64)))
+    assert old == new
+    print(f"  speed-up {t_old / t_new:.0f}x")
+
+    users = max(args.scores // 20, 1)
+    rows = [SimpleNamespace(username=f"user{rng.randrange(users)}", game_rank=rng.randrange(1, users))
+            for _ in range(args.scores)]
+    print(f"average rank, {len(rows)} (user, mode) rows")
+    old, t_old = timed("lists", legacy_avg_ranks, rows)
+
+    def vectorised():
+        names, positions = stats.codes([r.username for r in rows])
+        means = stats.group_mean(positions, [r.game_rank for r in rows], len(names))
+        return {u: round(float(m), 2) for u, m in zip(names, means)}
+    new, t_new = timed("numpy", vectorised)
+    assert old == new
+    print(f"  speed-up {t_old / t_new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import dataclasses
+from sqlalchemy import create_engine, text
+from app.backfill import run_backfill
+from app.migrations import allow_duplicate_usernames_emails as migration
+
+def test_sqlite_copy_keeps_memberships_changed_between_chunks(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id TEXT PRIMARY KEY, username TEXT, email TEXT)"))
+        conn.execute(text("CREATE TABLE groups (id TEXT PRIMARY KEY, name TEXT)"))
+        conn.execute(text("CREATE TABLE user_groups (user_id TEXT, group_id TEXT, PRIMARY KEY (user_id, group_id))"))
+        conn.execute(text("INSERT INTO groups VALUES ('g1', 'friends'), ('g2', 'rivals')"))
+        for i in range(1, 7):
+            conn.execute(text(f"INSERT INTO users VALUES ('u{i}', 'user{i}', 'user{i}@example.com')"))
+            conn.execute(text(f"INSERT INTO user_groups VALUES ('u{i}', 'g1')"))
+
+    writer = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    writes = iter([
+        # Behind the copy: u1's chunk is done when these land
+        "INSERT INTO user_groups VALUES ('u1', 'g2')",
+        "DELETE FROM user_groups WHERE user_id = 'u2'",
+    ])
+
+    def write_between_chunks(message):
+        statement = next(writes, None)
+        if statement:
+            with writer.begin() as conn:
+                conn.execute(text(statement))
+
+    def small_chunks(conn, job):
+        job = dataclasses.replace(job, chunk_size=2, pause=0)
+        return run_backfill(conn, job, report=write_between_chunks)
+
+    monkeypatch.setattr(migration, "run_backfill", small_chunks)
+    migration.migrate_sqlite(engine)
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT user_id, group_id, username FROM user_groups ORDER BY user_id, group_id")).all()
+        other = conn.execute(text("SELECT id FROM groups WHERE name = 'other'")).scalar()
+    assert ("u1", "g2", "user1") in rows
+    assert ("u2", other, "user2") in rows  # Left without a group, so it lands in 'other'
+    assert ("u2", "g1", "user2") not in rows
+    assert len(rows) == 7
@@ -0,0 +1,39 @@
+from sqlalchemy import create_engine, text
+import pytest
+from app.backfill import Backfill, run_backfill
+
+@pytest.fixture
+def conn():
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, doubled INTEGER)"))
+        conn.execute(text("INSERT INTO items (id) VALUES " + ",".join(f"({i})" for i in range(1, 26))))
+        conn.commit()
+        yield conn
+
+def job(**overrides):
+    return Backfill(**{
+        "name": "double", "table": "items", "key": "id", "start": 0, "chunk_size": 10, "pause": 0,
+        "statement": "UPDATE items SET doubled = id * 2 WHERE id > :lo AND id <= :hi",
+        **overrides,
+    })
+
+def test_backfill_processes_all_rows_in_chunks(conn):
+    progress = []
+    assert run_backfill(conn, job(), report=progress.append) == 25
+    assert conn.execute(text("SELECT COUNT(*) FROM items WHERE doubled = id * 2")).scalar() == 25
+    assert len(progress) == 3  # Chunks of 10, 10, 5
+
+def test_backfill_resumes_from_checkpoint(conn):
+    class Interrupt(Exception):
+        pass
+
+    def stop_after_first_chunk(message):
+        raise Interrupt(message)
+
+    with pytest.raises(Interrupt):
+        run_backfill(conn, job(), report=stop_after_first_chunk)
+    assert conn.execute(text("SELECT COUNT(*) FROM items WHERE doubled IS NOT NULL")).scalar() == 10
+
+    assert run_backfill(conn, job(), report=lambda m: None) == 15
+    assert conn.execute(text("SELECT COUNT(*) FROM items WHERE doubled IS NULL")).scalar() == 0
@@ -0,0 +1,36 @@
+from app.db import alembic_heads, pool_options
+
+def test_alembic_single_head():
+    """Migration scripts form a single chain"""
+    heads = alembic_heads()
+    assert len(heads) == 1
+
+def test_alembic_heads_follow_down_revisions(tmp_path):
+    """A revision that is another one's parent is not a head"""
+    (tmp_path / "a.py").write_text("revision: str = 'aaa'\ndown_revision: Union[str, None] = None\n")
+    (tmp_path / "b.py").write_text("revision: str = 'bbb'\ndown_revision: Union[str, None] = 'aaa'\n")
+    assert alembic_heads(tmp_path) == {"bbb"}
+
+def test_pool_options_sqlite_has_no_pool_sizing():
+    assert pool_options("sqlite+aiosqlite:///./test.db") == {}
+
+def test_recent_write_pins_reads_to_primary():
+    from fastapi import Response
+    from starlette.requests import Request
+    from app.db import mark_recent_write, is_recent_writer, STICKY_HEADER
+
+    response = Response()
+    mark_recent_write(response)
+    token = response.headers[STICKY_HEADER]
+    request = Request({"type": "http", "headers": [(STICKY_HEADER.lower().encode(), token.encode())]})
+    assert is_recent_writer(request)
+
+    expired = Request({"type": "http", "headers": [(STICKY_HEADER.lower().encode(), b"0")]})
+    assert not is_recent_writer(expired)
+
+def test_statement_timeout_applies_to_request_sessions_only():
+    from sqlalchemy import event
+    from app.db import SessionLocal, request_session, _set_request_timeout
+
+    assert event.contains(request_session(SessionLocal()).sync_session, "after_begin", _set_request_timeout)
+    assert not event.contains(SessionLocal().sync_session, "after_begin", _set_request_timeout)
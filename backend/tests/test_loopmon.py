@@ -0,0 +1,24 @@
+import asyncio
+import time
+
+import pytest
+from app import loopmon
+
+@pytest.mark.asyncio
+async def test_blocking_call_is_measured_and_its_stack_captured(monkeypatch):
+    monkeypatch.setattr(loopmon, "LOOP_MONITOR_ENABLED", True)
+    monkeypatch.setattr(loopmon, "LOOP_LAG_INTERVAL", 0.01)
+    monkeypatch.setattr(loopmon, "SLOW_CALLBACK_THRESHOLD", 0.05)
+    ticks, stalls = loopmon.lag.count, loopmon.slow_callbacks.value
+    loopmon.start()
+    try:
+        await asyncio.sleep(0.05)
+        time.sleep(0.3)  # Blocks the loop
+        await asyncio.sleep(0.05)
+    finally:
+        loopmon.stop()
+    assert loopmon.lag.count > ticks
+    assert max(loopmon.samples) >= 0.2
+    assert loopmon.slow_callbacks.value == stalls + 1
+    assert "test_blocking_call_is_measured_and_its_stack_captured" in loopmon.last_stack
+    assert loopmon.lag.collect()["le"]["+Inf"] == loopmon.lag.count
@@ -0,0 +1,38 @@
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from app import offload, stats
+
+@pytest.mark.asyncio
+async def test_small_inputs_run_inline(monkeypatch):
+    monkeypatch.setattr(offload, "OFFLOAD_MIN_ROWS", 100)
+    before = offload.inline.value
+    assert await offload.run(stats.percentiles, [1, 2, 3], size=3) == stats.percentiles([1, 2, 3])
+    assert offload.inline.value == before + 1
+
+@pytest.mark.asyncio
+async def test_large_inputs_run_in_the_pool(monkeypatch):
+    monkeypatch.setattr(offload, "OFFLOAD_MIN_ROWS", 0)
+    monkeypatch.setattr(offload, "OFFLOAD_WORKERS", 1)
+    args = (["ann", "bob", "ann"], ["snake", "snake", "tetris"], stats.as_array([3, 5, 9]), stats.as_array([2, 1, 1]))
+    try:
+        assert await offload.run(stats.overall_rankings, *args, size=3) == stats.overall_rankings(*args)
+    finally:
+        offload.shutdown()
+
+@pytest.mark.asyncio
+async def test_broken_pool_is_replaced(monkeypatch):
+    monkeypatch.setattr(offload, "OFFLOAD_MIN_ROWS", 0)
+    monkeypatch.setattr(offload, "OFFLOAD_WORKERS", 1)
+    pool = offload._get_pool()
+    # A worker process dying breaks the pool for every later call
+    with pytest.raises(BrokenProcessPool):
+        await asyncio.get_running_loop().run_in_executor(pool, os._exit, 1)
+    before = offload.broken.value
+    try:
+        assert await offload.run(stats.percentiles, [1, 2, 3], size=3) == stats.percentiles([1, 2, 3])
+        assert offload.broken.value == before + 1
+        assert offload._pool is not pool
+    finally:
+        offload.shutdown()
@@ -0,0 +1,27 @@
+import pytest
+from app import passwords
+
+@pytest.mark.asyncio
+async def test_hash_round_trip():
+    stored = await passwords.hash_password("s3cret")
+    assert stored.startswith("scrypt$")
+    assert await passwords.verify_password("s3cret", stored)
+    assert not await passwords.verify_password("wrong", stored)
+    assert not passwords.needs_rehash(stored)
+
+@pytest.mark.asyncio
+async def test_legacy_plaintext_verifies_and_needs_rehash():
+    assert await passwords.verify_password("plain", "plain")
+    assert not await passwords.verify_password("other", "plain")
+    assert passwords.needs_rehash("plain")
+
+@pytest.mark.asyncio
+async def test_full_queue_is_refused(monkeypatch):
+    monkeypatch.setattr(passwords, "_pending", passwords.HASH_WORKERS + passwords.HASH_MAX_QUEUE)
+    with pytest.raises(passwords.HashingBusy):
+        await passwords.hash_password("s3cret")
+
+@pytest.mark.asyncio
+async def test_malformed_hashes_do_not_verify():
+    for stored in ("scrypt$hunter2", "scrypt$a$b$c$d$e", "scrypt$16384$8$1$not*b64$AAAA", "scrypt$3$8$1$AAAA$AAAA"):
+        assert not await passwords.verify_password("scrypt$hunter2", stored)
@@ -0,0 +1,43 @@
+import asyncio
+import pytest
+from app import background, main, snapshot
+
+def test_jobs_are_listed_by_the_lifespan(monkeypatch):
+    names = [job.name for job in main.periodic_jobs()]
+    assert {"sync_revocations", "flush_sketches", "roll_over_windows", "snapshot_ranks"} <= set(names)
+    monkeypatch.setattr(snapshot, "SNAPSHOT_ENABLED", False)
+    assert "build_snapshot" not in [job.name for job in main.periodic_jobs()]
+
+def test_only_shared_database_jobs_are_cluster_wide():
+    cluster_wide = {job.name for job in main.periodic_jobs() if job.cluster_wide}
+    assert cluster_wide == {"roll_over_windows", "snapshot_ranks"}  # ensure_partitions is Postgres only
+
+@pytest.mark.asyncio
+async def test_one_worker_leads_until_it_releases(monkeypatch, tmp_path):
+    monkeypatch.setattr(background, "LEADER_LOCK_FILE", tmp_path / "leader")
+    first, second = background.Leader(), background.Leader()
+    assert await first.acquire()
+    assert await first.acquire()
+    assert not await second.acquire()
+    await first.release()
+    assert await second.acquire()
+    await second.release()
+
+@pytest.mark.asyncio
+async def test_cluster_wide_jobs_are_skipped_by_followers(monkeypatch, tmp_path):
+    monkeypatch.setattr(background, "LEADER_LOCK_FILE", tmp_path / "leader")
+    other_worker = background.Leader()
+    assert await other_worker.acquire()
+    runs = []
+
+    async def record():
+        runs.append(1)
+
+    jobs = [background.PeriodicJob("shared", 0.01, record, cluster_wide=True)]
+    async with background.running(jobs):
+        await asyncio.sleep(0.05)
+    assert runs == []
+    await other_worker.release()
+    async with background.running(jobs):
+        await asyncio.sleep(0.05)
+    assert runs
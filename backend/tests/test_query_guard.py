@@ -0,0 +1,19 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from app.query_guard import QueryTimeout, statement_timeout, timed_out
+
+ENDLESS = text("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT count(*) FROM c")
+
+@pytest.mark.asyncio
+async def test_sqlite_statement_is_interrupted_at_timeout():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    before = timed_out.value
+    async with AsyncSession(engine) as db:
+        with pytest.raises(QueryTimeout):
+            async with statement_timeout(db, 0.05):
+                await db.execute(ENDLESS)
+        # The handler is removed afterwards; the session stays usable
+        assert (await db.execute(text("SELECT 1"))).scalar() == 1
+    await engine.dispose()
+    assert timed_out.value == before + 1
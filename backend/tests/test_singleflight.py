@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from app.singleflight import SingleFlight
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight("test_share")
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return ["ranking"]
+
+    results = await asyncio.gather(*(flights.do("key", compute) for _ in range(5)))
+    assert calls == 1
+    assert all(r == ["ranking"] for r in results)
+    assert flights.merged.value == 4
+
+@pytest.mark.asyncio
+async def test_waiter_takes_over_when_leader_is_cancelled():
+    flights = SingleFlight("test_cancel")
+    started = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(10)
+
+    async def fast():
+        return "done"
+
+    leader = asyncio.create_task(flights.do("key", slow))
+    await started.wait()
+    waiter = asyncio.create_task(flights.do("key", fast))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await waiter == "done"
+    assert flights.executions.value == 2
+
+@pytest.mark.asyncio
+async def test_waiters_are_counted_as_merged_once_across_retries():
+    flights = SingleFlight("test_merged_once")
+    started = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(10)
+
+    async def quick():
+        await asyncio.sleep(0.01)
+        return "done"
+
+    leader = asyncio.create_task(flights.do("key", slow))
+    await started.wait()
+    waiters = [asyncio.create_task(flights.do("key", quick)) for _ in range(2)]
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await asyncio.gather(*waiters) == ["done", "done"]
+    # One waiter became the new leader, the other waited on two leaders in turn
+    assert flights.retries.value == 2
+    assert flights.merged.value == 2
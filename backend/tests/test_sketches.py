@@ -0,0 +1,35 @@
+import random
+from app import sketches
+
+def test_quantile_sketch_rank_is_within_relative_accuracy():
+    rng = random.Random(1)
+    scores = [int(rng.expovariate(1 / 1000)) for _ in range(20000)]
+    sketch = sketches.QuantileSketch()
+    for s in scores:
+        sketch.add(s)
+    # Share of scores below each point, against the exact share
+    for point in (100, 700, 2000, 4500):
+        exact_below = sum(s < point for s in scores) / len(scores)
+        assert abs(sketch.rank(point) / sketch.count - exact_below) < 0.01
+
+def test_quantile_sketches_merge_by_addition():
+    a, b = sketches.QuantileSketch(), sketches.QuantileSketch()
+    for s in range(100):
+        (a if s % 2 else b).add(s)
+    merged = a.merge(b)
+    assert merged.count == 100
+    assert merged.rank(0) == 0
+
+def test_distinct_sketch_estimate_and_merge():
+    a, b = sketches.DistinctSketch(), sketches.DistinctSketch()
+    for i in range(30000):
+        a.add(f"user-{i}")
+    for i in range(20000, 50000):
+        b.add(f"user-{i}")
+    assert abs(a.estimate() - 30000) < 30000 * 0.05
+    assert abs(a.merge(b).estimate() - 50000) < 50000 * 0.05
+    small = sketches.DistinctSketch()
+    for i in range(10):
+        small.add(str(i))
+        small.add(str(i))
+    assert small.estimate() == 10
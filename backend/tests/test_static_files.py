@@ -0,0 +1,46 @@
+import gzip
+import pytest
+from fastapi import FastAPI, Request
+from httpx import AsyncClient, ASGITransport
+from app.static_files import StaticIndex, IMMUTABLE_CACHE
+
+def make_client(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "index.html").write_text("<html>app</html>")
+    js = b"console.log('snake');" * 20
+    (tmp_path / "assets" / "index-abc123.js").write_bytes(js)
+    (tmp_path / "assets" / "index-abc123.js.gz").write_bytes(gzip.compress(js))
+
+    index = StaticIndex(tmp_path)
+    app = FastAPI()
+
+    @app.get("/{path:path}")
+    async def serve(request: Request, path: str):
+        return index.serve(request, index.get(path))
+
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test"), js
+
+@pytest.mark.asyncio
+async def test_precompressed_variant_and_immutable_cache(tmp_path):
+    client, js = make_client(tmp_path)
+    resp = await client.get("/assets/index-abc123.js", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["cache-control"] == IMMUTABLE_CACHE
+    assert resp.content == js  # decoded by the client
+
+@pytest.mark.asyncio
+async def test_etag_revalidation(tmp_path):
+    client, _ = make_client(tmp_path)
+    first = await client.get("/index.html", headers={"Accept-Encoding": "identity"})
+    assert first.headers["cache-control"] == "no-cache"
+    second = await client.get("/index.html", headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 304
+
+@pytest.mark.asyncio
+async def test_range_request(tmp_path):
+    client, js = make_client(tmp_path)
+    resp = await client.get("/assets/index-abc123.js", headers={"Accept-Encoding": "identity", "Range": "bytes=0-9"})
+    assert resp.status_code == 206
+    assert resp.content == js[:10]
+    assert resp.headers["content-range"] == f"bytes 0-9/{len(js)}"
@@ -0,0 +1,36 @@
+from datetime import datetime
+import numpy as np
+import pytest
+from app import stats
+
+def test_histogram_buckets_and_labels():
+    buckets = stats.histogram([0, 5, 10, 95, 100])
+    assert len(buckets) == 10
+    assert buckets[0] == {"range": "0-10", "count": 2}
+    assert buckets[1] == {"range": "10-20", "count": 1}
+    # The highest score lands in the last bucket
+    assert buckets[-1] == {"range": "90-100", "count": 2}
+    assert sum(b["count"] for b in buckets) == 5
+
+def test_histogram_edge_cases():
+    assert stats.histogram([]) == []
+    assert stats.histogram([7, 7]) == [{"range": "7", "count": 2}]
+
+def test_percentiles():
+    result = stats.percentiles(range(1, 101))
+    assert result["count"] == 100
+    assert result["mean"] == 50.5
+    assert result["p50"] == pytest.approx(50.5)
+    assert stats.percentiles([]) == {"count": 0}
+
+def test_zscores_per_group():
+    keys, positions = stats.codes(["snake", "snake", "tetris", "tetris", "tetris"])
+    assert keys == ["snake", "tetris"]
+    z = stats.zscores(positions, [10, 20, 5, 5, 5], len(keys))
+    assert z.tolist() == [-1.0, 1.0, 0.0, 0.0, 0.0]
+
+def test_daily_series_and_rolling_sum():
+    labels, counts = stats.daily_series(datetime(2024, 2, 28), 2, {"2024-02-29": 3, "2024-03-01": 1})
+    assert labels == ["2024-02-28", "2024-02-29", "2024-03-01"]
+    assert counts.tolist() == [0, 3, 1]
+    assert stats.rolling_sum(np.array([1, 2, 3, 4]), 2).tolist() == [1, 3, 5, 7]
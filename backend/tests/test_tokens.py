@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+import pytest
+from app import tokens
+
+def make_user():
+    group = SimpleNamespace(id="g1", name="friends")
+    return SimpleNamespace(id="u1", username="alice", email="alice@example.com", groups=[group])
+
+def test_round_trip_carries_user_and_groups():
+    claims = tokens.decode(tokens.issue(make_user()))
+    assert claims["sub"] == "u1"
+    assert claims["username"] == "alice"
+    assert claims["groups"] == [{"id": "g1", "name": "friends"}]
+
+def test_tampered_token_rejected():
+    header, claims, sig = tokens.issue(make_user()).split(".")
+    forged = tokens._b64encode(tokens._b64decode(claims).replace(b"alice", b"mallo"))
+    with pytest.raises(tokens.InvalidToken):
+        tokens.decode(f"{header}.{forged}.{sig}")
+
+def test_expired_token_rejected_but_refreshable_within_grace():
+    token = tokens.issue(make_user(), ttl=-10)
+    with pytest.raises(tokens.TokenExpired):
+        tokens.decode(token)
+    assert tokens.decode(token, leeway=60)["sub"] == "u1"
+
+def test_rotated_keys_still_verify(monkeypatch):
+    old = tokens.issue(make_user())
+    monkeypatch.setitem(tokens.KEYS, "new", b"next-secret")
+    monkeypatch.setattr(tokens, "SIGNING_KID", "new")
+    tokens._verified_claims.cache_clear()
+    new = tokens.issue(make_user())
+    assert tokens.decode(old)["sub"] == tokens.decode(new)["sub"] == "u1"
@@ -0,0 +1,21 @@
+from datetime import date
+
+from app import windows
+
+def test_window_bounds():
+    day = date(2026, 3, 12)  # A Thursday
+    assert windows.window_start("daily", day) == day
+    assert windows.window_start("weekly", day) == date(2026, 3, 9)
+    assert windows.window_end("weekly", date(2026, 3, 9)) == date(2026, 3, 16)
+    start = windows.window_start("season", day)
+    assert (start - windows.SEASON_EPOCH).days % windows.SEASON_DAYS == 0
+    assert start <= day < windows.window_end("season", start)
+
+def test_ranks_restart_per_mode_and_group():
+    class Row:
+        def __init__(self, mode, group, user, score):
+            self.period, self.window_start, self.game_mode, self.group_id = "daily", date(2026, 3, 9), mode, group
+            self.user_id = self.username = user
+            self.best_score = score
+    rows = [Row("snake", "*", "a", 9), Row("snake", "*", "b", 9), Row("snake", "*", "c", 3), Row("tetris", "*", "a", 1)]
+    assert [r["rank"] for r in windows._ranked(rows)] == [1, 1, 3, 1]
@@ -4,7 +4,8 @@ from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.main import app
-from app.db import Base, get_db
+from app.db import Base, get_db, get_read_db
+from app import ratelimit, sketches, swr
 from typing import AsyncGenerator
 
 # Use in-memory SQLite for tests
@@ -29,9 +30,18 @@ async def override_get_db() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
+swr.session_factory = TestingSessionLocal
 
 @pytest_asyncio.fixture(scope="function", autouse=True)
 async def db_session():
+    # Cached endpoint results must not leak between tests
+    swr.cache.clear()
+    sketches.store.clear()
+    # Tests post scores in tight loops; test_ratelimit turns the limiter back on
+    ratelimit.limiter.enabled = False
+    ratelimit.limiter.backend.reset()
+
     # Create tables
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
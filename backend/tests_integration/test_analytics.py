@@ -0,0 +1,62 @@
+import pytest
+from app import analytics
+
+async def play(client, username, scores):
+    resp = await client.post("/auth/signup", json={
+        "username": username, "email": f"{username}@example.com", "password": "pw"
+    })
+    headers = {"Authorization": f"Bearer {resp.json()['token']}"}
+    for mode, score in scores:
+        await client.post("/leaderboard", json={"score": score, "gameMode": mode}, headers=headers)
+
+@pytest.fixture
+def no_snapshot(monkeypatch, tmp_path):
+    monkeypatch.setattr(analytics, "ANALYTICS_DIR", tmp_path)
+    monkeypatch.setattr(analytics, "_current", None)
+
+@pytest.mark.asyncio
+async def test_fetch_columns_reads_tables_column_wise(db_session, client, no_snapshot):
+    await play(client, "ann", [("snake", 3), ("tetris", 5)])
+    tables = await analytics.fetch_columns(db_session)
+    assert sorted(tables["leaderboard"]["score"]) == [3, 5]
+    assert sorted(tables["leaderboard"]["game_mode"]) == ["snake", "tetris"]
+    assert tables["archived_score_counts"]["games"] == []
+
+@pytest.mark.asyncio
+async def test_reports_match_the_database(db_session, client, no_snapshot, monkeypatch):
+    await play(client, "ann", [("snake", 3), ("snake", 9), ("tetris", 5)])
+    await play(client, "bob", [("snake", 4), ("tetris", 8), ("tetris", 1)])
+    urls = [
+        "/leaderboard/stats/distribution?gameMode=snake",
+        "/leaderboard/stats/activity/by-user?days=7",
+        "/leaderboard/rankings/overall",
+    ]
+    # Fresh client: the signups above pinned reads to the database
+    client.cookies.clear()
+    expected = [(await client.get(url)).json() for url in urls]
+
+    monkeypatch.setattr(analytics, "ENABLED", True)
+    assert await analytics.refresh(db_session)
+    for url, want in zip(urls, expected):
+        resp = await client.get(url)
+        assert resp.headers["X-Data-Source"] == "analytics"
+        assert "X-Data-As-Of" in resp.headers
+        assert resp.json() == want
+
+@pytest.mark.asyncio
+async def test_workers_share_one_file(db_session, client, no_snapshot, monkeypatch):
+    await play(client, "ann", [("snake", 3)])
+    assert await analytics.refresh(db_session)
+    first = analytics.current()
+    # A fresh file is not rebuilt by the next worker to run the job
+    assert not await analytics.refresh(db_session)
+    assert analytics.current() is first
+
+    # Another worker process opens the same file
+    monkeypatch.setattr(analytics, "_current", None)
+    assert analytics.current().scores == 1
+    # A forced rebuild swaps in a new file; readers reopen it
+    await play(client, "bob", [("snake", 4)])
+    assert await analytics.refresh(db_session, force=True)
+    assert analytics.current().scores == 2
+    assert len(list(analytics.ANALYTICS_DIR.glob("analytics-*.duckdb"))) == 1
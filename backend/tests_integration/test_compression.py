@@ -0,0 +1,42 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+
+@pytest_asyncio.fixture
+async def scores(client: AsyncClient):
+    resp = await client.post("/auth/signup", json={
+        "username": "compressor",
+        "email": "compressor@example.com",
+        "password": "password",
+        "new_group_name": "squeezers"
+    })
+    headers = {"Authorization": f"Bearer {resp.json()['token']}"}
+    for score in range(30):
+        await client.post("/leaderboard", json={"score": score, "gameMode": "snake"}, headers=headers)
+
+@pytest.mark.asyncio
+async def test_large_json_is_gzipped(client: AsyncClient, scores):
+    resp = await client.get("/leaderboard/rankings/all-scores", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert len(resp.json()) == 30
+
+@pytest.mark.asyncio
+async def test_small_json_is_not_compressed(client: AsyncClient):
+    resp = await client.get("/auth/groups", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in resp.headers
+    assert "Accept-Encoding" in resp.headers["vary"]
+
+@pytest.mark.asyncio
+async def test_plain_responses_vary_on_accept_encoding(client: AsyncClient, scores):
+    resp = await client.get("/leaderboard/rankings/all-scores", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in resp.headers
+    assert "Accept-Encoding" in resp.headers["vary"]
+
+@pytest.mark.asyncio
+async def test_compact_shape_dedupes_groups(client: AsyncClient, scores):
+    resp = await client.get("/leaderboard/rankings/all-scores?compact=true")
+    data = resp.json()
+    assert data["groups"] == [{"id": data["groups"][0]["id"], "name": "squeezers"}]
+    assert all(row["groups"] == [0] for row in data["rows"])
+    assert "etag" in resp.headers
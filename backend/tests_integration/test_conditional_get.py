@@ -0,0 +1,55 @@
+import pytest
+from httpx import AsyncClient
+
+async def signup(client: AsyncClient, username: str) -> dict:
+    resp = await client.post("/auth/signup", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": "password"
+    })
+    return {"Authorization": f"Bearer {resp.json()['token']}"}
+
+@pytest.mark.asyncio
+async def test_unchanged_leaderboard_returns_304(client: AsyncClient):
+    headers = await signup(client, "poller")
+    await client.post("/leaderboard", json={"score": 100, "gameMode": "snake"}, headers=headers)
+
+    first = await client.get("/leaderboard/rankings/best-per-user?gameMode=snake")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    again = await client.get("/leaderboard/rankings/best-per-user?gameMode=snake", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+
+@pytest.mark.asyncio
+async def test_score_submission_changes_etag(client: AsyncClient):
+    headers = await signup(client, "climber")
+    await client.post("/leaderboard", json={"score": 100, "gameMode": "tetris"}, headers=headers)
+    etag = (await client.get("/leaderboard/rankings/top-n")).headers["etag"]
+
+    await client.post("/leaderboard", json={"score": 900, "gameMode": "tetris"}, headers=headers)
+    resp = await client.get("/leaderboard/rankings/top-n", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["etag"] != etag
+    assert resp.json()["tetris"][0]["best_score"] == 900
+
+@pytest.mark.asyncio
+async def test_etag_depends_on_query_parameters(client: AsyncClient):
+    snake = await client.get("/leaderboard/rankings/all-scores?gameMode=snake")
+    tetris = await client.get("/leaderboard/rankings/all-scores?gameMode=tetris")
+    assert snake.headers["etag"] != tetris.headers["etag"]
+
+@pytest.mark.asyncio
+async def test_joining_a_group_changes_its_etag(client: AsyncClient):
+    resp = await client.post("/auth/signup", json={
+        "username": "founder", "email": "founder@example.com", "password": "password", "new_group_name": "club"
+    })
+    group_id = resp.json()["user"]["groups"][0]["id"]
+    url = f"/leaderboard/rankings/best-per-user?gameMode=snake&group_id={group_id}"
+    etag = (await client.get(url)).headers["etag"]
+
+    await client.post("/auth/signup", json={
+        "username": "joiner", "email": "joiner@example.com", "password": "password", "group_ids": [group_id]
+    })
+    assert (await client.get(url, headers={"If-None-Match": etag})).status_code == 200
@@ -81,3 +81,24 @@ async def test_email_uniqueness_per_group(client):
     resp3 = await client.post("/auth/signup", json=payload3)
     assert resp3.status_code == 400
     assert "already exists in one of the selected groups" in resp3.json().get("detail", "")
+
+
+@pytest.mark.asyncio
+async def test_bulk_signup_from_csv(client):
+    resp = await client.post("/auth/signup", json={
+        "username": "coach", "email": "coach@example.com", "password": "pass", "new_group_name": "team"
+    })
+    coach = resp.json()
+    headers = {"Authorization": f"Bearer {coach['token']}"}
+    team_id = coach["user"]["groups"][0]["id"]
+
+    csv_body = "username,email,password\nann,ann@example.com,pw1\nbob,bob@example.com,pw2\n"
+    resp = await client.post(f"/auth/signup/bulk?group_id={team_id}", content=csv_body, headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["created"] == 2
+    login = await client.post("/auth/login", json={"email": "bob@example.com", "password": "pw2"})
+    assert login.json()["user"]["groups"] == [{"id": team_id, "name": "team"}]
+
+    # Same usernames again: the whole import is rejected
+    resp = await client.post(f"/auth/signup/bulk?group_id={team_id}", content=csv_body, headers=headers)
+    assert resp.status_code == 400
@@ -1,5 +1,8 @@
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import select
+from app.sql_models import User as DBUser
+from app import tokens
 
 @pytest.mark.asyncio
 async def test_signup_login_flow(client: AsyncClient):
@@ -33,6 +36,59 @@ async def test_signup_login_flow(client: AsyncClient):
     assert response.status_code == 200
     assert response.json()["email"] == "integration@example.com"
 
+@pytest.mark.asyncio
+async def test_legacy_plaintext_password_rehashed_on_login(client: AsyncClient, db_session):
+    db_session.add(DBUser(username="legacy", email="legacy@example.com", hashed_password="oldpass"))
+    await db_session.commit()
+
+    response = await client.post("/auth/login", json={"email": "legacy@example.com", "password": "oldpass"})
+    assert response.status_code == 200
+    stored = (await db_session.execute(
+        select(DBUser.hashed_password).where(DBUser.email == "legacy@example.com")
+    )).scalar_one()
+    assert stored.startswith("scrypt$")
+    response = await client.post("/auth/login", json={"email": "legacy@example.com", "password": "oldpass"})
+    assert response.status_code == 200
+
+@pytest.mark.asyncio
+async def test_token_refresh_and_logout(client: AsyncClient):
+    response = await client.post("/auth/signup", json={
+        "username": "token_user",
+        "email": "token@example.com",
+        "password": "securepassword"
+    })
+    old = {"Authorization": f"Bearer {response.json()['token']}"}
+
+    # Refresh issues a new token and retires the old one
+    response = await client.post("/auth/refresh", headers=old)
+    assert response.status_code == 200
+    new = {"Authorization": f"Bearer {response.json()['token']}"}
+    assert (await client.get("/auth/me", headers=old)).status_code == 401
+    assert (await client.get("/auth/me", headers=new)).status_code == 200
+
+    await client.post("/auth/logout", headers=new)
+    assert (await client.get("/auth/me", headers=new)).status_code == 401
+
+@pytest.mark.asyncio
+async def test_revocations_shared_through_database(client: AsyncClient, db_session):
+    response = await client.post("/auth/signup", json={
+        "username": "roaming_user",
+        "email": "roaming@example.com",
+        "password": "securepassword"
+    })
+    old = {"Authorization": f"Bearer {response.json()['token']}"}
+    assert (await client.post("/auth/refresh", headers=old)).status_code == 200
+
+    # Another worker has never seen the revocation: refresh still checks the table
+    tokens.revocations.clear()
+    assert (await client.get("/auth/me", headers=old)).status_code == 200
+    assert (await client.post("/auth/refresh", headers=old)).status_code == 401
+
+    # ...and its periodic sync picks the revocation up for plain requests too
+    tokens.revocations.clear()
+    await tokens.sync_revocations(db_session)
+    assert (await client.get("/auth/me", headers=old)).status_code == 401
+
 @pytest.mark.asyncio
 async def test_leaderboard_flow(client: AsyncClient):
     # 1. Signup user
@@ -66,3 +122,34 @@ async def test_leaderboard_flow(client: AsyncClient):
     data = response.json()
     assert isinstance(data, list)
 
+
+@pytest.mark.asyncio
+async def test_activity_trends_count_todays_games(client: AsyncClient):
+    resp = await client.post("/auth/signup", json={
+        "username": "active", "email": "active@example.com", "password": "pw"
+    })
+    headers = {"Authorization": f"Bearer {resp.json()['token']}"}
+    for score in (1, 2):
+        await client.post("/leaderboard", json={"score": score, "gameMode": "snake"}, headers=headers)
+
+    days = (await client.get("/leaderboard/stats/activity?days=7")).json()
+    assert len(days) == 8
+    assert days[-1]["games"] == 2
+    by_mode = (await client.get("/leaderboard/stats/activity/by-mode?days=7")).json()
+    assert [d["date"] for d in by_mode] == [d["date"] for d in days]
+    assert by_mode[-1]["snake"] == 2
+    assert by_mode[0]["snake"] == by_mode[-1]["tetris"] == 0
+
+@pytest.mark.asyncio
+async def test_overall_rankings_normalized_and_rolling_activity(client: AsyncClient):
+    for name, score in (("norm1", 10), ("norm2", 30)):
+        resp = await client.post("/auth/signup", json={
+            "username": name, "email": f"{name}@example.com", "password": "pw"
+        })
+        headers = {"Authorization": f"Bearer {resp.json()['token']}"}
+        await client.post("/leaderboard", json={"score": score, "gameMode": "snake"}, headers=headers)
+
+    ranked = (await client.get("/leaderboard/rankings/overall?normalize=true")).json()
+    assert [(r["username"], r["avg_zscore"]) for r in ranked] == [("norm2", 1.0), ("norm1", -1.0)]
+    days = (await client.get("/leaderboard/stats/activity?days=3&rolling=2")).json()
+    assert days[-1]["rolling"] == 2
@@ -0,0 +1,158 @@
+import argparse
+import time
+from datetime import datetime, timezone
+import pytest
+from sqlalchemy import select, func
+from app import maintenance
+from app.sql_models import User, Group, user_groups
+
+def args(**overrides):
+    return argparse.Namespace(**{"dry_run": False, "batch_size": 2, "pause": 0.0, **overrides})
+
+async def groupless(db, n):
+    db.add_all([User(username=f"u{i}", email=f"u{i}@example.com", hashed_password="x") for i in range(n)])
+    # Collides with u0 inside the 'other' group; only one of the two can join
+    db.add(User(username="u0", email="dup@example.com", hashed_password="x"))
+    await db.commit()
+
+async def memberships(db):
+    return (await db.execute(select(func.count()).select_from(user_groups))).scalar()
+
+@pytest.mark.asyncio
+async def test_dry_run_changes_nothing(db_session):
+    await groupless(db_session, 3)
+    await maintenance.init_groups(db_session, args(dry_run=True))
+    assert await memberships(db_session) == 0
+    assert (await db_session.execute(select(Group))).first() is None
+
+@pytest.mark.asyncio
+async def test_init_groups_assigns_in_batches(db_session):
+    await groupless(db_session, 5)
+    await maintenance.init_groups(db_session, args())
+    assert await memberships(db_session) == 5
+    # Idempotent
+    await maintenance.init_groups(db_session, args())
+    assert await memberships(db_session) == 5
+
+@pytest.mark.asyncio
+async def test_init_groups_resolves_chained_collisions(db_session):
+    # a collides with b by username, b with c by email; a and c can both join
+    db_session.add_all([
+        User(id="1", username="a", email="a@example.com", hashed_password="x"),
+        User(id="2", username="a", email="c@example.com", hashed_password="x"),
+        User(id="3", username="c", email="c@example.com", hashed_password="x"),
+    ])
+    await db_session.commit()
+    await maintenance.init_groups(db_session, args())
+    assigned = (await db_session.execute(select(user_groups.c.user_id))).scalars().all()
+    assert sorted(assigned) == ["1", "3"]
+
+@pytest.mark.asyncio
+async def test_archive_dry_run_counts_only_beaten_old_scores(db_session):
+    from datetime import datetime, timedelta
+    from app import archive
+    from app.sql_models import LeaderboardEntry
+    old = datetime.now() - timedelta(days=archive.ARCHIVE_RETENTION_DAYS + 1)
+    db_session.add_all([
+        LeaderboardEntry(username="ann", score=score, game_mode="snake", timestamp=ts)
+        for score, ts in ((10, old), (5, old), (5, old), (1, datetime.now()))
+    ])
+    await db_session.commit()
+    # Both old 5s are beaten by ann's 10; the best and the recent score stay
+    assert await archive.archive_cold_scores(db_session, dry_run=True, report=lambda _: None) == 2
+
+@pytest.mark.asyncio
+async def test_archive_compares_scores_per_user_not_username(db_session):
+    from datetime import datetime, timedelta
+    from app import archive
+    from app.sql_models import LeaderboardEntry
+    old = datetime.now() - timedelta(days=archive.ARCHIVE_RETENTION_DAYS + 1)
+    # Two accounts named "sam" in different groups
+    first, second = User(username="sam", email="sam1@example.com"), User(username="sam", email="sam2@example.com")
+    db_session.add_all([first, second])
+    await db_session.flush()
+    db_session.add_all([
+        LeaderboardEntry(username="sam", user_id=first.id, score=50, game_mode="snake", timestamp=old),
+        LeaderboardEntry(username="sam", user_id=second.id, score=7, game_mode="snake", timestamp=old),
+    ])
+    await db_session.commit()
+    # Each row is its own player's best, so nothing is archivable
+    assert await archive.archive_cold_scores(db_session, dry_run=True, report=lambda _: None) == 0
+
+@pytest.mark.asyncio
+async def test_archived_counts_are_included_in_stats(db_session, client):
+    from datetime import date
+    from app.sql_models import ArchivedScoreCount
+    signup = await client.post("/auth/signup", json={"username": "ann", "email": "ann@example.com", "password": "pw"})
+    headers = {"Authorization": f"Bearer {signup.json()['token']}"}
+    await client.post("/leaderboard", json={"score": 7, "gameMode": "snake"}, headers=headers)
+    db_session.add(ArchivedScoreCount(day=date(2020, 1, 1), game_mode="tetris", user_id=signup.json()["user"]["id"],
+                                      username="ann", games=4))
+    db_session.add(ArchivedScoreCount(day=date(2020, 1, 1), game_mode="snake", user_id=signup.json()["user"]["id"],
+                                      username="ann", games=2))
+    await db_session.commit()
+
+    summary = (await client.get("/leaderboard/stats/summary")).json()
+    assert summary["total_games"] == 7
+    assert summary["popular_mode"] == "tetris"
+    best = (await client.get("/leaderboard/rankings/best-per-user?gameMode=snake")).json()
+    assert best[0]["games_played"] == 3
+
+@pytest.mark.asyncio
+async def test_percentile_sketch_is_merged_through_the_database(db_session, client, monkeypatch):
+    from app import sketches
+    signup = await client.post("/auth/signup", json={"username": "ann", "email": "ann@example.com", "password": "pw"})
+    headers = {"Authorization": f"Bearer {signup.json()['token']}"}
+    for score in range(1, 101):
+        await client.post("/leaderboard", json={"score": score, "gameMode": "snake"}, headers=headers)
+
+    resp = (await client.get("/leaderboard/stats/percentile?gameMode=snake&score=91")).json()
+    assert resp["count"] == 100
+    assert abs(resp["top_percent"] - 10) <= 1
+
+    # After a flush another worker (a fresh store) sees the same sketch
+    await sketches.store.flush(db_session)
+    quantiles, players = await sketches.SketchStore().get(db_session, "snake")
+    assert quantiles.count == 100
+    assert players.estimate() == 1
+
+    # Rebuilding from the table gives the same counts
+    await sketches.rebuild(db_session, report=lambda _: None, grace=0)
+    assert (await sketches.SketchStore().get(db_session, "snake"))[0].counts == quantiles.counts
+
+    # Large tables count players with the sketch
+    monkeypatch.setattr(sketches, "SKETCH_EXACT_LIMIT", 0)
+    assert (await client.get("/leaderboard/stats/summary")).json()["total_players"] == 1
+
+@pytest.mark.asyncio
+async def test_flushes_during_a_sketch_rebuild_do_not_double_count(db_session, client):
+    from app import sketches
+    signup = await client.post("/auth/signup", json={"username": "bea", "email": "bea@example.com", "password": "pw"})
+    headers = {"Authorization": f"Bearer {signup.json()['token']}"}
+    for score in range(1, 11):
+        await client.post("/leaderboard", json={"score": score, "gameMode": "snake"}, headers=headers)
+    # The app's store is one worker holding ten unflushed scores; another worker took one more
+    from app.sql_models import LeaderboardEntry
+    db_session.add(LeaderboardEntry(username="cal", score=7, game_mode="snake", timestamp=datetime.now(timezone.utc)))
+    await db_session.commit()
+    other_worker = sketches.SketchStore()
+    other_worker.observe("snake", [], None, 7, at=time.time())
+
+    # While another process rebuilds, workers hold their deltas
+    await sketches._set_rebuild_state(db_session, time.time() + 60, done=False)
+    await db_session.commit()
+    assert await sketches.store.flush(db_session) == 0
+
+    # The rebuild (as the CLI would run it) counts the eleven scores from the table. Each worker
+    # drops its deltas from before the cutoff when it next flushes
+    await sketches.rebuild(db_session, report=lambda _: None, grace=0)
+    await sketches.store.flush(db_session)
+    await other_worker.flush(db_session)
+    assert (await sketches.SketchStore().get(db_session, "snake"))[0].count == 11
+
+    # Scores after the cutoff are flushed as usual, by any worker
+    await client.post("/leaderboard", json={"score": 50, "gameMode": "snake"}, headers=headers)
+    other_worker.observe("snake", [], None, 8)
+    await sketches.store.flush(db_session)
+    await other_worker.flush(db_session)
+    assert (await sketches.SketchStore().get(db_session, "snake"))[0].count == 13
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, select
+from app import rankhistory
+from app.sql_models import RankHistory
+
+async def play(client, username, scores, **groups):
+    resp = await client.post("/auth/signup", json={
+        "username": username, "email": f"{username}@example.com", "password": "pw", **groups
+    })
+    body = resp.json()
+    headers = {"Authorization": f"Bearer {body['token']}"}
+    for score in scores:
+        await client.post("/leaderboard", json={"score": score, "gameMode": "snake"}, headers=headers)
+    return body["user"]["id"], headers
+
+@pytest.mark.asyncio
+async def test_only_changed_ranks_are_stored(db_session, client):
+    start = datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+    ann, ann_headers = await play(client, "ann", [50])
+    bob, _ = await play(client, "bob", [30])
+    first = await rankhistory.take(db_session, now=start)
+    assert first > 0
+    # Nothing changed: nothing written
+    assert await rankhistory.take(db_session, now=start + timedelta(hours=1)) == 0
+
+    cid, _ = await play(client, "cid", [40])  # Pushes bob to third
+    await rankhistory.take(db_session, now=start + timedelta(hours=2))
+    await client.post("/leaderboard", json={"score": 45, "gameMode": "snake"}, headers=ann_headers)  # Not a new best
+    assert await rankhistory.take(db_session, now=start + timedelta(hours=3)) == 0
+
+    resp = await client.get(f"/leaderboard/rankings/history/{bob}?gameMode=snake")
+    assert resp.json()["series"]["snake"] == [
+        {"at": start.isoformat(), "rank": 2, "best_score": 30},
+        {"at": (start + timedelta(hours=2)).isoformat(), "rank": 3, "best_score": 30},
+    ]
+    assert len((await client.get(f"/leaderboard/rankings/history/{ann}")).json()["series"]["snake"]) == 1
+    since = (start + timedelta(hours=1)).isoformat().replace("+", "%2B")
+    assert (await client.get(f"/leaderboard/rankings/history/{ann}?since={since}")).json()["series"] == {}
+
+    rows = (await db_session.execute(
+        select(func.count()).select_from(RankHistory).where(RankHistory.group_id == "*")
+    )).scalar_one()
+    assert rows == 4  # ann, bob, then cid and bob again
+
+def test_snapshot_time_is_aligned_to_the_interval(monkeypatch):
+    monkeypatch.setattr(rankhistory, "RANK_SNAPSHOT_INTERVAL", 3600)
+    assert rankhistory.snapshot_time(datetime(2026, 3, 1, 12, 59, tzinfo=timezone.utc)) == datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+
+@pytest.mark.asyncio
+async def test_dropping_out_closes_the_history(db_session, client):
+    from app.sql_models import LeaderboardEntry
+    start = datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+    ann, _ = await play(client, "ann", [50])
+    await rankhistory.take(db_session, now=start)
+    # Archived: ann has no scores left in the leaderboard table
+    await db_session.execute(LeaderboardEntry.__table__.delete().where(LeaderboardEntry.user_id == ann))
+    await db_session.commit()
+    assert await rankhistory.take(db_session, now=start + timedelta(hours=1)) > 0
+    # Closed once: later snapshots write nothing more for ann
+    assert await rankhistory.take(db_session, now=start + timedelta(hours=2)) == 0
+
+    series = (await rankhistory.history(db_session, ann, "snake"))["series"]["snake"]
+    assert series == [
+        {"at": start.isoformat(), "rank": 1, "best_score": 50},
+        {"at": (start + timedelta(hours=1)).isoformat(), "rank": None, "best_score": None},
+    ]
+
+@pytest.mark.asyncio
+async def test_naive_since_is_utc(db_session, client):
+    start = datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+    ann, _ = await play(client, "ann", [50])
+    await rankhistory.take(db_session, now=start)
+    naive = start.replace(tzinfo=None)
+    assert (await rankhistory.history(db_session, ann, since=naive))["series"]["snake"]
+    assert (await rankhistory.history(db_session, ann, since=naive + timedelta(seconds=1)))["series"] == {}
+    # The same instant in another zone
+    plus_two = start.astimezone(timezone(timedelta(hours=2)))
+    assert (await rankhistory.history(db_session, ann, since=plus_two))["series"]["snake"]
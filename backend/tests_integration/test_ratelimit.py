@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+from httpx import AsyncClient, ASGITransport
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from app import ratelimit, tokens
+from app.models import User
+
+@pytest.fixture
+def limiter_on():
+    ratelimit.limiter.enabled = True
+    yield
+    ratelimit.limiter.enabled = False
+
+@pytest.mark.asyncio
+async def test_score_submissions_limited_per_user(client: AsyncClient, limiter_on):
+    resp = await client.post("/auth/signup", json={
+        "username": "spammer", "email": "spammer@example.com", "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {resp.json()['token']}"}
+    statuses = []
+    for _ in range(int(ratelimit.WRITE_BUDGET.burst) + 1):
+        r = await client.post("/leaderboard", json={"score": 1, "gameMode": "snake"}, headers=headers)
+        statuses.append(r.status_code)
+    assert statuses[:-1] == [200] * (len(statuses) - 1)
+    assert statuses[-1] == 429
+    assert int(r.headers["retry-after"]) >= 1
+
+@pytest.mark.asyncio
+async def test_admission_sheds_load_when_queue_full():
+    release = asyncio.Event()
+
+    async def slow_app(scope, receive, send):
+        await release.wait()
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    app = ratelimit.AdmissionMiddleware(slow_app, max_in_flight=1, max_queue=0, queue_timeout=0.05)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as c:
+        first = asyncio.create_task(c.get("/api/leaderboard"))
+        await asyncio.sleep(0.01)
+        shed = await c.get("/api/leaderboard")
+        release.set()
+        assert (await first).status_code == 200
+    assert shed.status_code == 503
+    assert shed.headers["retry-after"] == "1"
+
+@pytest.mark.asyncio
+async def test_heavy_reads_charged_per_ip_and_per_user(client: AsyncClient, limiter_on):
+    resp = await client.post("/auth/signup", json={
+        "username": "reader", "email": "reader@example.com", "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {resp.json()['token']}"}
+    for _ in range(int(ratelimit.HEAVY_READ_BUDGET.burst)):
+        assert (await client.get("/leaderboard/rankings/all-scores")).status_code == 200
+    # Signing in does not buy a fresh budget from the same address
+    assert (await client.get("/leaderboard/rankings/all-scores", headers=headers)).status_code == 429
+
+def test_revoked_tokens_get_no_user_bucket():
+    user = User(id="u1", username="ann", email="ann@example.com", groups=[])
+    token = tokens.issue(user)
+    request = Request({"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())],
+                       "client": ("10.0.0.1", 1234)})
+    try:
+        assert ratelimit._caller_keys(request) == ["ip:10.0.0.1", "user:u1"]
+        tokens.revocations.revoke(tokens.decode(token))
+        assert ratelimit._caller_keys(request) == ["ip:10.0.0.1"]
+    finally:
+        tokens.revocations.clear()
+
+def test_bucket_backend_is_abstract():
+    with pytest.raises(TypeError):
+        ratelimit.BucketBackend()
+
+def test_admission_sits_inside_cors():
+    from fastapi.middleware.cors import CORSMiddleware
+    from app.main import app
+    # user_middleware is ordered outermost first
+    order = [m.cls for m in app.user_middleware]
+    assert order.index(CORSMiddleware) < order.index(ratelimit.AdmissionMiddleware)
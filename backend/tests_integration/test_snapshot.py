@@ -0,0 +1,70 @@
+import pytest
+from app import snapshot
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DIR", tmp_path)
+    monkeypatch.setattr(snapshot, "_current", None)
+    return tmp_path
+
+async def play(client, username, scores, **groups):
+    resp = await client.post("/auth/signup", json={
+        "username": username, "email": f"{username}@example.com", "password": "pw", **groups
+    })
+    headers = {"Authorization": f"Bearer {resp.json()['token']}"}
+    for score in scores:
+        await client.post("/leaderboard", json={"score": score, "gameMode": "snake"}, headers=headers)
+    return (await client.get("/auth/me", headers=headers)).json()["id"]
+
+@pytest.mark.asyncio
+async def test_snapshot_pages_and_ranks(db_session, client):
+    assert (await client.get("/leaderboard/rankings/snapshot?gameMode=snake")).status_code == 503
+    ann = await play(client, "ann", [5, 40])
+    bob = await play(client, "bob", [40], new_group_name="team")
+    cid = await play(client, "cid", [10])
+
+    assert await snapshot.build(db_session)
+    assert not await snapshot.build(db_session)  # Nothing changed
+
+    resp = await client.get("/leaderboard/rankings/snapshot?gameMode=snake&limit=2")
+    assert resp.headers["X-Snapshot-Version"]
+    body = resp.json()
+    assert body["total"] == 3
+    assert body["entries"] == [
+        {"rank": 1, "user_id": ann, "username": "ann", "best_score": 40},
+        {"rank": 1, "user_id": bob, "username": "bob", "best_score": 40},
+    ]
+    page2 = (await client.get("/leaderboard/rankings/snapshot?gameMode=snake&offset=2")).json()
+    assert page2["entries"] == [{"rank": 3, "user_id": cid, "username": "cid", "best_score": 10}]
+
+    rank = (await client.get(f"/leaderboard/rankings/snapshot/rank?gameMode=snake&user_id={cid}")).json()
+    assert rank == {"rank": 3, "user_id": cid, "username": "cid", "best_score": 10, "players": 3}
+    assert (await client.get("/leaderboard/rankings/snapshot/rank?gameMode=snake&user_id=zed")).status_code == 404
+    assert (await client.get(f"/leaderboard/rankings/snapshot/rank?gameMode=tetris&user_id={cid}")).status_code == 404
+
+    team = (await client.get("/auth/groups")).json()
+    team_id = next(g["id"] for g in team if g["name"] == "team")
+    in_team = (await client.get(f"/leaderboard/rankings/snapshot?gameMode=snake&group_id={team_id}")).json()
+    assert [e["username"] for e in in_team["entries"]] == ["bob"]
+
+@pytest.mark.asyncio
+async def test_new_snapshot_is_swapped_in(db_session, client):
+    await play(client, "ann", [5])
+    await snapshot.build(db_session)
+    first = snapshot.current()
+    await play(client, "bob", [50])
+    assert await snapshot.build(db_session)
+    second = snapshot.current()
+    assert second.version > first.version
+    assert second.page("snake")[0]["username"] == "bob"
+    # The old mapping stays readable for requests still holding it
+    assert first.page("snake")[0]["username"] == "ann"
+
+@pytest.mark.asyncio
+async def test_players_sharing_a_username_are_ranked_separately(db_session, client):
+    first = await play(client, "ann", [30])
+    second = await play(client, "ann", [20], new_group_name="elsewhere")
+    await snapshot.build(db_session)
+    snap = snapshot.current()
+    assert [(e["user_id"], e["best_score"]) for e in snap.page("snake")] == [(first, 30), (second, 20)]
+    assert snap.rank_of("snake", second) == {"rank": 2, "user_id": second, "username": "ann", "best_score": 20, "players": 2}
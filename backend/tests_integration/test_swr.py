@@ -0,0 +1,59 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.exc import OperationalError
+from app import swr
+from app.endpoints import ENDPOINTS
+
+async def submit(client: AsyncClient, score: int):
+    resp = await client.post("/auth/signup", json={
+        "username": f"swr{score}",
+        "email": f"swr{score}@example.com",
+        "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {resp.json()['token']}"}
+    await client.post("/leaderboard", json={"score": score, "gameMode": "snake"}, headers=headers)
+    client.cookies.clear()  # Drop the read-your-writes pin
+
+def age_all_entries(seconds: float):
+    for entry in swr.cache._entries.values():
+        entry.stored_at -= seconds
+
+@pytest.mark.asyncio
+async def test_fresh_entry_is_served_from_cache(client: AsyncClient):
+    await submit(client, 10)
+    first = await client.get("/leaderboard/rankings/top-n")
+    hits = swr.fresh_hits.value
+    second = await client.get("/leaderboard/rankings/top-n")
+    assert second.json() == first.json()
+    assert swr.fresh_hits.value == hits + 1
+
+@pytest.mark.asyncio
+async def test_last_good_value_served_when_db_fails(client: AsyncClient, monkeypatch):
+    await submit(client, 20)
+    good = await client.get("/leaderboard/rankings/top-n")
+    age_all_entries(ENDPOINTS["get_top_n_per_mode"].hard + 1)
+
+    async def broken(*args, **kwargs):
+        raise OperationalError("SELECT", {}, Exception("database is down"))
+    monkeypatch.setattr(swr, "read_version", broken)
+
+    resp = await client.get("/leaderboard/rankings/top-n")
+    assert resp.status_code == 200
+    assert resp.headers["x-data-stale"] == "true"
+    assert resp.json() == good.json()
+
+@pytest.mark.asyncio
+async def test_recent_writer_bypasses_cache(client: AsyncClient):
+    await submit(client, 30)
+    await client.get("/leaderboard/rankings/top-n")
+    resp = await client.post("/auth/signup", json={
+        "username": "writer", "email": "writer@example.com", "password": "password"
+    })
+    headers = {"Authorization": f"Bearer {resp.json()['token']}"}
+    await client.post("/leaderboard", json={"score": 99, "gameMode": "snake"}, headers=headers)
+    top = (await client.get("/leaderboard/rankings/top-n")).json()
+    assert top["snake"][0]["best_score"] == 99
+
+def test_unknown_endpoint_names_fail_fast():
+    with pytest.raises(KeyError):
+        swr.Query("get_no_such_endpoint", (), compute=None)
@@ -0,0 +1,103 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, select
+from app import windows
+from app.sql_models import WindowBestScore, WindowResult
+
+async def play(client, username, scores, mode="snake", **groups):
+    resp = await client.post("/auth/signup", json={
+        "username": username, "email": f"{username}@example.com", "password": "pw", **groups
+    })
+    headers = {"Authorization": f"Bearer {resp.json()['token']}"}
+    for score in scores:
+        await client.post("/leaderboard", json={"score": score, "gameMode": mode}, headers=headers)
+
+@pytest.mark.asyncio
+async def test_window_leaderboard_is_maintained_on_submit(db_session, client):
+    await play(client, "ann", [5, 40, 12])
+    await play(client, "bob", [40], new_group_name="team")
+    await play(client, "cid", [10])
+    await play(client, "dan", [99], mode="tetris")
+
+    body = (await client.get("/leaderboard/rankings/window?period=weekly&gameMode=snake")).json()
+    assert body["frozen"] is False and body["players"] == 3
+    assert body["window_start"] == windows.window_start("weekly", datetime.now(timezone.utc).date()).isoformat()
+    assert body["entries"] == [
+        {"rank": 1, "username": "ann", "best_score": 40},
+        {"rank": 1, "username": "bob", "best_score": 40},
+        {"rank": 3, "username": "cid", "best_score": 10},
+    ]
+    page2 = (await client.get("/leaderboard/rankings/window?period=daily&gameMode=snake&offset=1&limit=1")).json()
+    assert page2["entries"] == [{"rank": 1, "username": "bob", "best_score": 40}]
+
+    team_id = next(g["id"] for g in (await client.get("/auth/groups")).json() if g["name"] == "team")
+    in_team = (await client.get(f"/leaderboard/rankings/window?period=season&gameMode=snake&group_id={team_id}")).json()
+    assert [e["username"] for e in in_team["entries"]] == ["bob"]
+
+@pytest.mark.asyncio
+async def test_closed_windows_are_frozen(db_session, client):
+    last_week = datetime.now(timezone.utc) - timedelta(days=7)
+    for user, score in [("u1", 5), ("u1", 40), ("u2", 20), ("u3", 20)]:
+        await windows.record(db_session, "snake", [], user, user, score, at=last_week)
+    await play(client, "ann", [30])  # Today's windows stay open
+
+    closed = await windows.roll_over(db_session)
+    assert ("daily", last_week.date()) in closed and ("weekly", windows.window_start("weekly", last_week.date())) in closed
+    assert all(start < datetime.now(timezone.utc).date() for _, start in closed)
+    assert await windows.roll_over(db_session) == []
+
+    frozen = (await db_session.execute(
+        select(WindowResult.username, WindowResult.rank)
+        .where(WindowResult.period == "daily", WindowResult.group_id == "*").order_by(WindowResult.rank, WindowResult.username)
+    )).all()
+    assert [tuple(r) for r in frozen] == [("u1", 1), ("u2", 2), ("u3", 2)]
+    live = select(func.count()).select_from(WindowBestScore).where(WindowBestScore.period == "daily", WindowBestScore.group_id == "*")
+    assert (await db_session.execute(live)).scalar_one() == 1  # ann, today
+
+    body = (await client.get(f"/leaderboard/rankings/window?period=weekly&gameMode=snake&start={last_week.date()}")).json()
+    assert body["frozen"] is True and body["players"] == 3
+    assert body["entries"][0] == {"rank": 1, "username": "u1", "best_score": 40}
+
+@pytest.mark.asyncio
+async def test_rebuild_recomputes_open_windows(db_session, client):
+    await play(client, "ann", [5, 40])
+    await db_session.execute(WindowBestScore.__table__.delete())
+    await db_session.commit()
+
+    assert await windows.rebuild(db_session, report=lambda _: None) == 2
+    body = (await client.get("/leaderboard/rankings/window?period=weekly&gameMode=snake")).json()
+    assert body["entries"] == [{"rank": 1, "username": "ann", "best_score": 40}]
+
+@pytest.mark.asyncio
+async def test_rebuild_keeps_greater_scores_written_meanwhile(db_session, client):
+    await play(client, "ann", [40])
+    await play(client, "bob", [30])
+    # A submission that committed during the scan left bob ahead of the table's scores
+    await db_session.execute(WindowBestScore.__table__.update()
+                             .where(WindowBestScore.username == "bob").values(best_score=90))
+    await db_session.execute(WindowBestScore.__table__.update()
+                             .where(WindowBestScore.username == "ann").values(best_score=1))
+    await db_session.commit()
+
+    await windows.rebuild(db_session, report=lambda _: None)
+    body = (await client.get("/leaderboard/rankings/window?period=daily&gameMode=snake")).json()
+    assert [(e["username"], e["best_score"]) for e in body["entries"]] == [("bob", 90), ("ann", 40)]
+
+@pytest.mark.asyncio
+async def test_rebuild_reads_naive_timestamps_as_local_time(db_session, client, monkeypatch):
+    # Far from UTC, so treating local time as UTC would be 14 hours off
+    monkeypatch.setenv("TZ", "Etc/GMT-14")
+    time.tzset()
+    try:
+        await play(client, "ann", [40])
+        await db_session.execute(WindowBestScore.__table__.delete())
+        await db_session.commit()
+        await windows.rebuild(db_session, report=lambda _: None)
+        achieved = (await db_session.execute(select(WindowBestScore.achieved_at))).scalars().first()
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    achieved = achieved if achieved.tzinfo else achieved.replace(tzinfo=timezone.utc)
+    assert abs(achieved - datetime.now(timezone.utc)) < timedelta(minutes=5)
@@ -122,12 +122,13 @@ class ApiService {
     }
 
     async logout(): Promise<void> {
+        // Send the token so the backend can revoke it
+        const headers = this.getHeaders();
         this.token = null;
         this.cachedUser = null;
         localStorage.removeItem('token');
-        // Optional: Call backend logout if needed, but JWT is stateless usually
         try {
-            await fetch(`${API_URL}/auth/logout`, { method: 'POST' });
+            await fetch(`${API_URL}/auth/logout`, { method: 'POST', headers });
         } catch (e) {
             // Ignore logout errors
         }